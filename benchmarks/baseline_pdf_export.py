@@ -0,0 +1,190 @@
+"""
+The PDF renderer as it was before BulletList and the shared template styles:
+ParagraphStyles rebuilt on every call and one Paragraph per bullet.
+Kept only as the baseline for bench_pdf_export; not used by the app.
+"""
+import io
+from datetime import datetime
+from typing import List
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.lib.colors import HexColor
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.lib.enums import TA_LEFT
+
+
+def generate_pdf(personas_data: List[dict], export_date: datetime) -> bytes:
+    """Generate a nicely formatted PDF from personas data."""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.75*inch, bottomMargin=1*inch)
+    
+    styles = getSampleStyleSheet()
+    
+    # Custom styles
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Title'],
+        fontSize=24,
+        textColor=HexColor('#1a1a2e'),
+        spaceAfter=20
+    )
+    
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading1'],
+        fontSize=16,
+        textColor=HexColor('#16213e'),
+        spaceBefore=20,
+        spaceAfter=10
+    )
+    
+    subheading_style = ParagraphStyle(
+        'CustomSubheading',
+        parent=styles['Heading2'],
+        fontSize=12,
+        textColor=HexColor('#0f3460'),
+        spaceBefore=12,
+        spaceAfter=6
+    )
+    
+    body_style = ParagraphStyle(
+        'CustomBody',
+        parent=styles['Normal'],
+        fontSize=10,
+        textColor=HexColor('#333333'),
+        alignment=TA_LEFT,
+        spaceAfter=4
+    )
+    
+    badge_primary = ParagraphStyle(
+        'BadgePrimary',
+        parent=styles['Normal'],
+        fontSize=9,
+        textColor=HexColor('#1e40af'),
+        backColor=HexColor('#dbeafe'),
+    )
+    
+    badge_secondary = ParagraphStyle(
+        'BadgeSecondary',
+        parent=styles['Normal'],
+        fontSize=9,
+        textColor=HexColor('#7c3aed'),
+        backColor=HexColor('#ede9fe'),
+    )
+    
+    story = []
+    
+    # Title page
+    story.append(Paragraph("User Personas Export", title_style))
+    story.append(Paragraph(f"Generated on {export_date.strftime('%B %d, %Y at %H:%M')}", body_style))
+    story.append(Paragraph(f"Total Personas: {len(personas_data)}", body_style))
+    story.append(Spacer(1, 30))
+    
+    # Each persona
+    for i, persona in enumerate(personas_data):
+        if i > 0:
+            story.append(Spacer(1, 20))
+        
+        # Name and status
+        status_badge = "PRIMARY" if persona['status'] == 'primary' else "SECONDARY"
+        story.append(Paragraph(f"{persona['name']}", heading_style))
+        story.append(Paragraph(f"<b>{status_badge}</b> • {persona['role']}", body_style))
+        story.append(Paragraph(f"Tech Comfort: {persona['tech_comfort'].capitalize()}", body_style))
+        
+        # Demographics
+        if persona.get('demographics'):
+            demo = persona['demographics']
+            story.append(Paragraph("Demographics", subheading_style))
+            demo_data = []
+            if demo.get('age'):
+                demo_data.append(['Age', demo['age']])
+            if demo.get('location'):
+                demo_data.append(['Location', demo['location']])
+            if demo.get('education'):
+                demo_data.append(['Education', demo['education']])
+            if demo.get('industry'):
+                demo_data.append(['Industry', demo['industry']])
+            
+            if demo_data:
+                table = Table(demo_data, colWidths=[1.5*inch, 4*inch])
+                table.setStyle(TableStyle([
+                    ('FONTSIZE', (0, 0), (-1, -1), 10),
+                    ('TEXTCOLOR', (0, 0), (0, -1), HexColor('#666666')),
+                    ('TEXTCOLOR', (1, 0), (1, -1), HexColor('#333333')),
+                    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+                    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+                ]))
+                story.append(table)
+        
+        # Scenario Context
+        if persona.get('scenario_context'):
+            story.append(Paragraph("Scenario Context", subheading_style))
+            story.append(Paragraph(persona['scenario_context'], body_style))
+        
+        # Goals
+        if persona.get('goals'):
+            story.append(Paragraph("Goals", subheading_style))
+            for goal in persona['goals']:
+                story.append(Paragraph(f"• {goal}", body_style))
+        
+        # Frustrations
+        if persona.get('frustrations'):
+            story.append(Paragraph("Frustrations", subheading_style))
+            for frust in persona['frustrations']:
+                story.append(Paragraph(f"• {frust}", body_style))
+        
+        # Behavioral Patterns
+        if persona.get('behavioral_patterns'):
+            story.append(Paragraph("Behavioral Patterns", subheading_style))
+            for pattern in persona['behavioral_patterns']:
+                story.append(Paragraph(f"• {pattern}", body_style))
+        
+        # Influence Networks
+        if persona.get('influence_networks'):
+            story.append(Paragraph("Influence Networks", subheading_style))
+            for network in persona['influence_networks']:
+                story.append(Paragraph(f"• {network}", body_style))
+        
+        # Recruitment Criteria
+        if persona.get('recruitment_criteria'):
+            story.append(Paragraph("Recruitment Criteria", subheading_style))
+            for criteria in persona['recruitment_criteria']:
+                story.append(Paragraph(f"• {criteria}", body_style))
+        
+        # Research Assumptions
+        if persona.get('research_assumptions'):
+            story.append(Paragraph("Research Assumptions", subheading_style))
+            for assumption in persona['research_assumptions']:
+                story.append(Paragraph(f"• {assumption}", body_style))
+        
+        # Separator line between personas
+        if i < len(personas_data) - 1:
+            story.append(Spacer(1, 15))
+            story.append(Paragraph("─" * 60, body_style))
+    
+    def add_page_footer(canvas, doc):
+        """Add footer with branding and page number to each page."""
+        canvas.saveState()
+        page_width, page_height = A4
+        
+        # Footer line
+        canvas.setStrokeColor(HexColor('#e0e0e0'))
+        canvas.setLineWidth(0.5)
+        canvas.line(0.75*inch, 0.6*inch, page_width - 0.75*inch, 0.6*inch)
+        
+        # Branding text (left side)
+        canvas.setFont('Helvetica', 9)
+        canvas.setFillColor(HexColor('#888888'))
+        canvas.drawString(0.75*inch, 0.4*inch, "Generated by PersonaForge")
+        
+        # Page number (right side)
+        page_num = canvas.getPageNumber()
+        canvas.drawRightString(page_width - 0.75*inch, 0.4*inch, f"Page {page_num}")
+        
+        canvas.restoreState()
+    
+    doc.build(story, onFirstPage=add_page_footer, onLaterPages=add_page_footer)
+    buffer.seek(0)
+    return buffer.getvalue()
@@ -0,0 +1,94 @@
+"""
+Benchmark concurrent password logins: Argon2 inline in the handler vs in the hash pool.
+
+Usage:
+    python -m benchmarks.bench_login [--users 8] [--logins 64] [--concurrency 16]
+
+While the logins run, GET /health is probed every 5 ms. Its latency, counted from when
+the probe was due, shows how long the event loop is blocked: every other request on the
+worker waits that long too.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.pool import StaticPool
+
+import src.routers.auth as auth_router
+from src.auth import get_password_hash, get_pwd_context
+from src.database import get_session
+from src.main import app
+from src.models import User
+
+
+async def inline_verify(plain_password, hashed_password):
+    return get_pwd_context().verify_and_update(plain_password, hashed_password)
+
+
+async def run(client: httpx.AsyncClient, users: int, logins: int, concurrency: int):
+    stop = asyncio.Event()
+    probe_ms = []
+
+    async def probe():
+        # Measured from when the probe was due, so time the loop spent blocked counts
+        due = time.perf_counter()
+        while not stop.is_set():
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            await client.get("/health")
+            probe_ms.append((time.perf_counter() - due) * 1000)
+            due = max(due + 0.005, time.perf_counter())
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login(i: int):
+        async with semaphore:
+            response = await client.post("/auth/login", json={"email": f"user{i % users}@example.com", "password": "correct horse"})
+            assert response.status_code == 200, response.text
+
+    prober = asyncio.create_task(probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(login(i) for i in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await prober
+
+    probe_ms.sort()
+    return logins / elapsed, statistics.median(probe_ms), probe_ms[int(len(probe_ms) * 0.99) - 1], probe_ms[-1]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    hashed = get_password_hash("correct horse")
+    with Session(engine) as session:
+        session.add_all([User(email=f"user{i}@example.com", hashed_password=hashed, is_verified=True) for i in range(args.users)])
+        session.commit()
+
+    def session_override():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = session_override
+    pooled_verify = auth_router.verify_and_update_password
+
+    print(f"{args.logins} logins, {args.concurrency} concurrent")
+    print(f"{'hashing':<8} {'logins/s':>9} {'probe p50 ms':>13} {'probe p99 ms':>13} {'probe max ms':>13}")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for name, verify in [("inline", inline_verify), ("pool", pooled_verify)]:
+            auth_router.verify_and_update_password = verify
+            rate, p50, p99, worst = await run(client, args.users, args.logins, args.concurrency)
+            print(f"{name:<8} {rate:>9.1f} {p50:>13.1f} {p99:>13.1f} {worst:>13.1f}")
+    auth_router.verify_and_update_password = pooled_verify
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
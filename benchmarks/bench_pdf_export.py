@@ -0,0 +1,77 @@
+"""
+Benchmark PDF export rendering per persona for every named template, against the
+previous renderer (benchmarks/baseline_pdf_export.py) as a baseline.
+
+Usage:
+    python -m benchmarks.bench_pdf_export [--personas 20] [--rounds 5]
+
+Reports wall time and peak Python allocations (tracemalloc) per persona, and the
+time change relative to the baseline row.
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from benchmarks.baseline_pdf_export import generate_pdf as generate_baseline_pdf
+from src.pdf_export import generate_pdf
+from src.pdf_templates import PDF_TEMPLATES
+
+LIST_FIELDS = [
+    "goals", "frustrations", "behavioral_patterns",
+    "influence_networks", "recruitment_criteria", "research_assumptions",
+]
+
+
+def sample_persona(i: int) -> dict:
+    return {
+        "name": f"Busy PM Priya {i}",
+        "status": "primary" if i % 2 == 0 else "secondary",
+        "role": "Senior Product Manager",
+        "tech_comfort": "high",
+        "scenario_context": "Runs weekly planning across three squads and needs meeting notes turned into action items. " * 3,
+        "demographics": {"age": "32", "location": "Berlin, Germany", "education": "MBA", "industry": "B2B SaaS"},
+        **{
+            field: [f"{field.replace('_', ' ').capitalize()} item {j}: " + "keeps stakeholders aligned without extra meetings " * 2 for j in range(6)]
+            for field in LIST_FIELDS
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--personas", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    personas = [sample_persona(i) for i in range(args.personas)]
+    export_date = datetime.now(timezone.utc)
+
+    def measure(render):
+        pdf = render()  # warm up
+
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            render()
+        per_persona_ms = (time.perf_counter() - start) / args.rounds / args.personas * 1000
+
+        tracemalloc.start()
+        render()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return per_persona_ms, peak / 1024 / args.personas, len(pdf) / 1024
+
+    runs = [("baseline", lambda: generate_baseline_pdf(personas, export_date))]
+    runs += [(template, lambda t=template: generate_pdf(personas, export_date, t)) for template in PDF_TEMPLATES]
+
+    print(f"{'template':<14} {'ms/persona':>12} {'vs baseline':>12} {'peak KiB/persona':>18} {'pdf KiB':>9}")
+    baseline_ms = None
+    for name, render in runs:
+        per_persona_ms, peak_kib, pdf_kib = measure(render)
+        if baseline_ms is None:
+            baseline_ms = per_persona_ms
+        change = f"{(per_persona_ms / baseline_ms - 1) * 100:+.0f}%"
+        print(f"{name:<14} {per_persona_ms:>12.2f} {change:>12} {peak_kib:>18.1f} {pdf_kib:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark GET /conversations/{id}/messages: ORM + from_attributes validation vs the Core read model.
+
+Usage:
+    python -m benchmarks.bench_read_model [--messages 20] [--personas 5] [--rounds 20]
+
+Reports CPU time and peak Python allocations (tracemalloc) per request. Each request
+uses a fresh session, as a real request would.
+"""
+import argparse
+import time
+import tracemalloc
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.pool import StaticPool
+
+from benchmarks.bench_pdf_export import sample_persona
+from src.models import User, Conversation, Message
+from src.persona_store import save_generated_personas
+from src.read_models import conversation_messages_payload
+from src.responses import ORJSONResponse
+from src.schemas import MessageResponse
+
+messages_adapter = TypeAdapter(List[MessageResponse])
+
+
+def seed(engine, message_count: int, personas_per_message: int) -> int:
+    with Session(engine) as session:
+        user = User(email="bench@example.com", is_verified=True)
+        session.add(user)
+        session.commit()
+        conv = Conversation(user_id=user.id, title="Bench")
+        session.add(conv)
+        session.commit()
+        for m in range(message_count):
+            session.add(Message(conversation_id=conv.id, role="user", content=f"Request {m}"))
+            msg = Message(conversation_id=conv.id, role="assistant", content="Generated personas")
+            session.add(msg)
+            session.commit()
+            personas = [sample_persona(m * personas_per_message + i) for i in range(personas_per_message)]
+            save_generated_personas(session, personas, msg.id, user.id)
+        return conv.id
+
+
+def orm_request(engine, conversation_id: int) -> bytes:
+    with Session(engine) as session:
+        conv = session.get(Conversation, conversation_id)
+        return messages_adapter.dump_json(messages_adapter.validate_python(conv.messages, from_attributes=True))
+
+
+def read_model_request(engine, conversation_id: int) -> bytes:
+    with Session(engine) as session:
+        return ORJSONResponse(conversation_messages_payload(session, conversation_id)).body
+
+
+def measure(fn, engine, conversation_id: int, rounds: int):
+    fn(engine, conversation_id)  # warm up
+    start = time.process_time()
+    for _ in range(rounds):
+        fn(engine, conversation_id)
+    cpu_ms = (time.process_time() - start) / rounds * 1000
+
+    tracemalloc.start()
+    fn(engine, conversation_id)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu_ms, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--personas", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    conversation_id = seed(engine, args.messages, args.personas)
+
+    print(f"{args.messages} assistant messages x {args.personas} personas")
+    print(f"{'path':<12} {'CPU ms/request':>15} {'peak KiB/request':>17}")
+    for name, fn in [("orm", orm_request), ("read model", read_model_request)]:
+        cpu_ms, peak_kib = measure(fn, engine, conversation_id, args.rounds)
+        print(f"{name:<12} {cpu_ms:>15.1f} {peak_kib:>17.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark encoding a GET /conversations/{id}/messages payload with each response stack.
+
+Usage:
+    python -m benchmarks.bench_serialization [--messages 20] [--personas 5] [--rounds 50]
+
+Reports encode time per response and payload size.
+"""
+import argparse
+import json
+import time
+from typing import List
+
+import msgpack
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.pool import StaticPool
+
+from benchmarks.bench_read_model import seed
+from src.models import Conversation
+from src.read_models import conversation_messages_payload
+from src.schemas import MessageResponse
+
+messages_adapter = TypeAdapter(List[MessageResponse])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--personas", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    conversation_id = seed(engine, args.messages, args.personas)
+    with Session(engine) as session:
+        models = messages_adapter.validate_python(session.get(Conversation, conversation_id).messages, from_attributes=True)
+        payload = conversation_messages_payload(session, conversation_id)
+
+    stacks = [
+        ("jsonable_encoder + json", lambda: json.dumps(jsonable_encoder(models), ensure_ascii=False, separators=(",", ":")).encode("utf-8")),
+        ("response_model dump_json", lambda: messages_adapter.dump_json(models)),
+        ("read model + json", lambda: json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")),
+        ("read model + orjson", lambda: orjson.dumps(payload)),
+        ("read model + msgpack", lambda: msgpack.packb(payload, use_bin_type=True)),
+    ]
+
+    print(f"{args.messages} assistant messages x {args.personas} personas")
+    print(f"{'stack':<26} {'encode ms':>10} {'KiB':>8}")
+    for name, encode in stacks:
+        body = encode()  # warm up
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            encode()
+        encode_ms = (time.perf_counter() - start) / args.rounds * 1000
+        print(f"{name:<26} {encode_ms:>10.2f} {len(body) / 1024:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark API cold start: import time of src.main and time to the first healthy response.
+
+Usage:
+    python -m benchmarks.bench_startup [--rounds 5] [--top 15] [--record benchmarks/results/startup.jsonl]
+
+Import time comes from `python -X importtime -c "import src.main"` in a fresh interpreter,
+broken down by top-level package. Time to healthy starts uvicorn in a fresh process and
+polls GET /health until it answers. The database is migrated beforehand, as in a deployment.
+
+With --record, the medians are appended as a JSON line with the current commit, so
+results can be compared across versions.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import defaultdict
+from datetime import datetime, timezone
+
+
+def import_profile() -> tuple[float, dict]:
+    """(total ms, self ms by top-level package) for one import of src.main."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import src.main"],
+        capture_output=True, text=True, check=True,
+    )
+    total_us = 0
+    by_package = defaultdict(int)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        by_package[name.split(".")[0]] += int(self_us)
+        if name == "src.main":
+            total_us = int(cumulative_us)
+    return total_us / 1000, {package: us / 1000 for package, us in by_package.items()}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_healthy(env: dict, timeout: float = 30.0) -> float:
+    """Milliseconds from starting uvicorn until GET /health returns 200."""
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - start) * 1000
+            except OSError:
+                time.sleep(0.005)
+        raise TimeoutError("the server did not become healthy")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def current_commit() -> str:
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+    return result.stdout.strip() or "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--record", help="append the results to this JSON lines file")
+    args = parser.parse_args()
+
+    totals, profiles = [], []
+    for _ in range(args.rounds):
+        total_ms, by_package = import_profile()
+        totals.append(total_ms)
+        profiles.append(by_package)
+    packages = {package: statistics.median(p.get(package, 0.0) for p in profiles) for package in profiles[0]}
+    top = dict(sorted(packages.items(), key=lambda item: -item[1])[:args.top])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'startup.db')}",
+            "OUTBOX_SINK": "file",
+            "OUTBOX_FILE_SINK_PATH": os.path.join(tmp, "emails.jsonl"),
+        }
+        subprocess.run([sys.executable, "-m", "src.migrate"], env=env, check=True, stdout=subprocess.DEVNULL)
+        healthy = [time_to_healthy(env) for _ in range(args.rounds)]
+
+    import_ms, healthy_ms = statistics.median(totals), statistics.median(healthy)
+    print(f"import src.main        {import_ms:>8.0f} ms (median of {args.rounds})")
+    print(f"first healthy response {healthy_ms:>8.0f} ms")
+    print(f"\n{'package':<24} {'self ms':>8}")
+    for package, ms in top.items():
+        print(f"{package:<24} {ms:>8.1f}")
+
+    if args.record:
+        os.makedirs(os.path.dirname(args.record) or ".", exist_ok=True)
+        with open(args.record, "a") as f:
+            f.write(json.dumps({
+                "commit": current_commit(),
+                "recorded_at": datetime.now(timezone.utc).isoformat(),
+                "import_ms": round(import_ms, 1),
+                "first_healthy_ms": round(healthy_ms, 1),
+                "packages_ms": {package: round(ms, 1) for package, ms in top.items()},
+            }) + "\n")
+
+
+if __name__ == "__main__":
+    main()
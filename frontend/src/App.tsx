@@ -91,6 +91,7 @@ function App() {
             influence_networks: extractStrings(p.influence_networks, 'network_text'),
             recruitment_criteria: extractStrings(p.recruitment_criteria, 'criteria_text'),
             research_assumptions: extractStrings(p.research_assumptions, 'assumption_text'),
+            version: p.version,
           };
         });
 
@@ -176,7 +177,9 @@ function App() {
     }
 
     try {
-      await personaAPI.updatePersona(id, updates);
+      // The server rejects the edit (409) if someone else saved this persona since we loaded it
+      const saved = await personaAPI.updatePersona(id, { ...updates, version: originalPersona?.version });
+      updatePersona(id, { version: saved.version });
     } catch (err) {
       console.error('Failed to update persona:', err);
       // Revert optimistic update
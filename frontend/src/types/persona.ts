@@ -54,6 +54,7 @@ export interface BackendPersona {
   influence_networks: BackendInfluenceNetwork[];
   recruitment_criteria: BackendRecruitmentCriteria[];
   research_assumptions: BackendResearchAssumption[];
+  version: number;
 }
 
 export interface Persona {
@@ -70,6 +71,7 @@ export interface Persona {
   influence_networks: string[];
   recruitment_criteria: string[];
   research_assumptions: string[];
+  version?: number; // Server version the local copy is based on
 }
 
 export interface PersonaVersion {
@@ -1,38 +1,90 @@
+import asyncio
 import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Union
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
-import httpx
+import functools
 import random
+import secrets
 import string
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
-from sqlmodel import Session, select
-from typing import Annotated
-from src.database import get_session
+from fastapi import HTTPException
 from src.models import User
 
 # Config
 SECRET_KEY = os.environ.get("SECRET_KEY", "supersecretkey")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID")
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+# Argon2 cost. Hashes made with other parameters are upgraded on the next login.
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+# Threads that hash passwords; argon2 releases the GIL, so they run in parallel
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+# Hashes queued or running at once before new logins get a 503
+PASSWORD_HASH_QUEUE_DEPTH = int(os.getenv("PASSWORD_HASH_QUEUE_DEPTH", "32"))
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v3/certs"
+GOOGLE_ISSUERS = ["accounts.google.com", "https://accounts.google.com"]
+# Used when Google's response has no Cache-Control max-age
+GOOGLE_CERTS_TTL_SECONDS = int(os.getenv("GOOGLE_CERTS_TTL_SECONDS", "3600"))
+
+@functools.cache
+def get_pwd_context():
+    # passlib and argon2 are loaded on the first sign-in rather than at startup
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["argon2"],
+        deprecated="auto",
+        argon2__rounds=ARGON2_TIME_COST,
+        argon2__memory_cost=ARGON2_MEMORY_COST,
+        argon2__parallelism=ARGON2_PARALLELISM,
+    )
+
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_hashes_in_flight = 0
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
+
+async def _run_hash(fn, *args):
+    """Run a hashing call in the hash pool, or 503 when too many are waiting."""
+    global _hashes_in_flight
+    if _hashes_in_flight >= PASSWORD_HASH_QUEUE_DEPTH:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many sign-in attempts in progress. Please try again shortly.",
+            headers={"Retry-After": "1"},
+        )
+    _hashes_in_flight += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+    finally:
+        _hashes_in_flight -= 1
+
+async def hash_password(password: str) -> str:
+    """get_password_hash, off the event loop."""
+    return await _run_hash(get_pwd_context().hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """
+    Check a password off the event loop.
+    Returns (valid, new_hash); new_hash is set when the stored hash used outdated parameters.
+    """
+    return await _run_hash(get_pwd_context().verify_and_update, plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -44,78 +96,115 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_user_access_token(user: User) -> str:
+    """
+    Access token that carries the user id, so requests can be authenticated without
+    loading the user. The plan is not in the token: it is read from the database
+    where it is checked, so plan changes apply at once.
+    """
+    return create_access_token(data={
+        "sub": user.email,
+        "uid": user.id,
+        "iat": int(time.time()),
+        "jti": secrets.token_urlsafe(16),
+    })
+
 def generate_otp() -> str:
     return "".join(random.choices(string.digits, k=6))
 
-def verify_google_token(token: str) -> Optional[dict]:
+_http_client: Optional["httpx.AsyncClient"] = None
+
+def get_http_client() -> "httpx.AsyncClient":
+    """Shared client for calls to Google, so connections are reused across logins."""
+    global _http_client
+    if _http_client is None:
+        import httpx
+
+        _http_client = httpx.AsyncClient(timeout=10.0)
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+_google_jwks: Optional[dict] = None
+_google_jwks_expires_at = 0.0
+_google_jwks_lock = asyncio.Lock()
+
+async def get_google_jwks(refresh: bool = False) -> dict:
+    """Google's ID token signing keys, cached for as long as Google allows."""
+    global _google_jwks, _google_jwks_expires_at
+    async with _google_jwks_lock:
+        if _google_jwks is not None and not refresh and time.monotonic() < _google_jwks_expires_at:
+            return _google_jwks
+        response = await get_http_client().get(GOOGLE_CERTS_URL)
+        response.raise_for_status()
+        max_age = re.search(r"max-age=(\d+)", response.headers.get("cache-control", ""))
+        ttl = int(max_age.group(1)) if max_age else GOOGLE_CERTS_TTL_SECONDS
+        _google_jwks = response.json()
+        _google_jwks_expires_at = time.monotonic() + ttl
+        return _google_jwks
+
+async def verify_google_id_token(token: str) -> dict:
+    """Claims of a Google ID token; raises JWTError if it is not one or is invalid."""
+    kid = jwt.get_unverified_header(token).get("kid")
+    jwks = await get_google_jwks()
+    if kid not in {key.get("kid") for key in jwks.get("keys", [])}:
+        # Google rotated its keys since they were cached
+        jwks = await get_google_jwks(refresh=True)
+    return jwt.decode(
+        token,
+        jwks,
+        algorithms=["RS256"],
+        audience=GOOGLE_CLIENT_ID,
+        issuer=GOOGLE_ISSUERS,
+        options={"verify_aud": GOOGLE_CLIENT_ID is not None, "verify_at_hash": False},
+    )
+
+async def verify_google_token(token: str) -> Optional[dict]:
+    import httpx
+
+    if not GOOGLE_CLIENT_ID:
+        print("WARNING: GOOGLE_CLIENT_ID not set.")
     try:
-        # If GOOGLE_CLIENT_ID is not set, we can't verify properly, 
-        # but for dev we might want to skip or fail. 
-        # Here we fail if not set to be safe.
-        if not GOOGLE_CLIENT_ID:
-            print("WARNING: GOOGLE_CLIENT_ID not set.")
-            # return None 
-        
-        # Note: In a real scenario, you must provide the client ID.
-        # For now, if it's None, verify_oauth2_token might skip audience check if not provided,
-        # but it's better to be explicit.
-        idinfo = id_token.verify_oauth2_token(token, google_requests.Request(), GOOGLE_CLIENT_ID)
-        return idinfo
-    except ValueError as e:
+        return await verify_google_id_token(token)
+    except (JWTError, httpx.HTTPError) as e:
         # If ID token verification fails, try as Access Token (userinfo endpoint)
         try:
-            with httpx.Client(timeout=10.0) as client:
-                # To be secure, we should verify the token is intended for our client_id
-                # First check token info
-                token_info_resp = client.get(
-                    'https://oauth2.googleapis.com/tokeninfo',
-                    params={'access_token': token}
-                )
-                
-                if token_info_resp.status_code != 200:
-                    print(f"Google tokeninfo check failed: {token_info_resp.text}")
-                    return None
-                
-                token_info = token_info_resp.json()
-                # Verify that this token was issued for our GOOGLE_CLIENT_ID
-                # 'azp' (Authorized party) or 'aud' (Audience) should match our client id
-                is_valid_audience = (
-                    token_info.get('azp') == GOOGLE_CLIENT_ID or 
-                    token_info.get('aud') == GOOGLE_CLIENT_ID
-                )
-                
-                if not is_valid_audience:
-                    print(f"Google token verification failed: Audience mismatch. azp={token_info.get('azp')}, aud={token_info.get('aud')}")
-                    return None
-
-                # Now get userinfo for actual data (name, email)
-                response = client.get(
-                    'https://www.googleapis.com/oauth2/v3/userinfo',
-                    headers={'Authorization': f'Bearer {token}'}
-                )
-                if response.status_code == 200:
-                    return response.json()
-                print(f"Google userinfo request failed: {response.text}")
+            client = get_http_client()
+            # To be secure, we should verify the token is intended for our client_id
+            # First check token info
+            token_info_resp = await client.get(
+                'https://oauth2.googleapis.com/tokeninfo',
+                params={'access_token': token}
+            )
+            
+            if token_info_resp.status_code != 200:
+                print(f"Google tokeninfo check failed: {token_info_resp.text}")
+                return None
+            
+            token_info = token_info_resp.json()
+            # Verify that this token was issued for our GOOGLE_CLIENT_ID
+            # 'azp' (Authorized party) or 'aud' (Audience) should match our client id
+            is_valid_audience = (
+                token_info.get('azp') == GOOGLE_CLIENT_ID or 
+                token_info.get('aud') == GOOGLE_CLIENT_ID
+            )
+            
+            if not is_valid_audience:
+                print(f"Google token verification failed: Audience mismatch. azp={token_info.get('azp')}, aud={token_info.get('aud')}")
+                return None
+
+            # Now get userinfo for actual data (name, email)
+            response = await client.get(
+                'https://www.googleapis.com/oauth2/v3/userinfo',
+                headers={'Authorization': f'Bearer {token}'}
+            )
+            if response.status_code == 200:
+                return response.json()
+            print(f"Google userinfo request failed: {response.text}")
         except Exception as exc:
             print(f"Google token verification error: {exc}")
         return None
-
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
-
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], session: Annotated[Session, Depends(get_session)]):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    user = session.exec(select(User).where(User.email == email)).first()
-    if user is None:
-        raise credentials_exception
-    return user
@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from src.shared_cache import SharedCacheStore
+
+# Caches for the reads every page makes: the authenticated user, the conversation
+# sidebar and export entitlements. Writes invalidate explicitly. Each process has
+# its own tier; with CACHE_SHARED_PATH set, a second tier in a SQLite file is shared
+# by every worker on the host, and the per-process tier only keeps entries for
+# CACHE_LOCAL_TTL_SECONDS, which bounds how long another worker's invalidation takes
+# to be seen. Without it, the TTL bounds how stale another worker process can be.
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "30"))
+CACHE_SHARED_PATH = os.getenv("CACHE_SHARED_PATH")
+CACHE_LOCAL_TTL_SECONDS = float(os.getenv("CACHE_LOCAL_TTL_SECONDS", "1"))
+
+shared_store: Optional[SharedCacheStore] = SharedCacheStore(CACHE_SHARED_PATH) if CACHE_SHARED_PATH else None
+
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after a time to live,
+    optionally backed by a store shared with other processes.
+    """
+
+    def __init__(self, name: str, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS,
+                 shared: Optional[SharedCacheStore] = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        # Entries from the shared tier may have been invalidated by another worker since
+        self.local_ttl = min(ttl, CACHE_LOCAL_TTL_SECONDS) if shared is not None else ttl
+        self._entries: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.shared_hits = 0
+
+    def _set_local(self, key: Hashable, value: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + min(ttl, self.local_ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, key: Hashable) -> Any:
+        """The cached value, or MISSING."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+        if self.shared is not None:
+            value = self.shared.get(self.name, key, MISSING)
+            if value is not MISSING:
+                self._set_local(key, value, self.local_ttl)
+                self.hits += 1
+                self.shared_hits += 1
+                return value
+        self.misses += 1
+        return MISSING
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Cache a value; ttl may shorten (never extend) the default time to live."""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._set_local(key, value, ttl)
+        if self.shared is not None:
+            self.shared.set(self.name, key, value, ttl)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.shared is not None:
+            self.shared.delete(self.name, key)
+
+    def purge_expired(self) -> int:
+        """Drop expired entries, which otherwise stay until looked up or evicted."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]
+            for key in expired:
+                del self._entries[key]
+        return len(expired)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.shared_hits = 0
+        if self.shared is not None:
+            self.shared.clear(self.name)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "shared_hits": self.shared_hits,
+            "shared_entries": self.shared.count(self.name) if self.shared is not None else None,
+        }
+
+
+# Keyed by email, the token subject: column values of the User row
+user_cache = TTLCache("users", shared=shared_store)
+# Keyed by user id: the email of users in user_cache, so writers that only know
+# the id can invalidate it
+user_email_cache = TTLCache("user_emails", shared=shared_store)
+# Keyed by user id: ConversationResponse-shaped dicts for the sidebar
+conversation_list_cache = TTLCache("conversation_lists", shared=shared_store)
+# Keyed by user id: check_export_eligibility results
+entitlement_cache = TTLCache("entitlements", shared=shared_store)
+
+_CACHES = [user_cache, user_email_cache, conversation_list_cache, entitlement_cache]
+
+
+def cache_user(snapshot: dict):
+    user_email_cache.set(snapshot["id"], snapshot["email"])
+    user_cache.set(snapshot["email"], snapshot)
+
+
+def invalidate_user(user_id: Optional[int] = None, email: Optional[str] = None):
+    """Drop everything cached for a user after a write to their row or plan."""
+    if email is None and user_id is not None:
+        email = user_email_cache.get(user_id)
+        email = None if email is MISSING else email
+    if email is not None:
+        user_cache.invalidate(email)
+    if user_id is not None:
+        conversation_list_cache.invalidate(user_id)
+        entitlement_cache.invalidate(user_id)
+
+
+def clear_caches():
+    for cache in _CACHES:
+        cache.clear()
+
+
+def purge_expired_caches() -> int:
+    purged = sum(cache.purge_expired() for cache in _CACHES)
+    if shared_store is not None:
+        purged += shared_store.purge_expired()
+    return purged
+
+
+def get_cache_stats() -> dict:
+    """Snapshot of cache metrics, by cache."""
+    return {cache.name: cache.stats() for cache in _CACHES}
@@ -0,0 +1,81 @@
+import asyncio
+import os
+from typing import Awaitable, TypeVar
+
+from fastapi import HTTPException, Request
+
+# Generation calls are abandoned when the client goes away or the route's deadline
+# passes. Cancelling the awaiting task closes the upstream request, so a reply
+# nobody will read stops costing time and LLM quota.
+GENERATION_DEADLINE_SECONDS = float(os.getenv("GENERATION_DEADLINE_SECONDS", "90"))
+CHAT_NAME_DEADLINE_SECONDS = float(os.getenv("CHAT_NAME_DEADLINE_SECONDS", "15"))
+
+T = TypeVar("T")
+
+_stats = {"completed": 0, "disconnected": 0, "timed_out": 0, "failed": 0}
+
+
+class ClientDisconnected(HTTPException):
+    """The client closed the connection; the response will never be read."""
+
+    def __init__(self):
+        # 499 Client Closed Request (nginx)
+        super().__init__(status_code=499, detail="Client closed request")
+
+
+async def wait_for_disconnect(request: Request):
+    """Returns once the client disconnects. Only for requests whose body was already read."""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+def finish_after_disconnect(request: Request):
+    """
+    Let work for this request run on if its client disconnects, still bounded by the
+    deadline. For requests with an Idempotency-Key, whose retries wait for the outcome.
+    """
+    request.state.finish_after_disconnect = True
+
+
+async def run_cancellable(request: Request, work: Awaitable[T], deadline: float) -> T:
+    """
+    Await work, cancelling it if the client disconnects (ClientDisconnected, unless
+    finish_after_disconnect was called) or the deadline passes (504). Exceptions
+    raised by work propagate unchanged.
+    """
+    task = asyncio.ensure_future(work)
+    waiting = {task}
+    disconnected = None
+    if not getattr(request.state, "finish_after_disconnect", False):
+        disconnected = asyncio.ensure_future(wait_for_disconnect(request))
+        waiting.add(disconnected)
+    try:
+        done, _ = await asyncio.wait(waiting, timeout=deadline, return_when=asyncio.FIRST_COMPLETED)
+        if task in done:
+            if task.exception() is not None:
+                _stats["failed"] += 1
+            else:
+                _stats["completed"] += 1
+            return task.result()
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+        if disconnected in done:
+            _stats["disconnected"] += 1
+            raise ClientDisconnected()
+        _stats["timed_out"] += 1
+        raise HTTPException(status_code=504, detail="Generation took too long. Please try again.")
+    finally:
+        # Also when this request's own task is cancelled
+        if disconnected is not None:
+            disconnected.cancel()
+        if not task.done():
+            task.cancel()
+
+
+def get_generation_stats() -> dict:
+    return dict(_stats)
@@ -0,0 +1,90 @@
+from typing import Iterable, List
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from src.models import ChangeLogEntry, Conversation, Message, Persona
+from src.read_models import conversation_payloads, message_payloads, persona_payloads
+
+# Written in the same transaction as the change it records. Recording a change
+# drops the entity's earlier entries, so the log holds one row per live entity
+# plus tombstones, and a client at any cursor still sees the latest state.
+
+UPSERT = "upsert"
+DELETE = "delete"
+ENTITIES = ("conversation", "message", "persona")
+
+# Existing rows, so a first sync from cursor 0 returns the whole dataset; only used to migrate existing databases
+BACKFILL_CHANGE_LOG = """
+INSERT INTO change_log (user_id, entity, entity_id, op, created_at)
+SELECT user_id, 'conversation', id, 'upsert', CURRENT_TIMESTAMP FROM conversations
+UNION ALL
+SELECT c.user_id, 'message', m.id, 'upsert', CURRENT_TIMESTAMP FROM messages m JOIN conversations c ON c.id = m.conversation_id
+UNION ALL
+SELECT user_id, 'persona', id, 'upsert', CURRENT_TIMESTAMP FROM personas
+"""
+
+
+def record_changes(session: Session, user_id: int, entity: str, ids: Iterable[int], op: str = UPSERT):
+    """Log a change to each entity; the caller commits it with the change itself."""
+    ids = list(ids)
+    if not ids:
+        return
+    session.exec(delete(ChangeLogEntry).where(ChangeLogEntry.entity == entity, ChangeLogEntry.entity_id.in_(ids)))
+    session.add_all([ChangeLogEntry(user_id=user_id, entity=entity, entity_id=entity_id, op=op) for entity_id in ids])
+
+
+def record_conversation_deleted(session: Session, conversation: Conversation):
+    """Tombstones for a conversation and everything under it; call before deleting it."""
+    record_conversations_deleted(session, conversation.user_id, [conversation.id])
+
+
+def record_conversations_deleted(session: Session, user_id: int, conversation_ids: List[int]):
+    """Tombstones for the user's conversations and everything under them; call before deleting them."""
+    message_ids = session.exec(select(Message.id).where(Message.conversation_id.in_(conversation_ids))).all()
+    persona_ids = session.exec(select(Persona.id).where(Persona.message_id.in_(message_ids))).all() if message_ids else []
+    record_changes(session, user_id, "persona", persona_ids, DELETE)
+    record_changes(session, user_id, "message", message_ids, DELETE)
+    record_changes(session, user_id, "conversation", conversation_ids, DELETE)
+
+
+def changes_since(session: Session, user_id: int, since: int, limit: int) -> dict:
+    """
+    Current state of everything the user changed after the cursor, and tombstones
+    for what was deleted. has_more means the client should ask again from the new cursor.
+    """
+    entries = session.exec(
+        select(ChangeLogEntry.id, ChangeLogEntry.entity, ChangeLogEntry.entity_id, ChangeLogEntry.op)
+        .where(ChangeLogEntry.user_id == user_id, ChangeLogEntry.id > since)
+        .order_by(ChangeLogEntry.id)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    changed = {entity: [] for entity in ENTITIES}
+    deleted = {entity: [] for entity in ENTITIES}
+    for _, entity, entity_id, op in entries:
+        (deleted if op == DELETE else changed)[entity].append(entity_id)
+
+    messages = message_payloads(session, changed["message"])
+    # Personas of a changed message already come nested in it
+    nested = {persona["id"] for message in messages for persona in message["personas"]}
+    persona_ids = [persona_id for persona_id in changed["persona"] if persona_id not in nested]
+    message_ids = dict(session.exec(select(Persona.id, Persona.message_id).where(Persona.id.in_(persona_ids))).all()) if persona_ids else {}
+    personas = []
+    for persona_id, payload in persona_payloads(session, persona_ids).items():
+        personas.append({**payload, "message_id": message_ids[persona_id]})
+
+    return {
+        "cursor": entries[-1][0] if entries else since,
+        "has_more": has_more,
+        "conversations": conversation_payloads(session, changed["conversation"]),
+        "messages": messages,
+        "personas": personas,
+        "deleted": {
+            "conversations": deleted["conversation"],
+            "messages": deleted["message"],
+            "personas": deleted["persona"],
+        },
+    }
@@ -0,0 +1,20 @@
+from typing import Optional
+
+from fastapi import Response
+
+from src.compression import strip_content_coding
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header value against an ETag (weak comparison).
+    Tags re-encoded by the compression middleware still match their representation.
+    """
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in [strip_content_coding(tag.removeprefix("W/")) for tag in candidates]
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
@@ -1,4 +1,6 @@
+from sqlalchemy import event
 from sqlmodel import SQLModel, create_engine, Session
+from collections import Counter
 from typing import Generator
 
 import os
@@ -6,22 +8,47 @@ import os
 sqlite_file_name = "database.db"
 sqlite_url = os.getenv("DATABASE_URL", f"sqlite:///{sqlite_file_name}")
 
-connect_args = {"check_same_thread": False}
+# Seconds a write waits for another process's write to finish before failing
+SQLITE_BUSY_TIMEOUT_SECONDS = float(os.getenv("SQLITE_BUSY_TIMEOUT_SECONDS", "5"))
+
+connect_args = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_SECONDS}
 engine = create_engine(sqlite_url, connect_args=connect_args)
 
+def configure_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # SQLite ignores foreign keys, and so ON DELETE CASCADE, unless enabled per connection
+    cursor.execute("PRAGMA foreign_keys=ON")
+    # Several worker processes share the file. SQLite allows one writer at a time:
+    # WAL lets reads proceed during a write, and the busy timeout (set by the driver's
+    # timeout) queues writers instead of failing them. The driver only opens a
+    # transaction at the first write, so a write lock is taken at once rather than
+    # upgraded from a read, where SQLite could not wait for it.
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # Durable at checkpoints rather than every commit; safe with WAL
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+event.listen(engine, "connect", configure_sqlite)
+
+class MigrationError(Exception):
+    """A migration found data it cannot move safely; nothing of that step is applied."""
+
 def create_db_and_tables():
+    # Registers the full-text search table and trigger with the metadata
+    from src.persona_search import BACKFILL_SEARCH_INDEX
+    from src.persona_facets import REBUILD_FACETS
+    from src.change_log import BACKFILL_CHANGE_LOG
+    from src.read_models import LIST_SECTIONS
+    from src.text_store import text_hash
+
     SQLModel.metadata.create_all(engine)
     
     # Manual migration helper for existing databases
     # SQLModel create_all doesn't add new columns to existing tables
     import sqlite3
-    from urllib.parse import urlparse
     
-    # Extract path from sqlite:///database.db
-    parsed = urlparse(sqlite_url)
-    db_path = parsed.path.lstrip('/')
-    if not db_path: # Handle cases like sqlite:///database.db vs sqlite:///../database.db
-        db_path = sqlite_file_name
+    # Path from sqlite:///database.db (relative) or sqlite:////data/database.db (absolute)
+    db_path = engine.url.database or sqlite_file_name
 
     try:
         conn = sqlite3.connect(db_path)
@@ -48,9 +75,89 @@ def create_db_and_tables():
             cursor.execute("ALTER TABLE users ADD COLUMN last_export_at DATETIME")
             cursor.execute("CREATE INDEX IF NOT EXISTS ix_users_last_export_at ON users (last_export_at)")
             print("Successfully added last_export_at column and index to users table")
-            
+
+        cursor.execute("PRAGMA table_info(payments)")
+        payment_columns = [col[1] for col in cursor.fetchall()]
+        if 'plan_type' not in payment_columns:
+            cursor.execute("ALTER TABLE payments ADD COLUMN plan_type VARCHAR")
+            print("Successfully added plan_type column to payments table")
+
+        cursor.execute("PRAGMA table_info(conversations)")
+        conversation_columns = [col[1] for col in cursor.fetchall()]
+        if 'version' not in conversation_columns:
+            cursor.execute("ALTER TABLE conversations ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+            print("Successfully added version column to conversations table")
+
+        cursor.execute("PRAGMA table_info(personas)")
+        persona_columns = [col[1] for col in cursor.fetchall()]
+        if 'version' not in persona_columns:
+            cursor.execute("ALTER TABLE personas ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+            print("Successfully added version column to personas table")
+
+        cursor.execute("PRAGMA table_info(export_jobs)")
+        export_job_columns = [col[1] for col in cursor.fetchall()]
+        for column in ("started_at", "heartbeat_at"):
+            if column not in export_job_columns:
+                cursor.execute(f"ALTER TABLE export_jobs ADD COLUMN {column} DATETIME")
+                print(f"Successfully added {column} column to export_jobs table")
+
+        # List text moved to interned_texts: rows keep a hash, each distinct text is stored once
+        conn.create_function("text_hash", 1, text_hash, deterministic=True)
+        for _, model, text_column in LIST_SECTIONS:
+            table = model.__tablename__
+            cursor.execute(f"PRAGMA table_info({table})")
+            if text_column not in [col[1] for col in cursor.fetchall()]:
+                continue
+            cursor.execute(f"INSERT OR IGNORE INTO interned_texts (hash, text) SELECT DISTINCT text_hash({text_column}), {text_column} FROM {table}")
+            cursor.execute(f"SELECT count(*) FROM {table} JOIN interned_texts t ON t.hash = text_hash({text_column}) WHERE t.text != {table}.{text_column}")
+            if cursor.fetchone()[0]:
+                raise MigrationError(f"Hash collision interning {table}.{text_column}")
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN text_hash INTEGER REFERENCES interned_texts (hash)")
+            cursor.execute(f"UPDATE {table} SET text_hash = text_hash({text_column})")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_text_hash ON {table} (text_hash)")
+            cursor.execute(f"ALTER TABLE {table} DROP COLUMN {text_column}")
+            print(f"Successfully moved {table}.{text_column} to interned_texts (VACUUM to return the space; python -m src.text_store reports it)")
+
+        # Foreign keys used to fetch children in bulk
+        for table, column in [
+            ("personas", "user_id"), ("personas", "message_id"), ("messages", "conversation_id"),
+            ("goals", "persona_id"), ("frustrations", "persona_id"), ("behavioral_patterns", "persona_id"),
+            ("influence_networks", "persona_id"), ("recruitment_criteria", "persona_id"), ("research_assumptions", "persona_id"),
+        ]:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_{column} ON {table} ({column})")
+
+        # Facet counts for personas saved before they were maintained
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM persona_facets), EXISTS (SELECT 1 FROM personas)")
+        has_facets, has_personas = cursor.fetchone()
+        if has_personas and not has_facets:
+            cursor.execute(f"INSERT INTO persona_facets (user_id, facet, value, count) {REBUILD_FACETS}")
+            print("Successfully built persona facet counts")
+
+        # Data written before changes were logged, so a first sync returns it
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM change_log), EXISTS (SELECT 1 FROM conversations)")
+        has_changes, has_conversations = cursor.fetchone()
+        if has_conversations and not has_changes:
+            cursor.execute(BACKFILL_CHANGE_LOG)
+            print(f"Logged {cursor.rowcount} existing rows for sync")
+
+        # Personas saved before the search index existed
+        cursor.execute(BACKFILL_SEARCH_INDEX)
+        if cursor.rowcount > 0:
+            print(f"Indexed {cursor.rowcount} personas for search")
+
+        # Rows left behind while foreign keys were not enforced; deleting their parent no longer removes them
+        cursor.execute("PRAGMA foreign_key_check")
+        orphans = Counter(row[0] for row in cursor.fetchall())
+        if orphans:
+            print(f"Rows referencing deleted parents: {dict(orphans)}")
+
         conn.commit()
         conn.close()
+    except MigrationError:
+        # Not the "fresh database" case below: stop rather than run on a half-migrated schema
+        conn.rollback()
+        conn.close()
+        raise
     except Exception as e:
         print(f"Migration check failed (this is normal for fresh DBs): {e}")
 
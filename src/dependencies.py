@@ -2,13 +2,46 @@ from typing import Annotated
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlmodel import Session
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import Session, select
 from src.database import get_session
 from src.models import User
 from src.auth import SECRET_KEY, ALGORITHM
+from src.cache import MISSING, user_cache, cache_user
+from src.revocation import is_revoked
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+def load_user(session: Session, email: str):
+    """
+    The user with this email, attached to the session.
+    Served from the user cache when possible: the cached row is merged in
+    without a query, and relationships still lazy-load from this session.
+    """
+    snapshot = user_cache.get(email)
+    if snapshot is MISSING:
+        user = session.exec(select(User).where(User.email == email)).first()
+        if user is not None:
+            cache_user(user.model_dump())
+        return user
+    cached = User(**snapshot)
+    make_transient_to_detached(cached)
+    return session.merge(cached, load=False)
+
+def user_from_claims(session: Session, payload: dict) -> User:
+    """
+    The token's user, attached to the session without a query. Only the id and email
+    come from the token; any other column, such as the plan, loads from the database
+    on access, so routes that check entitlements always see the current plan.
+    """
+    user = inspect(User).class_manager.new_instance()
+    set_committed_value(user, "id", payload["uid"])
+    set_committed_value(user, "email", payload["sub"])
+    make_transient_to_detached(user)
+    return session.merge(user, load=False)
+
 async def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
     session: Annotated[Session, Depends(get_session)]
@@ -25,8 +58,14 @@ async def get_current_user(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-        
-    user = session.query(User).filter(User.email == email).first()
+
+    if is_revoked(session, payload):
+        raise credentials_exception
+    if "uid" in payload:
+        return user_from_claims(session, payload)
+
+    # Tokens issued before they carried claims
+    user = load_user(session, email)
     if user is None:
         raise credentials_exception
     return user
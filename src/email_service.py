@@ -1,29 +1,27 @@
 import os
-import resend
 from typing import Optional
 
-resend.api_key = os.environ.get("RESEND_API_KEY")
+RESEND_API_KEY = os.environ.get("RESEND_API_KEY")
 
-def send_otp_email(to_email: str, otp_code: str) -> bool:
+def otp_email(to_email: str, otp_code: str) -> dict:
+    """Resend parameters for the OTP email."""
+    return {
+        "from": "onboarding@resend.dev",
+        "to": [to_email],
+        "subject": "Your Login OTP",
+        "html": f"<p>Your OTP code is: <strong>{otp_code}</strong></p>",
+    }
+
+def send_email(params: dict):
     """
-    Send an OTP email using Resend.
-    If RESEND_API_KEY is not set, prints the OTP to the console (for dev).
+    Send an email using Resend; raises if it was not accepted.
+    If RESEND_API_KEY is not set, prints the email to the console (for dev).
     """
-    try:
-        if not resend.api_key:
-            print("WARNING: RESEND_API_KEY not found. Printing OTP to console.")
-            print(f"OTP for {to_email}: {otp_code}")
-            return True
-            
-        params = {
-            "from": "onboarding@resend.dev",
-            "to": [to_email],
-            "subject": "Your Login OTP",
-            "html": f"<p>Your OTP code is: <strong>{otp_code}</strong></p>",
-        }
-        
-        email = resend.Emails.send(params)
-        return True
-    except Exception as e:
-        print(f"Failed to send email: {e}")
-        return False
+    if not RESEND_API_KEY:
+        print("WARNING: RESEND_API_KEY not found. Printing email to console.")
+        print(f"Email to {', '.join(params['to'])}: {params['subject']}\n{params['html']}")
+        return
+    import resend  # Loaded on first send rather than at startup
+
+    resend.api_key = RESEND_API_KEY
+    resend.Emails.send(params)
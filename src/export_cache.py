@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import List, Optional
+
+# Rendered export artifacts are stored on local disk, keyed by a content hash,
+# so repeated exports of an unchanged selection skip rendering entirely.
+EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR", ".export_cache")
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+_eviction_lock = threading.Lock()
+
+
+def export_cache_key(personas_data: List[dict], export_format: str, template_version: str) -> str:
+    """Content hash of the serialized personas plus the output format and template version."""
+    canonical = json.dumps(
+        {"format": export_format, "template": template_version, "personas": personas_data},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def etag_for_key(key: str) -> str:
+    return f'"{key}"'
+
+
+def _artifact_path(key: str, extension: str) -> str:
+    return os.path.join(EXPORT_CACHE_DIR, f"{key}.{extension}")
+
+
+def read_cached_export(key: str, extension: str) -> Optional[bytes]:
+    """
+    Return the content of a cached artifact, marking it as recently used.
+    Read under the eviction lock, so an eviction cannot remove it while it is served.
+    Blocking disk I/O; call it off the event loop.
+    """
+    path = _artifact_path(key, extension)
+    with _eviction_lock:
+        try:
+            # mtime doubles as the LRU recency marker
+            os.utime(path)
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+def store_export(key: str, extension: str, content: bytes) -> str:
+    """
+    Atomically write an artifact to the cache and evict old entries past the size budget.
+    Blocking disk I/O; call it off the event loop.
+    """
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    path = _artifact_path(key, extension)
+    fd, tmp_path = tempfile.mkstemp(dir=EXPORT_CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    evict_exports(keep=path)
+    return path
+
+
+def evict_exports(max_bytes: Optional[int] = None, keep: Optional[str] = None) -> int:
+    """Remove least recently used artifacts until the cache fits in max_bytes. Returns files removed."""
+    if max_bytes is None:
+        max_bytes = EXPORT_CACHE_MAX_BYTES
+    with _eviction_lock:
+        entries = []
+        total = 0
+        try:
+            names = os.listdir(EXPORT_CACHE_DIR)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(EXPORT_CACHE_DIR, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
@@ -0,0 +1,244 @@
+import csv
+import importlib.util
+import os
+import secrets
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Optional
+
+from sqlalchemy import func, or_, update
+from sqlmodel import Session, select
+
+from src.models import User, Message, Persona, ExportJob
+from src.cache import invalidate_user
+from src.export_stream import EXPORT_CHUNK_SIZE, PERSONA_LOAD_OPTIONS, serialize_persona_for_export
+
+# Completed workspace exports are written here and served from disk
+EXPORT_JOBS_DIR = os.getenv("EXPORT_JOBS_DIR", ".export_jobs")
+# A queued job not started, or a running one without a heartbeat, for this long was
+# lost to a crash or restart and is failed, so the user can start a new one
+EXPORT_JOB_STALE_SECONDS = float(os.getenv("EXPORT_JOB_STALE_SECONDS", "300"))
+EXPORT_JOB_HEARTBEAT_SECONDS = 15
+# Artifacts are deleted this long after completion
+EXPORT_JOB_RETENTION_HOURS = float(os.getenv("EXPORT_JOB_RETENTION_HOURS", "24"))
+
+EXPORT_JOB_FORMATS = {
+    # format: (file extension, media type)
+    "csv": ("csv", "text/csv"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+    "arrow": ("arrow", "application/vnd.apache.arrow.file"),
+}
+
+INTEGER_COLUMNS = {"id", "conversation_id", "message_id"}
+SCALAR_COLUMNS = [
+    "id", "conversation_id", "message_id", "created_at",
+    "name", "status", "role", "tech_comfort", "scenario_context",
+    "age", "location", "education", "industry",
+]
+LIST_COLUMNS = [
+    "goals", "frustrations", "behavioral_patterns", "influence_networks",
+    "recruitment_criteria", "research_assumptions",
+]
+# List fields are flattened into a single CSV cell with this separator
+CSV_LIST_SEPARATOR = " | "
+
+
+def columnar_formats_available() -> bool:
+    """Parquet and Arrow output need the optional pyarrow dependency."""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def snapshot_max_persona_id(session: Session, user_id: int) -> int:
+    return session.exec(select(func.max(Persona.id)).where(Persona.user_id == user_id)).one() or 0
+
+
+def iter_snapshot_rows(session: Session, user_id: int, max_persona_id: int, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[dict]]:
+    """Yield flat persona rows for every conversation of the user, keyset-paginated by persona id."""
+    last_id = 0
+    while True:
+        results = session.exec(
+            select(Persona, Message.conversation_id)
+            .join(Message, Message.id == Persona.message_id)
+            .where(Persona.user_id == user_id, Persona.id > last_id, Persona.id <= max_persona_id)
+            .order_by(Persona.id)
+            .limit(chunk_size)
+            .options(*PERSONA_LOAD_OPTIONS)
+        ).all()
+        if not results:
+            return
+        rows = []
+        for persona, conversation_id in results:
+            data = serialize_persona_for_export(persona)
+            demographics = data.pop("demographics") or {}
+            rows.append({
+                "id": persona.id,
+                "conversation_id": conversation_id,
+                "message_id": persona.message_id,
+                "created_at": persona.created_at.isoformat(),
+                **{key: demographics.get(key) for key in ("age", "location", "education", "industry")},
+                **data,
+            })
+            session.expunge(persona)
+        last_id = results[-1][0].id
+        yield rows
+
+
+class _CsvWriter:
+    def __init__(self, path: str):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=SCALAR_COLUMNS + LIST_COLUMNS)
+        self._writer.writeheader()
+
+    def write_rows(self, rows: List[dict]):
+        for row in rows:
+            flat = dict(row)
+            for column in LIST_COLUMNS:
+                flat[column] = CSV_LIST_SEPARATOR.join(row[column])
+            self._writer.writerow(flat)
+
+    def close(self):
+        self._file.close()
+
+
+class _ArrowWriter:
+    """Writes record batches incrementally as Parquet row groups or Arrow IPC batches."""
+
+    def __init__(self, path: str, file_format: str):
+        import pyarrow as pa
+
+        self._pa = pa
+        fields = [pa.field(column, pa.int64() if column in INTEGER_COLUMNS else pa.string()) for column in SCALAR_COLUMNS]
+        fields += [pa.field(column, pa.list_(pa.string())) for column in LIST_COLUMNS]
+        self._schema = pa.schema(fields)
+        if file_format == "parquet":
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(path, self._schema)
+        else:
+            self._writer = pa.ipc.new_file(path, self._schema)
+
+    def write_rows(self, rows: List[dict]):
+        self._writer.write_batch(self._pa.RecordBatch.from_pylist(rows, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def _open_writer(file_format: str, path: str):
+    if file_format == "csv":
+        return _CsvWriter(path)
+    return _ArrowWriter(path, file_format)
+
+
+def run_export_job(bind, job_id: int):
+    """
+    Background task: write a snapshot of the user's personas to disk in chunks.
+    Runs after the response has been sent, so it opens its own session.
+    """
+    with Session(bind) as session:
+        job = session.get(ExportJob, job_id)
+        if job is None:
+            return
+        job.status = "running"
+        job.started_at = job.heartbeat_at = datetime.now(timezone.utc)
+        session.add(job)
+        session.commit()
+        last_heartbeat = time.monotonic()
+
+        os.makedirs(EXPORT_JOBS_DIR, exist_ok=True)
+        extension, _ = EXPORT_JOB_FORMATS[job.format]
+        # Unguessable file name; downloads are still authorized through the job owner
+        path = os.path.join(EXPORT_JOBS_DIR, f"export_{job.id}_{secrets.token_hex(8)}.{extension}")
+        tmp_path = path + ".part"
+        try:
+            writer = _open_writer(job.format, tmp_path)
+            total = 0
+            try:
+                for rows in iter_snapshot_rows(session, job.user_id, job.snapshot_max_id):
+                    writer.write_rows(rows)
+                    total += len(rows)
+                    if time.monotonic() - last_heartbeat > EXPORT_JOB_HEARTBEAT_SECONDS:
+                        job.heartbeat_at = datetime.now(timezone.utc)
+                        session.add(job)
+                        session.commit()
+                        last_heartbeat = time.monotonic()
+            finally:
+                writer.close()
+            os.replace(tmp_path, path)
+
+            completed_at = datetime.now(timezone.utc)
+            job.status = "completed"
+            job.file_path = path
+            job.total_personas = total
+            job.completed_at = completed_at
+            # Counts against the export allowance only once the artifact exists
+            session.execute(update(User).where(User.id == job.user_id).values(last_export_at=completed_at))
+        except Exception as e:
+            print(f"Export job {job.id} failed: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            job.status = "failed"
+            job.error = str(e)
+            job.completed_at = datetime.now(timezone.utc)
+        session.add(job)
+        session.commit()
+        if job.status == "completed":
+            invalidate_user(job.user_id)
+
+
+def _stale_jobs(now: datetime):
+    cutoff = now - timedelta(seconds=EXPORT_JOB_STALE_SECONDS)
+    return or_(
+        (ExportJob.status == "queued") & (ExportJob.created_at < cutoff),
+        (ExportJob.status == "running") & (func.coalesce(ExportJob.heartbeat_at, ExportJob.created_at) < cutoff),
+    )
+
+
+def fail_stale_jobs(session: Session, limit: int, user_id: Optional[int] = None) -> int:
+    """Fail queued or running jobs that were lost to a crash or restart."""
+    now = datetime.now(timezone.utc)
+    statement = select(ExportJob.id).where(_stale_jobs(now)).limit(limit)
+    if user_id is not None:
+        statement = statement.where(ExportJob.user_id == user_id)
+    ids = session.exec(statement).all()
+    if ids:
+        # Re-checked, so a job that heartbeats in between is left alone
+        session.exec(
+            update(ExportJob)
+            .where(ExportJob.id.in_(ids), _stale_jobs(now))
+            .values(status="failed", error="The export was interrupted. Please start a new one.", completed_at=now)
+        )
+        session.commit()
+    return len(ids)
+
+
+def expire_old_artifacts(session: Session, limit: int) -> int:
+    """Delete the files of jobs completed more than EXPORT_JOB_RETENTION_HOURS ago."""
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=EXPORT_JOB_RETENTION_HOURS)
+    jobs = session.exec(
+        select(ExportJob).where(ExportJob.status == "completed", ExportJob.completed_at < cutoff).limit(limit)
+    ).all()
+    for job in jobs:
+        if job.file_path and os.path.exists(job.file_path):
+            os.remove(job.file_path)
+        job.status = "expired"
+        job.file_path = None
+        session.add(job)
+    session.commit()
+    return len(jobs)
+
+
+def remove_orphaned_artifacts(session: Session) -> int:
+    """Delete files no job points to: partial files of interrupted jobs, files of deleted users."""
+    if not os.path.isdir(EXPORT_JOBS_DIR):
+        return 0
+    cutoff = time.time() - EXPORT_JOB_STALE_SECONDS
+    candidates = [entry.path for entry in os.scandir(EXPORT_JOBS_DIR) if entry.is_file() and entry.stat().st_mtime < cutoff]
+    if not candidates:
+        return 0
+    referenced = set(session.exec(select(ExportJob.file_path).where(ExportJob.file_path.in_(candidates))).all())
+    removed = 0
+    for path in candidates:
+        if path not in referenced:
+            os.remove(path)
+            removed += 1
+    return removed
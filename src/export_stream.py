@@ -0,0 +1,226 @@
+import json
+import os
+import textwrap
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional
+
+import msgpack
+from sqlalchemy import func, update
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, select
+
+from src.models import User, Persona
+from src.cache import invalidate_user
+
+# Personas fetched, serialized and released per round trip while streaming an export
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "200"))
+
+# Stay well below SQLite's bound-parameter limit for IN (...) clauses
+_MAX_IN_PARAMS = 500
+
+PERSONA_LOAD_OPTIONS = (
+    selectinload(Persona.demographics),
+    selectinload(Persona.goals),
+    selectinload(Persona.frustrations),
+    selectinload(Persona.behavioral_patterns),
+    selectinload(Persona.influence_networks),
+    selectinload(Persona.recruitment_criteria),
+    selectinload(Persona.research_assumptions),
+)
+
+
+def serialize_persona_for_export(persona: Persona) -> dict:
+    """Convert a Persona model to a clean dictionary for export."""
+    def get_ordered_text(items, text_attr):
+        return [getattr(item, text_attr) for item in sorted(items, key=lambda x: x.order_index)]
+
+    return {
+        "name": persona.name,
+        "status": persona.status,
+        "role": persona.role,
+        "tech_comfort": persona.tech_comfort,
+        "scenario_context": persona.scenario_context,
+        "demographics": {
+            "age": persona.demographics.age if persona.demographics else None,
+            "location": persona.demographics.location if persona.demographics else None,
+            "education": persona.demographics.education if persona.demographics else None,
+            "industry": persona.demographics.industry if persona.demographics else None,
+        } if persona.demographics else {},
+        "goals": get_ordered_text(persona.goals, "goal_text"),
+        "frustrations": get_ordered_text(persona.frustrations, "frustration_text"),
+        "behavioral_patterns": get_ordered_text(persona.behavioral_patterns, "pattern_text"),
+        "influence_networks": get_ordered_text(persona.influence_networks, "network_text"),
+        "recruitment_criteria": get_ordered_text(persona.recruitment_criteria, "criteria_text"),
+        "research_assumptions": get_ordered_text(persona.research_assumptions, "assumption_text"),
+    }
+
+
+def count_owned_personas(session: Session, user_id: int, persona_ids: List[int]) -> int:
+    """Count how many of persona_ids exist and belong to the user."""
+    total = 0
+    for i in range(0, len(persona_ids), _MAX_IN_PARAMS):
+        chunk = persona_ids[i:i + _MAX_IN_PARAMS]
+        total += session.exec(
+            select(func.count(Persona.id)).where(Persona.id.in_(chunk), Persona.user_id == user_id)
+        ).one()
+    return total
+
+
+def owned_persona_ids(session: Session, user_id: int, persona_ids: Optional[List[int]]) -> List[int]:
+    """The ids among persona_ids (every persona if None) that belong to the user, ascending."""
+    if persona_ids is None:
+        return list(session.exec(select(Persona.id).where(Persona.user_id == user_id).order_by(Persona.id)).all())
+    ids = sorted(set(persona_ids))
+    owned = []
+    for i in range(0, len(ids), _MAX_IN_PARAMS):
+        owned += session.exec(
+            select(Persona.id).where(Persona.id.in_(ids[i:i + _MAX_IN_PARAMS]), Persona.user_id == user_id).order_by(Persona.id)
+        ).all()
+    return owned
+
+
+def _serialize_and_release(session: Session, personas: List[Persona]) -> List[dict]:
+    chunk = [serialize_persona_for_export(p) for p in personas]
+    # Drop the loaded rows from the identity map (children follow via the expunge cascade)
+    for persona in personas:
+        session.expunge(persona)
+    return chunk
+
+
+def iter_persona_chunks(
+    session: Session,
+    user_id: int,
+    persona_ids: Optional[List[int]] = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> Iterator[List[dict]]:
+    """
+    Yield serialized personas in chunks of at most chunk_size.
+    With persona_ids=None every persona owned by the user is exported (keyset over id).
+    ORM objects are expunged after each chunk so memory stays flat regardless of selection size.
+    """
+    chunk_size = min(chunk_size, _MAX_IN_PARAMS)
+    if persona_ids is not None:
+        ids = sorted(set(persona_ids))
+        for i in range(0, len(ids), chunk_size):
+            personas = session.exec(
+                select(Persona)
+                .where(Persona.id.in_(ids[i:i + chunk_size]), Persona.user_id == user_id)
+                .order_by(Persona.id)
+                .options(*PERSONA_LOAD_OPTIONS)
+            ).all()
+            chunk = _serialize_and_release(session, personas)
+            if chunk:
+                yield chunk
+        return
+
+    last_id = 0
+    while True:
+        personas = session.exec(
+            select(Persona)
+            .where(Persona.user_id == user_id, Persona.id > last_id)
+            .order_by(Persona.id)
+            .limit(chunk_size)
+            .options(*PERSONA_LOAD_OPTIONS)
+        ).all()
+        if not personas:
+            return
+        last_id = personas[-1].id
+        chunk = _serialize_and_release(session, personas)
+        yield chunk
+
+
+def _json_document_chunks(chunks: Iterable[List[dict]], export_date: datetime, total: int) -> Iterator[bytes]:
+    # Produces byte-for-byte the same document as json.dumps(..., indent=2)
+    yield (
+        "{\n"
+        f'  "export_date": {json.dumps(export_date.isoformat())},\n'
+        f'  "total_personas": {total},\n'
+        '  "personas": ['
+    ).encode("utf-8")
+    first = True
+    for chunk in chunks:
+        parts = []
+        for persona in chunk:
+            parts.append(("\n" if first else ",\n") + textwrap.indent(json.dumps(persona, indent=2), "    "))
+            first = False
+        yield "".join(parts).encode("utf-8")
+    yield ("\n  ]\n}" if not first else "]\n}").encode("utf-8")
+
+
+def _ndjson_chunks(chunks: Iterable[List[dict]]) -> Iterator[bytes]:
+    for chunk in chunks:
+        yield "".join(json.dumps(persona) + "\n" for persona in chunk).encode("utf-8")
+
+
+def _msgpack_document_chunks(chunks: Iterable[List[dict]], export_date: datetime, total: int) -> Iterator[bytes]:
+    # Same document as the JSON export; the personas array is sized up front, so chunks
+    # must hold exactly total personas (stream_export reads them from one snapshot)
+    packer = msgpack.Packer(use_bin_type=True)
+    yield (
+        packer.pack_map_header(3)
+        + packer.pack("export_date") + packer.pack(export_date.isoformat())
+        + packer.pack("total_personas") + packer.pack(total)
+        + packer.pack("personas") + packer.pack_array_header(total)
+    )
+    for chunk in chunks:
+        yield b"".join(packer.pack(persona) for persona in chunk)
+
+
+def _msgpack_sequence_chunks(chunks: Iterable[List[dict]]) -> Iterator[bytes]:
+    # NDJSON equivalent: one self-delimiting MessagePack object per persona
+    packer = msgpack.Packer(use_bin_type=True)
+    for chunk in chunks:
+        yield b"".join(packer.pack(persona) for persona in chunk)
+
+
+def gzip_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compress a byte stream on the fly into a gzip member."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_export(
+    bind,
+    user_id: int,
+    persona_ids: Optional[List[int]],
+    export_format: str,
+    export_date: datetime,
+    compress: bool = False,
+    encoding: str = "json",
+) -> Iterator[bytes]:
+    """
+    Stream a JSON or NDJSON export straight from the database, encoded as JSON or MessagePack.
+    Uses its own session, since the request session is gone once the response starts,
+    and records the export on the user only after the last byte has been produced.
+    """
+    with Session(bind) as session:
+        # One read transaction for the whole stream: the ids are taken and every persona
+        # is read from the same snapshot, so the total written up front stays true even
+        # if a persona is deleted while the export streams
+        session.connection().exec_driver_sql("BEGIN")
+        ids = owned_persona_ids(session, user_id, persona_ids)
+        total = len(ids)
+        chunks = iter_persona_chunks(session, user_id, ids)
+        if encoding == "msgpack":
+            if export_format == "ndjson":
+                body = _msgpack_sequence_chunks(chunks)
+            else:
+                body = _msgpack_document_chunks(chunks, export_date, total)
+        elif export_format == "ndjson":
+            body = _ndjson_chunks(chunks)
+        else:
+            body = _json_document_chunks(chunks, export_date, total)
+        if compress:
+            body = gzip_stream(body)
+        yield from body
+        # Ends the snapshot; the write below takes the lock in a fresh transaction
+        session.commit()
+
+        session.execute(update(User).where(User.id == user_id).values(last_export_at=export_date))
+        session.commit()
+        invalidate_user(user_id)
@@ -1,7 +1,6 @@
+import asyncio
 import os
 import json
-from google import genai
-from google.genai import types
 from src.prompts import refined_generation_prompt, chat_naming_prompt, user_follow_up_prompt
 from dotenv import load_dotenv
 from typing import Optional
@@ -110,7 +109,7 @@ def parse_json(json_str: str, is_chat_name: bool = False) -> dict:
         print(f"Parsed data: {parsed_data}")
         return {}
 
-def generate_chat_name(first_message: str) -> dict:
+async def generate_chat_name(first_message: str) -> dict:
     """
     Generate chat name based on the provided text using Gemini API.
     
@@ -130,7 +129,13 @@ def generate_chat_name(first_message: str) -> dict:
     create a chat name based on the first chat message. The response is
     automatically parsed and validated against the expected schema before
     being returned.
+
+    Cancelling the awaiting task closes the request to Gemini.
     """
+    # google-genai takes a few hundred ms to import; loaded on first generation
+    from google import genai
+    from google.genai import types
+
     client = genai.Client(
         api_key=os.environ.get("GOOGLE_API_KEY"),
     )
@@ -153,7 +158,7 @@ def generate_chat_name(first_message: str) -> dict:
             types.Part.from_text(text=chat_naming_prompt),
         ],
     )
-    output = client.models.generate_content(
+    output = await client.aio.models.generate_content(
         model=model,
         contents=contents,
         config=generate_content_config,
@@ -165,7 +170,7 @@ def generate_chat_name(first_message: str) -> dict:
     parsed_chat_name = parse_json(raw_output_str, is_chat_name=True)
     return parsed_chat_name 
 
-def generate_personas(text: str, generated_persona: Optional[str] = None) -> dict:
+async def generate_personas(text: str, generated_persona: Optional[str] = None) -> dict:
     """
     Generate user personas based on the provided text using Gemini API.
     
@@ -190,7 +195,13 @@ def generate_personas(text: str, generated_persona: Optional[str] = None) -> dic
     The generated personas include primary and secondary user types with
     detailed information about demographics, goals, frustrations, and
     research assumptions for user validation studies.
+
+    Cancelling the awaiting task closes the request to Gemini, so a generation
+    nobody is waiting for stops using quota.
     """
+    from google import genai
+    from google.genai import types
+
     client = genai.Client(
         api_key=os.environ.get("GOOGLE_API_KEY"),
     )
@@ -234,7 +245,7 @@ def generate_personas(text: str, generated_persona: Optional[str] = None) -> dic
             ],
         )
     
-    output = client.models.generate_content(
+    output = await client.aio.models.generate_content(
         model=model,
         contents=contents,
         config=generate_content_config,
@@ -249,7 +260,7 @@ def generate_personas(text: str, generated_persona: Optional[str] = None) -> dic
 if __name__ == "__main__":
     print("Hey there! What are you building today?")
     user_input = input()
-    output = generate_personas(user_input)
+    output = asyncio.run(generate_personas(user_input))
     
     if output and "personas" in output:
         print(f"\nGenerated {len(output['personas'])} personas:")
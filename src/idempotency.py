@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import orjson
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import delete, or_, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select
+
+from src.cancellation import GENERATION_DEADLINE_SECONDS, finish_after_disconnect
+from src.models import IdempotencyRecord
+
+# POSTs that start a generation accept an Idempotency-Key header. The first request
+# with a key does the work and stores its response; retries get the stored response,
+# and a retry that arrives while the first is still running waits for its result
+# instead of starting a second generation. A client disconnecting doesn't cancel
+# the work. Failed requests store nothing, so they can be retried with the same key.
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+# How long a request holds its key; longer than any generation may take
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", str(GENERATION_DEADLINE_SECONDS + 30)))
+# Between checks while another worker runs the request
+IDEMPOTENCY_POLL_SECONDS = 0.25
+
+# Requests with a key running in this process, set when their outcome is stored
+_in_flight: Dict[Tuple[int, str], asyncio.Event] = {}
+
+
+def request_fingerprint(request: Request, body: bytes) -> str:
+    return hashlib.sha256(b"\n".join([request.method.encode(), request.url.path.encode(), body])).hexdigest()
+
+
+def _claim(session: Session, user_id: int, key: str, fingerprint: str) -> bool:
+    """Take the key for this request: new, expired, or abandoned by a worker that died."""
+    now = datetime.now(timezone.utc)
+    statement = insert(IdempotencyRecord).values(
+        user_id=user_id,
+        key=key,
+        fingerprint=fingerprint,
+        status="in_progress",
+        locked_until=now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+        expires_at=now + timedelta(hours=IDEMPOTENCY_TTL_HOURS),
+        created_at=now,
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=["user_id", "key"],
+        set_={
+            "fingerprint": statement.excluded.fingerprint,
+            "status": statement.excluded.status,
+            "status_code": None,
+            "response_body": None,
+            "locked_until": statement.excluded.locked_until,
+            "expires_at": statement.excluded.expires_at,
+            "created_at": statement.excluded.created_at,
+        },
+        where=or_(
+            IdempotencyRecord.expires_at <= now,
+            (IdempotencyRecord.status == "in_progress") & (IdempotencyRecord.locked_until <= now),
+        ),
+    )
+    claimed = session.exec(statement).rowcount == 1
+    session.commit()
+    return claimed
+
+
+def _record_filter(user_id: int, key: str):
+    return (IdempotencyRecord.user_id == user_id, IdempotencyRecord.key == key)
+
+
+def _replay(record: IdempotencyRecord) -> Response:
+    return Response(
+        content=record.response_body,
+        status_code=record.status_code,
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+async def _wait_for_outcome(user_id: int, key: str):
+    event = _in_flight.get((user_id, key))
+    if event is None:
+        # Running in another worker: poll
+        await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+        return
+    try:
+        await asyncio.wait_for(event.wait(), timeout=IDEMPOTENCY_POLL_SECONDS * 4)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def run_idempotent(
+    request: Request,
+    session: Session,
+    user_id: int,
+    key: Optional[str],
+    work: Callable[[], Awaitable[Any]],
+    encode: Callable[[Any], Any] = lambda result: result,
+) -> Any:
+    """
+    Run work() once per (user, Idempotency-Key). encode turns its result into the
+    JSON-compatible response body that is stored and replayed. Without a key, work()
+    runs as usual and its result is returned as is.
+    """
+    if key is None:
+        return await work()
+    if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{IDEMPOTENCY_KEY_MAX_LENGTH} characters")
+    fingerprint = request_fingerprint(request, await request.body())
+
+    give_up_at = time.monotonic() + IDEMPOTENCY_LOCK_SECONDS
+    while not _claim(session, user_id, key, fingerprint):
+        record = session.exec(
+            select(IdempotencyRecord).where(*_record_filter(user_id, key)).execution_options(populate_existing=True)
+        ).first()
+        if record is None:
+            continue  # The other request failed and released the key
+        if record.fingerprint != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        if record.status == "completed":
+            return _replay(record)
+        if time.monotonic() > give_up_at:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+        await _wait_for_outcome(user_id, key)
+
+    event = _in_flight[(user_id, key)] = asyncio.Event()
+    # A client that gives up will retry with the key, and retries may already be
+    # waiting, so the work is only abandoned at its deadline
+    finish_after_disconnect(request)
+    try:
+        try:
+            body = orjson.dumps(encode(await work()), option=orjson.OPT_NON_STR_KEYS)
+        except BaseException:
+            # Nothing is stored for failures, so a retry runs again
+            session.rollback()
+            session.exec(delete(IdempotencyRecord).where(*_record_filter(user_id, key)))
+            session.commit()
+            raise
+        session.exec(
+            update(IdempotencyRecord)
+            .where(*_record_filter(user_id, key))
+            .values(status="completed", status_code=200, response_body=body.decode())
+        )
+        session.commit()
+    finally:
+        del _in_flight[(user_id, key)]
+        event.set()
+    return Response(content=body, media_type="application/json")
+
@@ -0,0 +1,60 @@
+import difflib
+from typing import List, NamedTuple, Sequence, Tuple
+
+from sqlalchemy import delete, insert, update
+from sqlmodel import Session, select
+
+from src.text_store import intern_texts
+
+# Edits to a persona's list sections (goals, frustrations, ...) change only the rows
+# that differ. Old and new texts are aligned with a sequence diff: unchanged items
+# keep their row (and only move if their position changed), a run of edited items
+# rewrites the rows it replaces in place, and whatever is left over is inserted or
+# deleted. Fixing a typo in one goal is one UPDATE instead of replacing every row.
+
+
+class ListDiff(NamedTuple):
+    updates: List[Tuple[int, str, int]]  # (row id, text, order_index) of rows whose text or position changed
+    inserts: List[Tuple[str, int]]  # (text, order_index)
+    deletes: List[int]  # Row ids
+
+
+def diff_list(old: Sequence[Tuple[int, str, int]], new: Sequence[str]) -> ListDiff:
+    """Row changes that turn the old (id, text, order_index) rows, in list order, into the new texts."""
+    updates, inserts, deletes = [], [], []
+    matcher = difflib.SequenceMatcher(None, [text for _, text, _ in old], list(new), autojunk=False)
+    for _, i1, i2, j1, j2 in matcher.get_opcodes():
+        # Pairs rows with new items positionally; equal runs pair identical texts
+        for i, j in zip(range(i1, i2), range(j1, j2)):
+            row_id, text, order_index = old[i]
+            if text != new[j] or order_index != j:
+                updates.append((row_id, new[j], j))
+        paired = min(i2 - i1, j2 - j1)
+        deletes.extend(row_id for row_id, _, _ in old[i1 + paired:i2])
+        inserts.extend((new[j], j) for j in range(j1 + paired, j2))
+    return ListDiff(updates, inserts, deletes)
+
+
+def apply_list_edit(session: Session, model, text_column: str, persona_id: int, texts: Sequence[str]) -> ListDiff:
+    """Make the persona's rows of a list section match texts, with one bulk statement per kind of change."""
+    old = session.exec(
+        select(model.id, getattr(model, text_column), model.order_index)
+        .where(model.persona_id == persona_id)
+        .order_by(model.order_index, model.id)
+    ).all()
+    diff = diff_list(old, texts)
+    hashes = intern_texts(session, [text for _, text, _ in diff.updates] + [text for text, _ in diff.inserts])
+    if diff.deletes:
+        session.execute(delete(model).where(model.id.in_(diff.deletes)))
+    if diff.updates:
+        # Bulk UPDATE by primary key: one executemany
+        session.execute(update(model), [
+            {"id": row_id, "text_hash": hashes[text], "order_index": order_index}
+            for row_id, text, order_index in diff.updates
+        ])
+    if diff.inserts:
+        session.execute(insert(model), [
+            {"persona_id": persona_id, "text_hash": hashes[text], "order_index": order_index}
+            for text, order_index in diff.inserts
+        ])
+    return diff
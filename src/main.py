@@ -13,12 +13,35 @@ from src.routers.chat import router as chat_router
 from src.routers.export import router as export_router
 from src.routers.payments import router as payments_router
 from src.routers.personas import router as personas_router
-import uvicorn
+from src.routers.sync import router as sync_router
+from src.render_pool import get_render_stats, schedule_render_pool_warmup, shutdown_render_pool
+from src.compression import CompressionMiddleware
+from src.cache import get_cache_stats
+from src.auth import close_http_client
+from src.database import engine
+from src.outbox import start_outbox_dispatcher, stop_outbox_dispatcher
+from src.revocation import get_revocation_stats
+from src.scheduler import start_scheduler, stop_scheduler, get_scheduler_stats
+from src.cancellation import get_generation_stats
+from src.rate_limit import RateLimitMiddleware, get_rate_limit_stats
+
+# Migrations run as a separate step (python -m src.migrate), keeping them off the
+# cold start of every API worker; set to true for local development
+RUN_MIGRATIONS_ON_STARTUP = os.getenv("RUN_MIGRATIONS_ON_STARTUP", "false").lower() == "true"
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    create_db_and_tables()
+    if RUN_MIGRATIONS_ON_STARTUP:
+        create_db_and_tables()
+    render_warmup = schedule_render_pool_warmup()
+    start_outbox_dispatcher(engine)
+    start_scheduler(engine)
     yield
+    await stop_scheduler()
+    await stop_outbox_dispatcher()
+    render_warmup.cancel()
+    shutdown_render_pool()
+    await close_http_client()
 
 app = FastAPI(
     title="User Persona Generator API",
@@ -40,12 +63,18 @@ allowed_origins_env = os.getenv("ALLOWED_ORIGINS")
 if allowed_origins_env:
     origins.extend([origin.strip() for origin in allowed_origins_env.split(",")])
 
+# Added before CORS so CORS stays the outermost middleware
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(CompressionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Readable by the frontend, so it can back off before hitting the limit
+    expose_headers=["RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset", "RateLimit-Policy", "Retry-After"],
 )
 
 app.include_router(auth_router)
@@ -53,6 +82,7 @@ app.include_router(chat_router)
 app.include_router(export_router)
 app.include_router(payments_router)
 app.include_router(personas_router)
+app.include_router(sync_router)
 
 @app.get("/")
 async def root():
@@ -72,7 +102,22 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "service": "persona-generator"}
 
+@app.get("/metrics")
+async def metrics():
+    """Process-level performance metrics"""
+    return {
+        "pdf_render": get_render_stats(),
+        "cache": get_cache_stats(),
+        "revocation": get_revocation_stats(),
+        "scheduler": get_scheduler_stats(),
+        "generation": get_generation_stats(),
+        "rate_limit": get_rate_limit_stats(),
+    }
+
 if __name__ == "__main__":
+    import uvicorn
+
+    create_db_and_tables()
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
@@ -0,0 +1,24 @@
+"""
+Create tables and apply migrations. Run before starting (or scaling) the API:
+
+    python -m src.migrate
+
+The API process does not migrate on startup unless RUN_MIGRATIONS_ON_STARTUP=true.
+"""
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from src.database import create_db_and_tables, sqlite_url
+
+
+def main():
+    start = time.perf_counter()
+    create_db_and_tables()
+    print(f"Database at {sqlite_url} is up to date ({(time.perf_counter() - start) * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
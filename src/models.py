@@ -1,7 +1,13 @@
 from datetime import datetime, timezone
 from typing import Optional, List
+from sqlalchemy import Index, UniqueConstraint, select
+from sqlalchemy.orm import column_property
 from sqlmodel import SQLModel, Field, Relationship
 
+# Child rows are deleted by the database (ON DELETE CASCADE, with foreign keys enabled
+# on every connection), so relationships use passive_deletes: deleting a parent is a
+# single statement instead of loading and deleting each child through the ORM.
+
 class User(SQLModel, table=True):
     __tablename__ = "users"
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -17,10 +23,10 @@ class User(SQLModel, table=True):
     last_export_at: Optional[datetime] = Field(default=None, index=True)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     
-    otps: List["OneTimePassword"] = Relationship(back_populates="user", sa_relationship_kwargs={"cascade": "all, delete"})
-    conversations: List["Conversation"] = Relationship(back_populates="user", sa_relationship_kwargs={"cascade": "all, delete"})
-    personas: List["Persona"] = Relationship(back_populates="user", sa_relationship_kwargs={"cascade": "all, delete"})
-    payments: List["Payment"] = Relationship(back_populates="user", sa_relationship_kwargs={"cascade": "all, delete"})
+    otps: List["OneTimePassword"] = Relationship(back_populates="user", sa_relationship_kwargs={"cascade": "all, delete", "passive_deletes": True})
+    conversations: List["Conversation"] = Relationship(back_populates="user", sa_relationship_kwargs={"cascade": "all, delete", "passive_deletes": True})
+    personas: List["Persona"] = Relationship(back_populates="user", sa_relationship_kwargs={"cascade": "all, delete", "passive_deletes": True})
+    payments: List["Payment"] = Relationship(back_populates="user", sa_relationship_kwargs={"cascade": "all, delete", "passive_deletes": True})
 
 class Payment(SQLModel, table=True):
     __tablename__ = "payments"
@@ -31,10 +37,119 @@ class Payment(SQLModel, table=True):
     amount: float
     currency: str = "INR"
     status: str # created, paid, failed
+    plan_type: Optional[str] = None # plus, pro or lifetime; what the order pays for
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     
     user: User = Relationship(back_populates="payments")
 
+class PaymentEvent(SQLModel, table=True):
+    __tablename__ = "payment_events"
+    # Makes payment processing idempotent: a webhook delivery (event_id) and each
+    # effect on a payment (payment_id, event) are recorded exactly once
+    __table_args__ = (UniqueConstraint("payment_id", "event", name="uq_payment_events_payment_event"),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    event_id: Optional[str] = Field(default=None, unique=True) # X-Razorpay-Event-Id of a webhook delivery
+    event: str # Razorpay event name, or plan_activated
+    payment_id: Optional[str] = Field(default=None, index=True)
+    order_id: Optional[str] = None
+    received_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class ExportJob(SQLModel, table=True):
+    __tablename__ = "export_jobs"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="users.id", ondelete="CASCADE", index=True)
+    format: str # csv, parquet or arrow
+    status: str = Field(default="queued") # queued, running, completed, failed, expired (artifact deleted)
+    # Highest persona id at submission; personas created afterwards are not part of the snapshot
+    snapshot_max_id: int = Field(default=0)
+    total_personas: int = Field(default=0)
+    file_path: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: Optional[datetime] = None
+    # Refreshed while the job runs; a running job without a recent heartbeat was interrupted
+    heartbeat_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+class PersonaFacet(SQLModel, table=True):
+    __tablename__ = "persona_facets"
+    # Number of the user's personas with this value, kept up to date on every write
+    user_id: int = Field(foreign_key="users.id", ondelete="CASCADE", primary_key=True)
+    facet: str = Field(primary_key=True) # status, tech_comfort, industry or location
+    value: str = Field(primary_key=True)
+    count: int = Field(default=0)
+
+class ChangeLogEntry(SQLModel, table=True):
+    __tablename__ = "change_log"
+    # AUTOINCREMENT: superseded rows are deleted, and a reused id could fall behind a client's cursor
+    __table_args__ = (Index("ix_change_log_entity", "entity", "entity_id"), {"sqlite_autoincrement": True})
+    # The id is the sync cursor. Only the latest change of each entity is kept.
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="users.id", ondelete="CASCADE", index=True)
+    entity: str # conversation, message or persona
+    entity_id: int
+    op: str # upsert or delete
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class RefreshToken(SQLModel, table=True):
+    __tablename__ = "refresh_tokens"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="users.id", ondelete="CASCADE", index=True)
+    token_hash: str = Field(unique=True, index=True) # sha256 of the token; the token itself is never stored
+    family_id: str = Field(index=True) # Every rotation of one login shares a family
+    expires_at: datetime
+    revoked_at: Optional[datetime] = None # Set when rotated, logged out or the family is revoked
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class RevokedToken(SQLModel, table=True):
+    __tablename__ = "revoked_tokens"
+    # Access tokens revoked before they expire; rows are dropped once they would have expired anyway
+    jti: str = Field(primary_key=True)
+    expires_at: datetime = Field(index=True)
+
+class SchedulerLease(SQLModel, table=True):
+    __tablename__ = "scheduler_leases"
+    # Leader lock per periodic job: only the worker holding an unexpired lease runs it
+    name: str = Field(primary_key=True)
+    owner: str
+    expires_at: datetime
+
+class IdempotencyRecord(SQLModel, table=True):
+    __tablename__ = "idempotency_keys"
+    # Outcome of a POST sent with an Idempotency-Key, replayed to retries of the same request
+    __table_args__ = (UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_key"),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="users.id", ondelete="CASCADE")
+    key: str
+    fingerprint: str # sha256 of method, path and body; a key reused for another request is rejected
+    status: str = Field(default="in_progress") # in_progress, completed
+    status_code: Optional[int] = None
+    response_body: Optional[str] = None # JSON
+    locked_until: datetime # An in_progress record past this is taken over (its worker died)
+    expires_at: datetime = Field(index=True)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class RateLimitBucket(SQLModel, table=True):
+    __tablename__ = "rate_limit_buckets"
+    # Token buckets shared by all workers (RATE_LIMIT_BACKEND=sqlite)
+    key: str = Field(primary_key=True) # user:<id> or ip:<address>
+    tokens: float
+    updated_at: float = Field(index=True) # Unix time of the last refill
+
+class OutboxMessage(SQLModel, table=True):
+    __tablename__ = "outbox"
+    # Side effects (emails) written in the same transaction as the change that causes them
+    id: Optional[int] = Field(default=None, primary_key=True)
+    kind: str # otp_email
+    payload: str # JSON
+    status: str = Field(default="pending") # pending, sent, failed
+    attempts: int = Field(default=0)
+    next_attempt_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)
+    locked_until: Optional[datetime] = None # Lease held by the dispatcher delivering it
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    sent_at: Optional[datetime] = None
+
 class OneTimePassword(SQLModel, table=True):
     __tablename__ = "one_time_passwords"
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -51,44 +166,48 @@ class Conversation(SQLModel, table=True):
     user_id: int = Field(foreign_key="users.id", ondelete="CASCADE")
     title: Optional[str] = None
     last_message_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    # Bumped whenever a message or persona in the conversation changes; part of its ETag
+    version: int = Field(default=1)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     
     user: User = Relationship(back_populates="conversations")
-    messages: List["Message"] = Relationship(back_populates="conversation", sa_relationship_kwargs={"cascade": "all, delete"})
+    messages: List["Message"] = Relationship(back_populates="conversation", sa_relationship_kwargs={"cascade": "all, delete", "passive_deletes": True})
 
 class Message(SQLModel, table=True):
     __tablename__ = "messages"
     id: Optional[int] = Field(default=None, primary_key=True)
-    conversation_id: int = Field(foreign_key="conversations.id", ondelete="CASCADE")
+    conversation_id: int = Field(foreign_key="conversations.id", ondelete="CASCADE", index=True)
     role: str # user or assistant
     content: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     
     conversation: Conversation = Relationship(back_populates="messages")
-    personas: List["Persona"] = Relationship(back_populates="message", sa_relationship_kwargs={"cascade": "all, delete"})
+    personas: List["Persona"] = Relationship(back_populates="message", sa_relationship_kwargs={"cascade": "all, delete", "passive_deletes": True})
 
 class Persona(SQLModel, table=True):
     __tablename__ = "personas"
     id: Optional[int] = Field(default=None, primary_key=True)
-    message_id: int = Field(foreign_key="messages.id", ondelete="CASCADE")
-    user_id: int = Field(foreign_key="users.id", ondelete="CASCADE")
+    message_id: int = Field(foreign_key="messages.id", ondelete="CASCADE", index=True)
+    user_id: int = Field(foreign_key="users.id", ondelete="CASCADE", index=True)
     name: str
     status: str # primary or secondary
     role: str
     tech_comfort: str
     scenario_context: Optional[str] = None
+    # Bumped by every edit; an edit made against an older version is rejected
+    version: int = Field(default=1)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     
     message: Message = Relationship(back_populates="personas")
     user: User = Relationship(back_populates="personas")
     
-    demographics: Optional["Demographics"] = Relationship(back_populates="persona", sa_relationship_kwargs={"cascade": "all, delete", "uselist": False})
-    goals: List["Goal"] = Relationship(back_populates="persona", sa_relationship_kwargs={"cascade": "all, delete"})
-    frustrations: List["Frustration"] = Relationship(back_populates="persona", sa_relationship_kwargs={"cascade": "all, delete"})
-    behavioral_patterns: List["BehavioralPattern"] = Relationship(back_populates="persona", sa_relationship_kwargs={"cascade": "all, delete"})
-    influence_networks: List["InfluenceNetwork"] = Relationship(back_populates="persona", sa_relationship_kwargs={"cascade": "all, delete"})
-    recruitment_criteria: List["RecruitmentCriteria"] = Relationship(back_populates="persona", sa_relationship_kwargs={"cascade": "all, delete"})
-    research_assumptions: List["ResearchAssumption"] = Relationship(back_populates="persona", sa_relationship_kwargs={"cascade": "all, delete"})
+    demographics: Optional["Demographics"] = Relationship(back_populates="persona", sa_relationship_kwargs={"cascade": "all, delete", "passive_deletes": True, "uselist": False})
+    goals: List["Goal"] = Relationship(back_populates="persona", sa_relationship_kwargs={"cascade": "all, delete", "passive_deletes": True, "order_by": "Goal.order_index"})
+    frustrations: List["Frustration"] = Relationship(back_populates="persona", sa_relationship_kwargs={"cascade": "all, delete", "passive_deletes": True, "order_by": "Frustration.order_index"})
+    behavioral_patterns: List["BehavioralPattern"] = Relationship(back_populates="persona", sa_relationship_kwargs={"cascade": "all, delete", "passive_deletes": True, "order_by": "BehavioralPattern.order_index"})
+    influence_networks: List["InfluenceNetwork"] = Relationship(back_populates="persona", sa_relationship_kwargs={"cascade": "all, delete", "passive_deletes": True, "order_by": "InfluenceNetwork.order_index"})
+    recruitment_criteria: List["RecruitmentCriteria"] = Relationship(back_populates="persona", sa_relationship_kwargs={"cascade": "all, delete", "passive_deletes": True, "order_by": "RecruitmentCriteria.order_index"})
+    research_assumptions: List["ResearchAssumption"] = Relationship(back_populates="persona", sa_relationship_kwargs={"cascade": "all, delete", "passive_deletes": True, "order_by": "ResearchAssumption.order_index"})
 
 class Demographics(SQLModel, table=True):
     __tablename__ = "demographics"
@@ -101,11 +220,18 @@ class Demographics(SQLModel, table=True):
     
     persona: Persona = Relationship(back_populates="demographics")
 
+class InternedText(SQLModel, table=True):
+    __tablename__ = "interned_texts"
+    # Text of persona list items (goals, frustrations, ...), stored once however many
+    # personas repeat it. Regenerated personas mostly repeat their predecessors' items.
+    hash: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False}) # src.text_store.text_hash of the text
+    text: str
+
 class Goal(SQLModel, table=True):
     __tablename__ = "goals"
     id: Optional[int] = Field(default=None, primary_key=True)
-    persona_id: int = Field(foreign_key="personas.id", ondelete="CASCADE")
-    goal_text: str
+    persona_id: int = Field(foreign_key="personas.id", ondelete="CASCADE", index=True)
+    text_hash: int = Field(foreign_key="interned_texts.hash", index=True) # goal_text, interned
     order_index: int
     
     persona: Persona = Relationship(back_populates="goals")
@@ -113,8 +239,8 @@ class Goal(SQLModel, table=True):
 class Frustration(SQLModel, table=True):
     __tablename__ = "frustrations"
     id: Optional[int] = Field(default=None, primary_key=True)
-    persona_id: int = Field(foreign_key="personas.id", ondelete="CASCADE")
-    frustration_text: str
+    persona_id: int = Field(foreign_key="personas.id", ondelete="CASCADE", index=True)
+    text_hash: int = Field(foreign_key="interned_texts.hash", index=True) # frustration_text, interned
     order_index: int
     
     persona: Persona = Relationship(back_populates="frustrations")
@@ -122,8 +248,8 @@ class Frustration(SQLModel, table=True):
 class BehavioralPattern(SQLModel, table=True):
     __tablename__ = "behavioral_patterns"
     id: Optional[int] = Field(default=None, primary_key=True)
-    persona_id: int = Field(foreign_key="personas.id", ondelete="CASCADE")
-    pattern_text: str
+    persona_id: int = Field(foreign_key="personas.id", ondelete="CASCADE", index=True)
+    text_hash: int = Field(foreign_key="interned_texts.hash", index=True) # pattern_text, interned
     order_index: int
     
     persona: Persona = Relationship(back_populates="behavioral_patterns")
@@ -131,8 +257,8 @@ class BehavioralPattern(SQLModel, table=True):
 class InfluenceNetwork(SQLModel, table=True):
     __tablename__ = "influence_networks"
     id: Optional[int] = Field(default=None, primary_key=True)
-    persona_id: int = Field(foreign_key="personas.id", ondelete="CASCADE")
-    network_text: str
+    persona_id: int = Field(foreign_key="personas.id", ondelete="CASCADE", index=True)
+    text_hash: int = Field(foreign_key="interned_texts.hash", index=True) # network_text, interned
     order_index: int
     
     persona: Persona = Relationship(back_populates="influence_networks")
@@ -140,8 +266,8 @@ class InfluenceNetwork(SQLModel, table=True):
 class RecruitmentCriteria(SQLModel, table=True):
     __tablename__ = "recruitment_criteria"
     id: Optional[int] = Field(default=None, primary_key=True)
-    persona_id: int = Field(foreign_key="personas.id", ondelete="CASCADE")
-    criteria_text: str
+    persona_id: int = Field(foreign_key="personas.id", ondelete="CASCADE", index=True)
+    text_hash: int = Field(foreign_key="interned_texts.hash", index=True) # criteria_text, interned
     order_index: int
     
     persona: Persona = Relationship(back_populates="recruitment_criteria")
@@ -149,8 +275,19 @@ class RecruitmentCriteria(SQLModel, table=True):
 class ResearchAssumption(SQLModel, table=True):
     __tablename__ = "research_assumptions"
     id: Optional[int] = Field(default=None, primary_key=True)
-    persona_id: int = Field(foreign_key="personas.id", ondelete="CASCADE")
-    assumption_text: str
+    persona_id: int = Field(foreign_key="personas.id", ondelete="CASCADE", index=True)
+    text_hash: int = Field(foreign_key="interned_texts.hash", index=True) # assumption_text, interned
     order_index: int
     
     persona: Persona = Relationship(back_populates="research_assumptions")
+
+def _interned_text(model):
+    return column_property(select(InternedText.text).where(InternedText.hash == model.text_hash).scalar_subquery())
+
+# The item's text, read with the row; to write it, set text_hash (src.text_store.intern_texts)
+Goal.goal_text = _interned_text(Goal)
+Frustration.frustration_text = _interned_text(Frustration)
+BehavioralPattern.pattern_text = _interned_text(BehavioralPattern)
+InfluenceNetwork.network_text = _interned_text(InfluenceNetwork)
+RecruitmentCriteria.criteria_text = _interned_text(RecruitmentCriteria)
+ResearchAssumption.assumption_text = _interned_text(ResearchAssumption)
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import or_, update
+from sqlmodel import Session, select
+
+from src.email_service import otp_email, send_email
+from src.models import OutboxMessage
+
+# Emails are written to the outbox in the same transaction as the change that
+# causes them, then delivered by a background dispatcher with retries. A request
+# never waits on the email provider, and a provider outage delays mail instead of
+# losing it.
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "2"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_BACKOFF_SECONDS", "5"))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "3600"))
+# How long a claimed message is hidden from other dispatchers while it is delivered
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+# "resend", or "file" to append emails to OUTBOX_FILE_SINK_PATH instead of sending them
+OUTBOX_SINK = os.getenv("OUTBOX_SINK", "resend")
+OUTBOX_FILE_SINK_PATH = os.getenv("OUTBOX_FILE_SINK_PATH", ".outbox/emails.jsonl")
+
+# Message kind -> builds the email from the stored payload
+EMAIL_BUILDERS: Dict[str, Callable[[dict], dict]] = {
+    "otp_email": lambda payload: otp_email(payload["to"], payload["otp"]),
+}
+
+
+class FileSink:
+    """Writes each email as a JSON line instead of sending it; for development and tests."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def send(self, email: dict):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(email) + "\n")
+
+
+class ResendSink:
+    def send(self, email: dict):
+        send_email(email)
+
+
+def get_sink():
+    return FileSink(OUTBOX_FILE_SINK_PATH) if OUTBOX_SINK == "file" else ResendSink()
+
+
+def enqueue(session: Session, kind: str, payload: dict):
+    """Add a message to the outbox; it is sent once the caller's transaction commits."""
+    if kind not in EMAIL_BUILDERS:
+        raise ValueError(f"Unknown outbox message kind: {kind}")
+    session.add(OutboxMessage(kind=kind, payload=json.dumps(payload)))
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Exponential backoff with jitter before retry number `attempts`."""
+    delay = min(OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1), OUTBOX_BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _claim_batch(session: Session, now: datetime) -> List[tuple]:
+    # One statement, so concurrent dispatchers (other workers) never claim the same message
+    due = (
+        select(OutboxMessage.id)
+        .where(
+            OutboxMessage.status == "pending",
+            OutboxMessage.next_attempt_at <= now,
+            or_(OutboxMessage.locked_until.is_(None), OutboxMessage.locked_until <= now),
+        )
+        .order_by(OutboxMessage.id)
+        .limit(OUTBOX_BATCH_SIZE)
+    )
+    rows = session.exec(
+        update(OutboxMessage)
+        .where(OutboxMessage.id.in_(due.scalar_subquery()))
+        .values(locked_until=now + timedelta(seconds=OUTBOX_LEASE_SECONDS))
+        .returning(OutboxMessage.id, OutboxMessage.kind, OutboxMessage.payload, OutboxMessage.attempts)
+    ).all()
+    session.commit()
+    return sorted(rows)
+
+
+def dispatch_once(engine, sink=None) -> int:
+    """Deliver one batch of due messages. Returns how many were attempted."""
+    sink = sink or get_sink()
+    now = datetime.now(timezone.utc)
+    with Session(engine) as session:
+        batch = _claim_batch(session, now)
+        for message_id, kind, payload, attempts in batch:
+            message = session.get(OutboxMessage, message_id)
+            try:
+                sink.send(EMAIL_BUILDERS[kind](json.loads(payload)))
+                message.status = "sent"
+                message.sent_at = datetime.now(timezone.utc)
+                message.last_error = None
+            except Exception as e:
+                message.attempts = attempts + 1
+                message.last_error = str(e)[:500]
+                if message.attempts >= OUTBOX_MAX_ATTEMPTS:
+                    message.status = "failed"
+                    print(f"Outbox message {message_id} ({kind}) failed permanently: {e}")
+                else:
+                    message.next_attempt_at = datetime.now(timezone.utc) + timedelta(seconds=backoff_seconds(message.attempts))
+            message.locked_until = None
+            session.add(message)
+            # Committed per message, so a crash mid-batch does not resend delivered mail
+            session.commit()
+        return len(batch)
+
+
+_wake: Optional[asyncio.Event] = None
+_task: Optional[asyncio.Task] = None
+
+
+def notify_outbox():
+    """Wake the dispatcher after committing new messages, instead of waiting for the next poll."""
+    if _wake is not None:
+        _wake.set()
+
+
+async def _run_dispatcher(engine):
+    while True:
+        try:
+            attempted = await asyncio.to_thread(dispatch_once, engine)
+        except Exception as e:
+            print(f"Outbox dispatch failed: {e}")
+            attempted = 0
+        if attempted == OUTBOX_BATCH_SIZE:
+            continue  # More may be due right away
+        try:
+            await asyncio.wait_for(_wake.wait(), timeout=OUTBOX_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _wake.clear()
+
+
+def start_outbox_dispatcher(engine):
+    global _wake, _task
+    _wake = asyncio.Event()
+    _task = asyncio.create_task(_run_dispatcher(engine))
+
+
+async def stop_outbox_dispatcher():
+    global _wake, _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+    _wake, _task = None, None
+
@@ -0,0 +1,252 @@
+import io
+from datetime import datetime
+from typing import List
+from xml.sax.saxutils import escape
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.lib.colors import HexColor
+from reportlab.lib.utils import simpleSplit
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak, Flowable
+from reportlab.lib.enums import TA_LEFT
+
+from src.pdf_templates import PDF_TEMPLATES, DEFAULT_PDF_TEMPLATE
+
+# (persona key, section heading) for every bulleted list section, in render order
+LIST_SECTIONS = [
+    ("goals", "Goals"),
+    ("frustrations", "Frustrations"),
+    ("behavioral_patterns", "Behavioral Patterns"),
+    ("influence_networks", "Influence Networks"),
+    ("recruitment_criteria", "Recruitment Criteria"),
+    ("research_assumptions", "Research Assumptions"),
+]
+
+DEMOGRAPHIC_LABELS = [
+    ("age", "Age"),
+    ("location", "Location"),
+    ("education", "Education"),
+    ("industry", "Industry"),
+]
+
+
+class BulletList(Flowable):
+    """
+    A whole bulleted section as one flowable.
+    Items are plain text, so lines are broken once per frame width with simpleSplit and
+    drawn through a single text object; splitting across pages slices the precomputed
+    lines instead of re-wrapping a Paragraph per bullet.
+    """
+
+    def __init__(self, items: List[str], style: ParagraphStyle, indent: float, item_gap: float, lines=None):
+        super().__init__()
+        self.items = items
+        self.style = style
+        self.indent = indent
+        self.item_gap = item_gap
+        # [(starts_item, text)], computed lazily for a given width
+        self._lines = lines
+        self._lines_width = None if lines is None else -1
+
+    def _layout(self, avail_width: float):
+        if self._lines_width == -1 or self._lines_width == avail_width:
+            return
+        style = self.style
+        lines = []
+        for item in self.items:
+            wrapped = simpleSplit(str(item), style.fontName, style.fontSize, avail_width - self.indent) or [""]
+            lines.extend((j == 0, line) for j, line in enumerate(wrapped))
+        self._lines = lines
+        self._lines_width = avail_width
+
+    def _height(self, lines) -> float:
+        gaps = sum(1 for starts_item, _ in lines[1:] if starts_item)
+        return len(lines) * self.style.leading + gaps * self.item_gap
+
+    def wrap(self, availWidth, availHeight):
+        self._layout(availWidth)
+        self.width = availWidth
+        self.height = self._height(self._lines)
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        self._layout(availWidth)
+        used = 0.0
+        count = 0
+        for i, (starts_item, _) in enumerate(self._lines):
+            step = self.style.leading + (self.item_gap if starts_item and i > 0 else 0)
+            if used + step > availHeight:
+                break
+            used += step
+            count += 1
+        if count == 0 or count == len(self._lines):
+            return []
+        return [
+            BulletList(self.items, self.style, self.indent, self.item_gap, self._lines[:count]),
+            BulletList(self.items, self.style, self.indent, self.item_gap, self._lines[count:]),
+        ]
+
+    def getSpaceAfter(self):
+        return self.item_gap
+
+    def draw(self):
+        style = self.style
+        canvas = self.canv
+        canvas.setFillColor(style.textColor)
+        text = canvas.beginText()
+        text.setFont(style.fontName, style.fontSize, style.leading)
+        y = self.height - style.fontSize
+        for i, (starts_item, line) in enumerate(self._lines):
+            if starts_item and i > 0:
+                y -= self.item_gap
+            if starts_item:
+                text.setTextOrigin(0, y)
+                text.textOut("•")
+            text.setTextOrigin(self.indent, y)
+            text.textOut(line)
+            y -= style.leading
+        canvas.drawText(text)
+
+
+class CompiledPdfTemplate:
+    """Paragraph, table and list styles for one named template, built once per process."""
+
+    def __init__(self, name: str, spec: dict, base_styles):
+        self.name = name
+        self.page_break_between_personas = spec["page_break_between_personas"]
+        self.persona_gap = spec["persona_gap"]
+
+        self.title_style = ParagraphStyle(
+            f'{name}-Title',
+            parent=base_styles['Title'],
+            fontSize=spec["title_size"],
+            textColor=HexColor(spec["title_color"]),
+            spaceAfter=20
+        )
+        self.heading_style = ParagraphStyle(
+            f'{name}-Heading',
+            parent=base_styles['Heading1'],
+            fontSize=spec["heading_size"],
+            textColor=HexColor(spec["heading_color"]),
+            spaceBefore=spec["heading_space_before"],
+            spaceAfter=10
+        )
+        self.subheading_style = ParagraphStyle(
+            f'{name}-Subheading',
+            parent=base_styles['Heading2'],
+            fontSize=spec["subheading_size"],
+            textColor=HexColor(spec["subheading_color"]),
+            spaceBefore=spec["subheading_space_before"],
+            spaceAfter=6
+        )
+        self.body_style = ParagraphStyle(
+            f'{name}-Body',
+            parent=base_styles['Normal'],
+            fontSize=spec["body_size"],
+            leading=spec["body_size"] * 1.2,
+            textColor=HexColor(spec["body_color"]),
+            alignment=TA_LEFT,
+            spaceAfter=4
+        )
+        self.list_style = ParagraphStyle(
+            f'{name}-List',
+            parent=self.body_style,
+            spaceAfter=4
+        )
+        self.demographics_table_style = TableStyle([
+            ('FONTSIZE', (0, 0), (-1, -1), spec["body_size"]),
+            ('TEXTCOLOR', (0, 0), (0, -1), HexColor(spec["label_color"])),
+            ('TEXTCOLOR', (1, 0), (1, -1), HexColor(spec["body_color"])),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ])
+
+    def bullet_list(self, items: List[str]) -> BulletList:
+        """All bullets of a section as a single flowable."""
+        return BulletList(items, self.list_style, indent=12, item_gap=self.list_style.spaceAfter)
+
+    def build_story(self, personas_data: List[dict], export_date: datetime) -> list:
+        story = [
+            Paragraph("User Personas Export", self.title_style),
+            Paragraph(f"Generated on {export_date.strftime('%B %d, %Y at %H:%M')}", self.body_style),
+            Paragraph(f"Total Personas: {len(personas_data)}", self.body_style),
+            Spacer(1, 30),
+        ]
+
+        for i, persona in enumerate(personas_data):
+            if i > 0:
+                if self.page_break_between_personas:
+                    story.append(PageBreak())
+                else:
+                    story.append(Spacer(1, 15))
+                    story.append(Paragraph("─" * 60, self.body_style))
+                    story.append(Spacer(1, self.persona_gap))
+
+            # Name and status
+            status_badge = "PRIMARY" if persona['status'] == 'primary' else "SECONDARY"
+            story.append(Paragraph(escape(persona['name']), self.heading_style))
+            story.append(Paragraph(f"<b>{status_badge}</b> • {escape(persona['role'])}", self.body_style))
+            story.append(Paragraph(f"Tech Comfort: {escape(persona['tech_comfort'].capitalize())}", self.body_style))
+
+            # Demographics
+            demo = persona.get('demographics')
+            if demo:
+                story.append(Paragraph("Demographics", self.subheading_style))
+                demo_data = [[label, demo[key]] for key, label in DEMOGRAPHIC_LABELS if demo.get(key)]
+                if demo_data:
+                    table = Table(demo_data, colWidths=[1.5*inch, 4*inch])
+                    table.setStyle(self.demographics_table_style)
+                    story.append(table)
+
+            # Scenario Context
+            if persona.get('scenario_context'):
+                story.append(Paragraph("Scenario Context", self.subheading_style))
+                story.append(Paragraph(escape(persona['scenario_context']), self.body_style))
+
+            for key, heading in LIST_SECTIONS:
+                if persona.get(key):
+                    story.append(Paragraph(heading, self.subheading_style))
+                    story.append(self.bullet_list(persona[key]))
+
+        return story
+
+
+def add_page_footer(canvas, doc):
+    """Add footer with branding and page number to each page."""
+    canvas.saveState()
+    page_width, page_height = A4
+
+    # Footer line
+    canvas.setStrokeColor(HexColor('#e0e0e0'))
+    canvas.setLineWidth(0.5)
+    canvas.line(0.75*inch, 0.6*inch, page_width - 0.75*inch, 0.6*inch)
+
+    # Branding text (left side)
+    canvas.setFont('Helvetica', 9)
+    canvas.setFillColor(HexColor('#888888'))
+    canvas.drawString(0.75*inch, 0.4*inch, "Generated by PersonaForge")
+
+    # Page number (right side)
+    page_num = canvas.getPageNumber()
+    canvas.drawRightString(page_width - 0.75*inch, 0.4*inch, f"Page {page_num}")
+
+    canvas.restoreState()
+
+
+def compile_templates() -> dict:
+    base_styles = getSampleStyleSheet()
+    return {name: CompiledPdfTemplate(name, spec, base_styles) for name, spec in PDF_TEMPLATES.items()}
+
+
+# Compiled once at import, i.e. once per render worker process
+COMPILED_TEMPLATES = compile_templates()
+
+
+def generate_pdf(personas_data: List[dict], export_date: datetime, template: str = DEFAULT_PDF_TEMPLATE) -> bytes:
+    """Generate a nicely formatted PDF from personas data."""
+    compiled = COMPILED_TEMPLATES[template]
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.75*inch, bottomMargin=1*inch)
+    doc.build(compiled.build_story(personas_data, export_date), onFirstPage=add_page_footer, onLaterPages=add_page_footer)
+    return buffer.getvalue()
@@ -0,0 +1,63 @@
+# Named PDF export templates. Kept free of reportlab imports so request validation
+# and cache keys can use them without loading the renderer.
+#
+# Bump a template's version whenever its rendered output changes, so cached
+# exports rendered with the old layout are not served again.
+
+DEFAULT_PDF_TEMPLATE = "default"
+
+PDF_TEMPLATES = {
+    "default": {
+        "version": "2",
+        "title_size": 24,
+        "heading_size": 16,
+        "subheading_size": 12,
+        "body_size": 10,
+        "heading_space_before": 20,
+        "subheading_space_before": 12,
+        "persona_gap": 20,
+        "title_color": "#1a1a2e",
+        "heading_color": "#16213e",
+        "subheading_color": "#0f3460",
+        "body_color": "#333333",
+        "label_color": "#666666",
+        "page_break_between_personas": False,
+    },
+    "compact": {
+        "version": "1",
+        "title_size": 18,
+        "heading_size": 13,
+        "subheading_size": 10,
+        "body_size": 8.5,
+        "heading_space_before": 10,
+        "subheading_space_before": 6,
+        "persona_gap": 10,
+        "title_color": "#1a1a2e",
+        "heading_color": "#16213e",
+        "subheading_color": "#0f3460",
+        "body_color": "#333333",
+        "label_color": "#666666",
+        "page_break_between_personas": False,
+    },
+    "one-per-page": {
+        "version": "1",
+        "title_size": 24,
+        "heading_size": 18,
+        "subheading_size": 12,
+        "body_size": 10,
+        "heading_space_before": 0,
+        "subheading_space_before": 12,
+        "persona_gap": 0,
+        "title_color": "#1a1a2e",
+        "heading_color": "#16213e",
+        "subheading_color": "#0f3460",
+        "body_color": "#333333",
+        "label_color": "#666666",
+        "page_break_between_personas": True,
+    },
+}
+
+
+def template_cache_version(name: str) -> str:
+    """Identifier of a template's rendered output, used in export cache keys."""
+    return f"{name}:{PDF_TEMPLATES[name]['version']}"
@@ -0,0 +1,90 @@
+from collections import Counter
+from typing import Dict, List
+
+from sqlalchemy import delete, tuple_
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select
+
+from src.models import Persona, Demographics, PersonaFacet
+
+# Facet name -> column it counts
+FACET_COLUMNS = {
+    "status": Persona.status,
+    "tech_comfort": Persona.tech_comfort,
+    "industry": Demographics.industry,
+    "location": Demographics.location,
+}
+
+# Rebuilds every user's counts with one scan; only used to migrate existing databases
+REBUILD_FACETS = "\nUNION ALL\n".join(
+    f"SELECT p.user_id, '{facet}', {column}, count(*) FROM personas p "
+    f"{'LEFT JOIN demographics d ON d.persona_id = p.id ' if table == 'd' else ''}"
+    f"WHERE {column} IS NOT NULL GROUP BY p.user_id, {column}"
+    for facet, table, column in [
+        ("status", "p", "p.status"),
+        ("tech_comfort", "p", "p.tech_comfort"),
+        ("industry", "d", "d.industry"),
+        ("location", "d", "d.location"),
+    ]
+)
+
+
+def persona_facet_values(session: Session, persona_ids: List[int]) -> Counter:
+    """Counter of (user_id, facet, value) over the current, flushed state of the personas."""
+    counts = Counter()
+    if not persona_ids:
+        return counts
+    session.flush()
+    rows = session.exec(
+        select(Persona.user_id, *FACET_COLUMNS.values())
+        .outerjoin(Demographics, Demographics.persona_id == Persona.id)
+        .where(Persona.id.in_(persona_ids))
+    ).all()
+    for user_id, *values in rows:
+        for facet, value in zip(FACET_COLUMNS, values):
+            if value is not None:
+                counts[(user_id, facet, value)] += 1
+    return counts
+
+
+def apply_facet_changes(session: Session, before: Counter, after: Counter):
+    """
+    Move the stored counts from before to after, e.g. values captured around an edit.
+    Counts are adjusted in place, never recomputed from the persona tables.
+    """
+    delta = Counter(after)
+    delta.subtract(before)
+    emptied = []
+    for key, change in delta.items():
+        if change == 0:
+            continue
+        user_id, facet, value = key
+        count = session.execute(
+            insert(PersonaFacet)
+            .values(user_id=user_id, facet=facet, value=value, count=change)
+            .on_conflict_do_update(
+                index_elements=["user_id", "facet", "value"],
+                set_={"count": PersonaFacet.count + change},
+            )
+            .returning(PersonaFacet.count)
+        ).scalar_one()
+        if count <= 0:
+            emptied.append(key)
+    if emptied:
+        # Only the rows just decremented to zero, by primary key
+        session.execute(
+            delete(PersonaFacet).where(tuple_(PersonaFacet.user_id, PersonaFacet.facet, PersonaFacet.value).in_(emptied))
+        )
+
+
+def get_facet_counts(session: Session, user_id: int) -> Dict[str, Dict[str, int]]:
+    """{facet: {value: count}} for the user's whole library."""
+    facets = {facet: {} for facet in FACET_COLUMNS}
+    rows = session.exec(
+        select(PersonaFacet.facet, PersonaFacet.value, PersonaFacet.count)
+        .where(PersonaFacet.user_id == user_id)
+        .order_by(PersonaFacet.facet, PersonaFacet.count.desc(), PersonaFacet.value)
+    ).all()
+    for facet, value, count in rows:
+        facets.setdefault(facet, {})[value] = count
+    return facets
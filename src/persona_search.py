@@ -0,0 +1,119 @@
+import re
+from typing import List, Optional
+
+from sqlalchemy import DDL, bindparam, event, text
+from sqlmodel import Session, SQLModel
+
+# Full-text index over every searchable persona field, keyed by persona id (rowid).
+# The owner column holds a "u<user_id>" token so per-user scoping is part of the
+# MATCH expression and is answered from the index instead of post-filtering every
+# matching persona of every user.
+SEARCH_TABLE = "persona_search"
+
+SEARCH_COLUMNS = [
+    "name", "role", "scenario_context", "demographics",
+    "goals", "frustrations", "behavioral_patterns", "influence_networks",
+    "recruitment_criteria", "research_assumptions",
+    "owner",
+]
+
+# bm25 column weights, in SEARCH_COLUMNS order. The owner token never affects rank.
+BM25_WEIGHTS = (10.0, 4.0, 2.0, 2.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 0.0)
+
+# Every list section that is indexed; their text is in interned_texts
+LIST_TABLES = [
+    "goals",
+    "frustrations",
+    "behavioral_patterns",
+    "influence_networks",
+    "recruitment_criteria",
+    "research_assumptions",
+]
+
+CREATE_SEARCH_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    + ", ".join(SEARCH_COLUMNS)
+    + ", tokenize='porter unicode61', prefix='2 3')"
+)
+
+# Index rows disappear with their persona, however it was deleted
+CREATE_DELETE_TRIGGER = (
+    f"CREATE TRIGGER IF NOT EXISTS personas_search_delete AFTER DELETE ON personas "
+    f"BEGIN DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id; END"
+)
+
+_list_selects = ",\n".join(
+    f"coalesce((SELECT group_concat(t.text, char(10)) FROM {table} JOIN interned_texts t ON t.hash = {table}.text_hash "
+    f"WHERE {table}.persona_id = p.id), '')"
+    for table in LIST_TABLES
+)
+
+# Builds index rows straight from the persona tables; {where} restricts which personas
+INDEX_SELECT = f"""
+INSERT INTO {SEARCH_TABLE} (rowid, {", ".join(SEARCH_COLUMNS)})
+SELECT
+    p.id, p.name, p.role, coalesce(p.scenario_context, ''),
+    coalesce((SELECT coalesce(age, '') || ' ' || coalesce(location, '') || ' ' || coalesce(education, '') || ' ' || coalesce(industry, '')
+              FROM demographics WHERE persona_id = p.id), ''),
+{_list_selects},
+    'u' || p.user_id
+FROM personas p
+WHERE {{where}}
+"""
+
+# Migration for databases that had personas before the index existed
+BACKFILL_SEARCH_INDEX = INDEX_SELECT.format(where=f"p.id NOT IN (SELECT rowid FROM {SEARCH_TABLE})")
+
+event.listen(SQLModel.metadata, "after_create", DDL(CREATE_SEARCH_TABLE).execute_if(dialect="sqlite"))
+event.listen(SQLModel.metadata, "after_create", DDL(CREATE_DELETE_TRIGGER).execute_if(dialect="sqlite"))
+event.listen(SQLModel.metadata, "before_drop", DDL(f"DROP TABLE IF EXISTS {SEARCH_TABLE}").execute_if(dialect="sqlite"))
+
+_reindex_delete = text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN :ids").bindparams(bindparam("ids", expanding=True))
+_reindex_insert = text(INDEX_SELECT.format(where="p.id IN :ids")).bindparams(bindparam("ids", expanding=True))
+
+_search_query = text(f"""
+SELECT p.id, p.name, p.status, p.role, p.message_id, m.conversation_id,
+       snippet({SEARCH_TABLE}, -1, '<mark>', '</mark>', '…', 16) AS snippet,
+       bm25({SEARCH_TABLE}, {", ".join(str(w) for w in BM25_WEIGHTS)}) AS rank
+FROM {SEARCH_TABLE}
+JOIN personas p ON p.id = {SEARCH_TABLE}.rowid
+JOIN messages m ON m.id = p.message_id
+WHERE {SEARCH_TABLE} MATCH :match
+ORDER BY rank
+LIMIT :limit
+""")
+
+
+def index_personas(session: Session, persona_ids: List[int]):
+    """
+    (Re)build the search rows of the given personas from their current, flushed state.
+    Call this wherever personas or their sections are written, before committing.
+    """
+    if not persona_ids:
+        return
+    session.flush()
+    params = {"ids": list(persona_ids)}
+    session.execute(_reindex_delete, params)
+    session.execute(_reindex_insert, params)
+
+
+def build_match_query(query: str, user_id: int) -> Optional[str]:
+    """
+    Turn free text into an FTS5 expression scoped to the user.
+    Every word must match; the last one also matches as a prefix, for search-as-you-type.
+    """
+    terms = re.findall(r"\w+", query.lower())
+    if not terms:
+        return None
+    phrases = [f'"{term}"' for term in terms]
+    phrases[-1] += "*"
+    return f'owner : "u{user_id}" AND ({" ".join(phrases)})'
+
+
+def search_personas(session: Session, user_id: int, query: str, limit: int = 20) -> List[dict]:
+    """Best-ranked personas of the user matching query, with a highlighted snippet."""
+    match = build_match_query(query, user_id)
+    if match is None:
+        return []
+    rows = session.execute(_search_query, {"match": match, "limit": limit}).mappings().all()
+    return [dict(row) for row in rows]
@@ -0,0 +1,65 @@
+from collections import Counter
+from typing import Dict, List
+
+from sqlmodel import Session
+
+from src.models import Persona, Demographics
+from src.read_models import LIST_SECTIONS
+from src.text_store import intern_texts
+from src.persona_search import index_personas
+from src.persona_facets import persona_facet_values, apply_facet_changes
+from src.similarity import invalidate_user_index
+from src.change_log import record_changes
+
+
+def build_persona(p_data: dict, message_id: int, user_id: int, hashes: Dict[str, int]) -> Persona:
+    """
+    Persona with its demographics and list sections, from one generated persona dict.
+    hashes maps every list text to its interned hash (intern_texts).
+    """
+    persona = Persona(
+        message_id=message_id,
+        user_id=user_id,
+        name=p_data["name"],
+        status=p_data["status"],
+        role=p_data["role"],
+        tech_comfort=p_data["tech_comfort"],
+        scenario_context=p_data.get("scenario_context", "")
+    )
+
+    if "demographics" in p_data and isinstance(p_data["demographics"], dict):
+        persona.demographics = Demographics(
+            age=str(p_data["demographics"].get("age")),
+            location=p_data["demographics"].get("location"),
+            education=p_data["demographics"].get("education"),
+            industry=p_data["demographics"].get("industry")
+        )
+
+    for key, model, _ in LIST_SECTIONS:
+        setattr(persona, key, [model(text_hash=hashes[text], order_index=i) for i, text in enumerate(p_data.get(key, []))])
+    return persona
+
+
+def add_generated_personas(session: Session, personas_data: List[dict], message_id: int, user_id: int) -> List[Persona]:
+    """
+    Add generated personas under an assistant message, add them to the search index,
+    count them in the library facets and log them for sync. The caller commits, then
+    calls invalidate_user_index.
+    """
+    hashes = intern_texts(session, (text for p_data in personas_data for key, _, _ in LIST_SECTIONS for text in p_data.get(key, [])))
+    personas = [build_persona(p_data, message_id, user_id, hashes) for p_data in personas_data]
+    session.add_all(personas)
+    session.flush()
+    persona_ids = [persona.id for persona in personas]
+    index_personas(session, persona_ids)
+    apply_facet_changes(session, Counter(), persona_facet_values(session, persona_ids))
+    record_changes(session, user_id, "persona", persona_ids)
+    return personas
+
+
+def save_generated_personas(session: Session, personas_data: List[dict], message_id: int, user_id: int) -> List[Persona]:
+    """add_generated_personas, written in one transaction."""
+    personas = add_generated_personas(session, personas_data, message_id, user_id)
+    session.commit()
+    invalidate_user_index(user_id)
+    return personas
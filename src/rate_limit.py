@@ -0,0 +1,245 @@
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from jose import JWTError, jwt
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.auth import SECRET_KEY, ALGORITHM
+from src.models import RateLimitBucket
+from src.revocation import is_revoked
+
+# Token buckets in front of the routes that call the LLM. Each caller (the user of a
+# valid access token, otherwise the client IP) has one bucket; each route takes its
+# cost from it, and it refills continuously up to its capacity. Bursts are allowed
+# up to the capacity, sustained use is capped at the refill rate.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# "memory" (per process) or "sqlite" (shared by every worker on the database)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_USER_CAPACITY = float(os.getenv("RATE_LIMIT_USER_CAPACITY", "30"))
+RATE_LIMIT_USER_REFILL_PER_MINUTE = float(os.getenv("RATE_LIMIT_USER_REFILL_PER_MINUTE", "30"))
+RATE_LIMIT_IP_CAPACITY = float(os.getenv("RATE_LIMIT_IP_CAPACITY", "10"))
+RATE_LIMIT_IP_REFILL_PER_MINUTE = float(os.getenv("RATE_LIMIT_IP_REFILL_PER_MINUTE", "10"))
+# Use the first X-Forwarded-For address; only behind a proxy that sets it
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() == "true"
+# Buckets kept by the memory backend; idle ones are dropped first
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000"))
+
+# (method, path) -> tokens taken per request, roughly in Gemini calls
+ROUTE_COSTS: List[Tuple[str, re.Pattern, float]] = [
+    ("POST", re.compile(r"^/conversations/generate-personas$"), 5),
+    ("POST", re.compile(r"^/conversations/generate-chat-name$"), 1),
+    ("POST", re.compile(r"^/conversations/\d+/messages$"), 5),
+    ("POST", re.compile(r"^/conversations/?$"), 1),  # Names the conversation from its title
+]
+
+
+class Bucket:
+    """A bucket's size and refill rate, in tokens and tokens per second."""
+
+    def __init__(self, capacity: float, refill_per_minute: float):
+        self.capacity = capacity
+        self.rate = refill_per_minute / 60
+
+    def refill(self, tokens: float, elapsed: float) -> float:
+        return min(self.capacity, tokens + max(0.0, elapsed) * self.rate)
+
+    def seconds_until(self, tokens: float, wanted: float) -> float:
+        return max(0.0, wanted - tokens) / self.rate if self.rate > 0 else math.inf
+
+
+_stats = {"allowed": 0, "limited": 0}
+
+USER_BUCKET = Bucket(RATE_LIMIT_USER_CAPACITY, RATE_LIMIT_USER_REFILL_PER_MINUTE)
+IP_BUCKET = Bucket(RATE_LIMIT_IP_CAPACITY, RATE_LIMIT_IP_REFILL_PER_MINUTE)
+
+
+class MemoryBackend:
+    """Buckets in this process; each worker enforces the limit separately."""
+
+    # take() only holds a lock briefly, so it runs on the event loop
+    blocking = False
+
+    def __init__(self, max_buckets: int = RATE_LIMIT_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, cost: float, bucket: Bucket) -> Tuple[bool, float]:
+        """(allowed, tokens left) after taking cost tokens if there are enough."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (bucket.capacity, now))
+            tokens = bucket.refill(tokens, now - updated_at)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            # Most recently used last; the oldest have had the longest to refill
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        return allowed, tokens
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBackend:
+    """Buckets in the rate_limit_buckets table, so every worker shares them."""
+
+    # take() is a write transaction that can wait on SQLite's lock; run in the threadpool
+    blocking = True
+
+    def __init__(self, engine=None):
+        self._engine = engine
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from src.database import engine
+
+            self._engine = engine
+        return self._engine
+
+    def take(self, key: str, cost: float, bucket: Bucket) -> Tuple[bool, float]:
+        now = time.time()
+        with self.engine.begin() as conn:
+            conn.execute(
+                insert(RateLimitBucket).values(key=key, tokens=bucket.capacity, updated_at=now).on_conflict_do_nothing()
+            )
+            # The refill takes the write lock, so the check below cannot race another worker
+            tokens = conn.execute(
+                update(RateLimitBucket)
+                .where(RateLimitBucket.key == key)
+                .values(
+                    tokens=RateLimitBucket.tokens + (now - RateLimitBucket.updated_at) * bucket.rate,
+                    updated_at=now,
+                )
+                .returning(RateLimitBucket.tokens)
+            ).scalar_one()
+            tokens = min(tokens, bucket.capacity)
+            allowed = tokens >= cost
+            conn.execute(
+                update(RateLimitBucket)
+                .where(RateLimitBucket.key == key)
+                .values(tokens=tokens - cost if allowed else tokens)
+            )
+        return allowed, tokens - cost if allowed else tokens
+
+    def reset(self):
+        with self.engine.begin() as conn:
+            conn.execute(delete(RateLimitBucket))
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = SQLiteBackend() if RATE_LIMIT_BACKEND == "sqlite" else MemoryBackend()
+    return _backend
+
+
+def route_cost(method: str, path: str) -> Optional[float]:
+    for route_method, pattern, cost in ROUTE_COSTS:
+        if method == route_method and pattern.match(path):
+            return cost
+    return None
+
+
+def _token_revoked(claims: dict) -> bool:
+    from src.database import engine
+
+    with Session(engine) as session:
+        return is_revoked(session, claims)
+
+
+def client_key(scope: Scope) -> Tuple[str, Bucket]:
+    """
+    The bucket for a request: its user if it has a valid, unrevoked access token, else
+    its IP. May read the revocation list, so it is called in the threadpool.
+    """
+    headers = Headers(scope=scope)
+    authorization = headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        try:
+            claims = jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM])
+            user = claims.get("uid") or claims.get("sub")
+            if user is not None and not _token_revoked(claims):
+                return f"user:{user}", USER_BUCKET
+        except JWTError:
+            pass
+    address = scope["client"][0] if scope.get("client") else "unknown"
+    if RATE_LIMIT_TRUST_PROXY and headers.get("x-forwarded-for"):
+        address = headers["x-forwarded-for"].split(",")[0].strip()
+    return f"ip:{address}", IP_BUCKET
+
+
+def rate_limit_headers(bucket: Bucket, tokens: float) -> dict:
+    # RateLimit header fields (draft-ietf-httpapi-ratelimit-headers): the quota, what is
+    # left of it, and seconds until it is fully restored
+    window = math.ceil(bucket.capacity / bucket.rate) if bucket.rate > 0 else 0
+    return {
+        "RateLimit-Limit": str(int(bucket.capacity)),
+        "RateLimit-Remaining": str(max(0, math.floor(tokens))),
+        "RateLimit-Reset": str(math.ceil(bucket.seconds_until(tokens, bucket.capacity))),
+        "RateLimit-Policy": f"{int(bucket.capacity)};w={window}",
+    }
+
+
+class RateLimitMiddleware:
+    """Pure ASGI token-bucket rate limiting for the routes in ROUTE_COSTS."""
+
+    def __init__(self, app: ASGIApp, backend=None):
+        self.app = app
+        self.backend = backend
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        cost = route_cost(scope["method"], scope["path"])
+        if cost is None:
+            await self.app(scope, receive, send)
+            return
+
+        key, bucket = await run_in_threadpool(client_key, scope)
+        backend = self.backend or get_backend()
+        if backend.blocking:
+            allowed, tokens = await run_in_threadpool(backend.take, key, cost, bucket)
+        else:
+            allowed, tokens = backend.take(key, cost, bucket)
+        _stats["allowed" if allowed else "limited"] += 1
+        headers = rate_limit_headers(bucket, tokens)
+        if not allowed:
+            headers["Retry-After"] = str(math.ceil(bucket.seconds_until(tokens, cost)))
+            response = JSONResponse(
+                {"detail": "Too many requests. Please slow down and try again shortly."},
+                status_code=429,
+                headers=headers,
+            )
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(raw=message["headers"]).update(headers)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+def get_rate_limit_stats() -> dict:
+    return {"backend": RATE_LIMIT_BACKEND, **_stats}
@@ -0,0 +1,155 @@
+from datetime import datetime
+from typing import Dict, List
+
+from sqlmodel import Session, select
+
+from src.models import (
+    Conversation, Message, Persona, Demographics, Goal,
+    Frustration, BehavioralPattern, InfluenceNetwork, RecruitmentCriteria, ResearchAssumption
+)
+
+# Read path for persona-heavy responses. Rows are fetched with a handful of column
+# SELECTs (one per table, not one per relationship per object), kept as plain row
+# tuples and assembled straight into the JSON of MessageResponse / PersonaResponse,
+# skipping ORM identity-map bookkeeping and from_attributes validation.
+#
+# Field order, item order and datetime formatting match what the response models
+# produce, so clients see byte-for-byte the same documents.
+
+# Stay well below SQLite's bound-parameter limit for IN (...) clauses
+_MAX_IN_PARAMS = 500
+
+# (response key, model, text column name) in PersonaResponse field order
+LIST_SECTIONS = [
+    ("goals", Goal, "goal_text"),
+    ("frustrations", Frustration, "frustration_text"),
+    ("behavioral_patterns", BehavioralPattern, "pattern_text"),
+    ("influence_networks", InfluenceNetwork, "network_text"),
+    ("recruitment_criteria", RecruitmentCriteria, "criteria_text"),
+    ("research_assumptions", ResearchAssumption, "assumption_text"),
+]
+
+
+def _isoformat(value: datetime) -> str:
+    # Pydantic writes a UTC offset as "Z"
+    text = value.isoformat()
+    return text[:-6] + "Z" if text.endswith("+00:00") else text
+
+
+def _chunks(ids: List[int]):
+    for i in range(0, len(ids), _MAX_IN_PARAMS):
+        yield ids[i:i + _MAX_IN_PARAMS]
+
+
+def persona_payloads(session: Session, persona_ids: List[int]) -> Dict[int, dict]:
+    """PersonaResponse-shaped dicts keyed by persona id, in id order."""
+    payloads = {}
+    for chunk in _chunks(persona_ids):
+        rows = session.exec(
+            select(Persona.id, Persona.name, Persona.status, Persona.role, Persona.tech_comfort, Persona.scenario_context, Persona.version)
+            .where(Persona.id.in_(chunk))
+            .order_by(Persona.id)
+        )
+        for persona_id, name, status, role, tech_comfort, scenario_context, version in rows:
+            payload = {
+                "id": persona_id,
+                "name": name,
+                "status": status,
+                "role": role,
+                "tech_comfort": tech_comfort,
+                "scenario_context": scenario_context,
+                "demographics": None,
+            }
+            for key, _, _ in LIST_SECTIONS:
+                payload[key] = []
+            payload["version"] = version
+            payloads[persona_id] = payload
+
+        rows = session.exec(
+            select(Demographics.persona_id, Demographics.age, Demographics.location, Demographics.education, Demographics.industry)
+            .where(Demographics.persona_id.in_(chunk))
+        )
+        for persona_id, age, location, education, industry in rows:
+            payloads[persona_id]["demographics"] = {
+                "age": age, "location": location, "education": education, "industry": industry,
+            }
+
+        for key, model, text_column in LIST_SECTIONS:
+            rows = session.exec(
+                select(model.persona_id, getattr(model, text_column), model.order_index)
+                .where(model.persona_id.in_(chunk))
+                .order_by(model.order_index, model.id)
+            )
+            for persona_id, text, order_index in rows:
+                payloads[persona_id][key].append({text_column: text, "order_index": order_index})
+    return payloads
+
+
+def _messages_with_personas(session: Session, messages: List[tuple], with_conversation: bool) -> List[dict]:
+    message_ids = [row[0] for row in messages]
+    persona_rows = []
+    for chunk in _chunks(message_ids):
+        persona_rows += session.exec(
+            select(Persona.id, Persona.message_id).where(Persona.message_id.in_(chunk)).order_by(Persona.id)
+        ).all()
+    personas = persona_payloads(session, [persona_id for persona_id, _ in persona_rows])
+
+    by_message = {message_id: [] for message_id in message_ids}
+    for persona_id, message_id in persona_rows:
+        by_message[message_id].append(personas[persona_id])
+
+    payloads = []
+    for message_id, conversation_id, role, content, created_at in messages:
+        payload = {"id": message_id}
+        if with_conversation:
+            payload["conversation_id"] = conversation_id
+        payload.update({
+            "role": role,
+            "content": content,
+            "created_at": _isoformat(created_at),
+            "personas": by_message[message_id],
+            "duplicates": [],
+        })
+        payloads.append(payload)
+    return payloads
+
+
+def conversation_messages_payload(session: Session, conversation_id: int) -> List[dict]:
+    """MessageResponse-shaped dicts for every message of a conversation."""
+    messages = session.exec(
+        select(Message.id, Message.conversation_id, Message.role, Message.content, Message.created_at)
+        .where(Message.conversation_id == conversation_id)
+        .order_by(Message.id)
+    ).all()
+    return _messages_with_personas(session, messages, with_conversation=False)
+
+
+def message_payloads(session: Session, message_ids: List[int]) -> List[dict]:
+    """MessageResponse-shaped dicts plus conversation_id, in id order."""
+    messages = []
+    for chunk in _chunks(message_ids):
+        messages += session.exec(
+            select(Message.id, Message.conversation_id, Message.role, Message.content, Message.created_at)
+            .where(Message.id.in_(chunk))
+        ).all()
+    messages.sort(key=lambda row: row[0])
+    return _messages_with_personas(session, messages, with_conversation=True)
+
+
+def conversation_payloads(session: Session, conversation_ids: List[int]) -> List[dict]:
+    """ConversationResponse-shaped dicts, in id order."""
+    payloads = []
+    for chunk in _chunks(conversation_ids):
+        rows = session.exec(
+            select(Conversation.id, Conversation.title, Conversation.last_message_at, Conversation.created_at)
+            .where(Conversation.id.in_(chunk))
+        )
+        for conversation_id, title, last_message_at, created_at in rows:
+            payloads.append({
+                "id": conversation_id,
+                "title": title,
+                "last_message_at": _isoformat(last_message_at),
+                "created_at": _isoformat(created_at),
+            })
+    payloads.sort(key=lambda payload: payload["id"])
+    return payloads
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+from src.auth import create_user_access_token
+from src.models import User, RefreshToken
+
+# Long-lived tokens that are exchanged for a new access token, so clients stay
+# signed in without sending the password again. Each use rotates the token; a
+# rotated token presented again means it leaked, and its whole family is revoked.
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+
+
+def _hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _new_refresh_token(session: Session, user_id: int, family_id: str) -> str:
+    token = secrets.token_urlsafe(32)
+    session.add(RefreshToken(
+        user_id=user_id,
+        token_hash=_hash(token),
+        family_id=family_id,
+        expires_at=datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    return token
+
+
+def issue_tokens(session: Session, user: User) -> dict:
+    """Token response for a fresh sign-in: an access token and a new refresh token family."""
+    refresh_token = _new_refresh_token(session, user.id, secrets.token_urlsafe(12))
+    session.commit()
+    return {"access_token": create_user_access_token(user), "refresh_token": refresh_token, "token_type": "bearer"}
+
+
+def _invalid_refresh_token() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired refresh token")
+
+
+def _expired(expires_at: datetime) -> bool:
+    # SQLite returns naive datetimes
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at <= datetime.now(timezone.utc)
+
+
+def revoke_family(session: Session, family_id: str):
+    """Revoke every token of a login; the caller commits."""
+    session.exec(
+        update(RefreshToken)
+        .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.now(timezone.utc))
+    )
+
+
+def rotate_refresh_token(session: Session, token: str) -> dict:
+    """Exchange a refresh token for a new access token and refresh token. Raises 401."""
+    row = session.exec(select(RefreshToken).where(RefreshToken.token_hash == _hash(token))).first()
+    if row is None or _expired(row.expires_at):
+        raise _invalid_refresh_token()
+    if row.revoked_at is not None:
+        print(f"Refresh token reuse for user {row.user_id}; revoking its sessions")
+        revoke_family(session, row.family_id)
+        session.commit()
+        raise _invalid_refresh_token()
+
+    # Conditional, so two concurrent refreshes with one token cannot both succeed
+    claimed = session.exec(
+        update(RefreshToken)
+        .where(RefreshToken.id == row.id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.now(timezone.utc))
+    )
+    if claimed.rowcount != 1:
+        session.rollback()
+        raise _invalid_refresh_token()
+
+    # Entitlements are re-read here, so a plan change reaches the next access token
+    user = session.get(User, row.user_id)
+    session.refresh(user)
+    refresh_token = _new_refresh_token(session, user.id, row.family_id)
+    session.commit()
+    return {"access_token": create_user_access_token(user), "refresh_token": refresh_token, "token_type": "bearer"}
+
+
+def revoke_refresh_token(session: Session, token: str, user_id: int) -> Optional[str]:
+    """Revoke the login a refresh token belongs to; returns its family, if it was the user's."""
+    row = session.exec(select(RefreshToken).where(RefreshToken.token_hash == _hash(token))).first()
+    if row is None or row.user_id != user_id:
+        return None
+    revoke_family(session, row.family_id)
+    return row.family_id
@@ -0,0 +1,150 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import HTTPException
+
+from src.pdf_templates import DEFAULT_PDF_TEMPLATE
+
+# Worker processes dedicated to PDF rendering. Reportlab layout is pure CPU,
+# so running it inline in an async handler stalls the event loop for everyone.
+RENDER_WORKERS = int(os.getenv("EXPORT_RENDER_WORKERS", "2"))
+# Maximum number of renders queued or running at once before new exports are rejected
+RENDER_QUEUE_DEPTH = int(os.getenv("EXPORT_RENDER_QUEUE_DEPTH", "8"))
+# Seconds an export may spend waiting for and rendering in the pool
+RENDER_TIMEOUT_SECONDS = float(os.getenv("EXPORT_RENDER_TIMEOUT_SECONDS", "60"))
+# Workers are started this long after startup, so they don't compete with it for CPU
+RENDER_WARM_DELAY_SECONDS = float(os.getenv("EXPORT_RENDER_WARM_DELAY_SECONDS", "5"))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+_in_flight = 0
+
+_stats = {
+    "renders": 0,
+    "failures": 0,
+    "timeouts": 0,
+    "rejected": 0,
+    "render_seconds_total": 0.0,
+    "render_seconds_max": 0.0,
+    "queue_wait_seconds_total": 0.0,
+    "queue_wait_seconds_max": 0.0,
+}
+
+
+def _render_pdf_worker(personas_data: List[dict], export_date: datetime, template: str, submitted_at: float) -> tuple[bytes, float, float]:
+    """Runs inside a pool process. Returns (pdf_bytes, queue_wait, render_time)."""
+    from src.pdf_export import generate_pdf
+
+    started_at = time.time()
+    render_start = time.perf_counter()
+    pdf_bytes = generate_pdf(personas_data, export_date, template)
+    return pdf_bytes, max(0.0, started_at - submitted_at), time.perf_counter() - render_start
+
+
+def get_render_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn avoids forking a process that already has event loop and threadpool threads
+            _executor = ProcessPoolExecutor(
+                max_workers=RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def _warm_worker():
+    # Importing the renderer compiles every PDF template once in the worker process
+    import src.pdf_export  # noqa: F401
+
+
+def warm_render_pool():
+    """Start the render workers and compile templates ahead of the first export."""
+    executor = get_render_executor()
+    for _ in range(RENDER_WORKERS):
+        executor.submit(_warm_worker)
+
+
+def schedule_render_pool_warmup() -> asyncio.TimerHandle:
+    """warm_render_pool, once the server is up; cancel the handle on shutdown."""
+    return asyncio.get_running_loop().call_later(RENDER_WARM_DELAY_SECONDS, warm_render_pool)
+
+
+def shutdown_render_pool():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _release_slot(future):
+    global _in_flight
+    _in_flight -= 1
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is not None:
+        _stats["failures"] += 1
+        return
+    _, queue_wait, render_time = future.result()
+    _stats["renders"] += 1
+    _stats["render_seconds_total"] += render_time
+    _stats["render_seconds_max"] = max(_stats["render_seconds_max"], render_time)
+    _stats["queue_wait_seconds_total"] += queue_wait
+    _stats["queue_wait_seconds_max"] = max(_stats["queue_wait_seconds_max"], queue_wait)
+
+
+async def render_pdf(personas_data: List[dict], export_date: datetime, template: str = DEFAULT_PDF_TEMPLATE) -> bytes:
+    """
+    Render an export PDF in the process pool.
+    Raises 503 when the render queue is full and 504 when the render times out.
+    """
+    global _in_flight
+    if _in_flight >= RENDER_QUEUE_DEPTH:
+        _stats["rejected"] += 1
+        raise HTTPException(
+            status_code=503,
+            detail="Export service is busy. Please try again shortly.",
+            headers={"Retry-After": "5"},
+        )
+
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(
+        get_render_executor(), _render_pdf_worker, personas_data, export_date, template, time.time()
+    )
+    # The slot is held until the worker actually finishes, even if we stop waiting,
+    # so a timed-out render still counts against the queue depth.
+    _in_flight += 1
+    future.add_done_callback(_release_slot)
+
+    try:
+        pdf_bytes, _, _ = await asyncio.wait_for(asyncio.shield(future), timeout=RENDER_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        _stats["timeouts"] += 1
+        raise HTTPException(status_code=504, detail="PDF export timed out. Try exporting fewer personas.")
+    return pdf_bytes
+
+
+def get_render_stats() -> dict:
+    """Snapshot of render pool metrics."""
+    renders = _stats["renders"]
+    return {
+        "workers": RENDER_WORKERS,
+        "queue_depth": _in_flight,
+        "queue_limit": RENDER_QUEUE_DEPTH,
+        "renders": renders,
+        "failures": _stats["failures"],
+        "timeouts": _stats["timeouts"],
+        "rejected": _stats["rejected"],
+        "render_seconds_avg": _stats["render_seconds_total"] / renders if renders else 0.0,
+        "render_seconds_max": _stats["render_seconds_max"],
+        "queue_wait_seconds_avg": _stats["queue_wait_seconds_total"] / renders if renders else 0.0,
+        "queue_wait_seconds_max": _stats["queue_wait_seconds_max"],
+    }
@@ -0,0 +1,55 @@
+from typing import Any, Optional
+
+import msgpack
+import orjson
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+_MSGPACK_MEDIA_TYPES = {MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack"}
+_JSON_MEDIA_RANGES = {"application/json", "application/*", "*/*"}
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse encoded with orjson: compact, UTF-8, same document as the stdlib encoder."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class MsgPackResponse(Response):
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, use_bin_type=True)
+
+
+def prefers_msgpack(accept: Optional[str]) -> bool:
+    """
+    True when the Accept header asks for MessagePack at least as strongly as JSON.
+    MessagePack is opt-in: it must be listed explicitly, wildcards alone mean JSON.
+    """
+    if not accept:
+        return False
+    msgpack_q = json_q = 0.0
+    for media_range in accept.split(","):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        media_type = media_type.lower()
+        if media_type in _MSGPACK_MEDIA_TYPES:
+            msgpack_q = max(msgpack_q, q)
+        elif media_type in _JSON_MEDIA_RANGES:
+            json_q = max(json_q, q)
+    return msgpack_q > 0 and msgpack_q >= json_q
+
+
+def negotiated_response(payload: Any, accept: Optional[str]) -> Response:
+    """JSON or MessagePack encoding of an already JSON-compatible payload, per the Accept header."""
+    response_class = MsgPackResponse if prefers_msgpack(accept) else ORJSONResponse
+    return response_class(payload, headers={"Vary": "Accept"})
@@ -0,0 +1,106 @@
+import hashlib
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlmodel import Session, select
+
+from src.models import RevokedToken
+
+# Revoked access tokens are checked on every authenticated request. The Bloom filter
+# answers "definitely not revoked" for almost every token without touching the
+# database; only a hit (revoked, or a rare false positive) is confirmed in
+# revoked_tokens. Each worker rebuilds its filter from the table periodically, so
+# revocations made by other workers take effect within the reload interval.
+REVOCATION_RELOAD_SECONDS = float(os.getenv("REVOCATION_RELOAD_SECONDS", "30"))
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))
+REVOCATION_FALSE_POSITIVE_RATE = float(os.getenv("REVOCATION_FALSE_POSITIVE_RATE", "0.001"))
+
+
+class BloomFilter:
+    """Set membership with no false negatives and a bounded false positive rate."""
+
+    def __init__(self, capacity: int, false_positive_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+_filter: Optional[BloomFilter] = None
+_loaded_at = 0.0
+_lock = threading.Lock()
+_stats = {"checks": 0, "filter_hits": 0, "revoked": 0, "reloads": 0}
+
+
+def reload_revocations(session: Session):
+    """Rebuild the filter from the unexpired revocations. Read-only: the scheduler drops expired rows."""
+    global _filter, _loaded_at
+    jtis = session.exec(select(RevokedToken.jti).where(RevokedToken.expires_at > datetime.now(timezone.utc))).all()
+    bloom = BloomFilter(max(REVOCATION_BLOOM_CAPACITY, 2 * len(jtis)), REVOCATION_FALSE_POSITIVE_RATE)
+    for jti in jtis:
+        bloom.add(jti)
+    with _lock:
+        _filter, _loaded_at = bloom, time.monotonic()
+    _stats["reloads"] += 1
+
+
+def revoke_access_token(session: Session, jti: str, expires_at: datetime):
+    """Revoke an access token; the caller commits. Takes effect in this worker at once."""
+    if session.get(RevokedToken, jti) is None:
+        session.add(RevokedToken(jti=jti, expires_at=expires_at))
+    with _lock:
+        if _filter is not None:
+            _filter.add(jti)
+
+
+def _lookup(session: Session, key: str) -> Optional[RevokedToken]:
+    _stats["checks"] += 1
+    if key not in _filter:
+        return None
+    _stats["filter_hits"] += 1
+    row = session.get(RevokedToken, key)
+    if row is not None:
+        _stats["revoked"] += 1
+    return row
+
+
+def is_revoked(session: Session, claims: dict) -> bool:
+    """True if the token's jti was revoked."""
+    if _filter is None or time.monotonic() - _loaded_at > REVOCATION_RELOAD_SECONDS:
+        reload_revocations(session)
+    return "jti" in claims and _lookup(session, claims["jti"]) is not None
+
+
+def reset_revocations():
+    """Forget the filter, so the next check reloads it (tests recreate the database)."""
+    global _filter
+    with _lock:
+        _filter = None
+
+
+def get_revocation_stats() -> dict:
+    checks = _stats["checks"]
+    false_positives = _stats["filter_hits"] - _stats["revoked"]
+    return {
+        **_stats,
+        "filter_bits": _filter.size if _filter is not None else 0,
+        "false_positive_rate": false_positives / checks if checks else 0.0,
+    }
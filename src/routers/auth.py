@@ -2,16 +2,17 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlmodel import Session, select
 from datetime import timedelta, datetime, timezone
 from typing import Annotated
+from jose import jwt
 
 from src.database import get_session
 from src.models import User, OneTimePassword
-from src.schemas import UserCreate, UserLogin, OTPVerify, GoogleLogin, Token
-from src.auth import (
-    get_password_hash, verify_password, create_access_token, 
-    generate_otp, verify_google_token, ACCESS_TOKEN_EXPIRE_MINUTES,
-    get_current_user
-)
-from src.email_service import send_otp_email
+from src.schemas import UserCreate, UserLogin, OTPVerify, GoogleLogin, Token, RefreshRequest, LogoutRequest
+from src.auth import hash_password, verify_and_update_password, generate_otp, verify_google_token
+from src.dependencies import oauth2_scheme, get_current_user
+from src.cache import invalidate_user
+from src.outbox import enqueue, notify_outbox
+from src.refresh_tokens import issue_tokens, rotate_refresh_token, revoke_refresh_token
+from src.revocation import revoke_access_token
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -23,7 +24,7 @@ async def signup(user_in: UserCreate, session: Annotated[Session, Depends(get_se
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create user (unverified)
-    hashed_pw = get_password_hash(user_in.password)
+    hashed_pw = await hash_password(user_in.password)
     user = User(
         email=user_in.email, 
         hashed_password=hashed_pw, 
@@ -31,10 +32,9 @@ async def signup(user_in: UserCreate, session: Annotated[Session, Depends(get_se
         auth_provider="email"
     )
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    session.flush()
     
-    # Generate and send OTP
+    # Generate the OTP; the email goes out through the outbox, committed with the user
     otp_code = generate_otp()
     otp = OneTimePassword(
         user_id=user.id, 
@@ -42,9 +42,9 @@ async def signup(user_in: UserCreate, session: Annotated[Session, Depends(get_se
         expires_at=datetime.now(timezone.utc) + timedelta(minutes=10)
     )
     session.add(otp)
+    enqueue(session, "otp_email", {"to": user.email, "otp": otp_code})
     session.commit()
-    
-    send_otp_email(user.email, otp_code)
+    notify_outbox()
     
     return {"message": "User created. Please verify your email with the OTP sent."}
 
@@ -71,26 +71,34 @@ async def verify_otp(data: OTPVerify, session: Annotated[Session, Depends(get_se
     # Delete used OTP
     session.delete(otp)
     session.commit()
+    invalidate_user(user.id, user.email)
     
     # Generate Token
-    access_token = create_access_token(data={"sub": user.email})
-    return {"access_token": access_token, "token_type": "bearer"}
+    return issue_tokens(session, user)
 
 @router.post("/login", response_model=Token)
 async def login(data: UserLogin, session: Annotated[Session, Depends(get_session)]):
     user = session.exec(select(User).where(User.email == data.email)).first()
-    if not user or not user.hashed_password or not verify_password(data.password, user.hashed_password):
+    if not user or not user.hashed_password:
         raise HTTPException(status_code=401, detail="Incorrect email or password")
+    valid, new_hash = await verify_and_update_password(data.password, user.hashed_password)
+    if not valid:
+        raise HTTPException(status_code=401, detail="Incorrect email or password")
+    if new_hash:
+        # Stored with older Argon2 parameters
+        user.hashed_password = new_hash
+        session.add(user)
+        session.commit()
+        invalidate_user(user.id, user.email)
         
     if not user.is_verified:
         raise HTTPException(status_code=401, detail="Email not verified. Please verify OTP.")
         
-    access_token = create_access_token(data={"sub": user.email})
-    return {"access_token": access_token, "token_type": "bearer"}
+    return issue_tokens(session, user)
 
 @router.post("/google", response_model=Token)
 async def google_login(data: GoogleLogin, session: Annotated[Session, Depends(get_session)]):
-    id_info = verify_google_token(data.token)
+    id_info = await verify_google_token(data.token)
     if not id_info:
         raise HTTPException(status_code=400, detail="Invalid Google token")
         
@@ -118,10 +126,36 @@ async def google_login(data: GoogleLogin, session: Annotated[Session, Depends(ge
             user.is_verified = True
             session.add(user)
             session.commit()
+            invalidate_user(user.id, user.email)
             
-    access_token = create_access_token(data={"sub": user.email})
-    return {"access_token": access_token, "token_type": "bearer"}
+    return issue_tokens(session, user)
+
+@router.post("/refresh", response_model=Token)
+async def refresh(data: RefreshRequest, session: Annotated[Session, Depends(get_session)]):
+    """New access token for a refresh token. The refresh token is rotated: use the returned one next time."""
+    return rotate_refresh_token(session, data.refresh_token)
+
+@router.post("/logout")
+async def logout(
+    data: LogoutRequest,
+    token: Annotated[str, Depends(oauth2_scheme)],
+    user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[Session, Depends(get_session)]
+):
+    """Revoke the access token in use and, if given, the refresh token's login."""
+    claims = jwt.get_unverified_claims(token)  # Already verified by get_current_user
+    if "jti" in claims:
+        revoke_access_token(session, claims["jti"], datetime.fromtimestamp(claims["exp"], timezone.utc))
+    if data.refresh_token:
+        revoke_refresh_token(session, data.refresh_token, user.id)
+    session.commit()
+    return {"message": "Logged out"}
 
 @router.get("/me", response_model=User)
-async def read_users_me(current_user: Annotated[User, Depends(get_current_user)]):
+async def read_users_me(
+    current_user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[Session, Depends(get_session)]
+):
+    # The token only carries some columns; load the full row
+    session.refresh(current_user)
     return current_user
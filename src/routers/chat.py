@@ -1,23 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response
 from sqlmodel import Session, select
 import json
-from typing import Annotated, List
+from typing import Annotated, List, Optional
 from datetime import datetime, timezone
 
 from src.database import get_session
-from src.models import (
-    User, Conversation, Message, Persona, Demographics, Goal,
-    Frustration, BehavioralPattern, InfluenceNetwork, RecruitmentCriteria, ResearchAssumption,
-    Payment
-)
-from src.schemas import ConversationCreate, ConversationResponse, MessageCreate, MessageResponse
+from src.models import User, Conversation, Message, Persona, Payment
+from src.schemas import ConversationCreate, ConversationResponse, ConversationPurge, ConversationPurgeResponse, MessageCreate, MessageResponse, DuplicatePersona
 from src.dependencies import get_current_user
 from src.generator import generate_personas, generate_chat_name
-from sqlalchemy import func
+from src.persona_store import add_generated_personas
+from src.read_models import conversation_messages_payload, conversation_payloads
+from src.responses import negotiated_response, prefers_msgpack
+from src.conditional import etag_matches, not_modified
+from src.similarity import find_duplicates, invalidate_user_index
+from src.persona_facets import persona_facet_values, apply_facet_changes
+from src.change_log import DELETE, record_changes, record_conversation_deleted, record_conversations_deleted
+from src.idempotency import run_idempotent
+from src.cancellation import run_cancellable, ClientDisconnected, GENERATION_DEADLINE_SECONDS, CHAT_NAME_DEADLINE_SECONDS
+from src.cache import MISSING, conversation_list_cache
+from collections import Counter
+from sqlalchemy import delete, func
 from datetime import timedelta
 
 router = APIRouter(prefix="/conversations", tags=["chat"])
 
+# Conversations deleted per transaction by a purge
+PURGE_BATCH_SIZE = 200
+
 def check_conversation_limit(user: User, session: Session):
     # LIMIT CHECK: Threads per month
     # Free: 3, Plus: 20, Pro: Unlimited (9999)
@@ -46,8 +56,56 @@ def check_conversation_limit(user: User, session: Session):
             detail=f"Monthly conversation limit reached ({count}/{friendly_limit}). Upgrade to create more."
         )
 
+def conversation_etag(conv: Conversation, representation: str) -> str:
+    """Strong validator for a read of the conversation; changes with every message or persona write."""
+    stamp = conv.last_message_at.strftime("%Y%m%d%H%M%S%f")
+    return f'"{representation}-{conv.id}-{conv.version}-{stamp}"'
+
+def discard_user_message(session: Session, conv: Conversation, msg: Message):
+    """
+    Take back a user message whose generation was abandoned or failed, so the thread
+    has no unanswered message and it doesn't count towards the message limit.
+    """
+    session.rollback()
+    session.delete(msg)
+    conv.version += 1
+    session.add(conv)
+    record_changes(session, conv.user_id, "message", [msg.id], DELETE)
+    session.commit()
+
+def delete_conversations(session: Session, user_id: int, conversation_ids: List[int]):
+    """
+    Delete the user's conversations with a single statement; the database deletes their
+    messages, personas and persona sections (ON DELETE CASCADE). Keeps facet counts and
+    the change log in step. The caller commits.
+    """
+    persona_ids = session.exec(
+        select(Persona.id).join(Message, Message.id == Persona.message_id).where(Message.conversation_id.in_(conversation_ids))
+    ).all()
+    apply_facet_changes(session, persona_facet_values(session, persona_ids), Counter())
+    record_conversations_deleted(session, user_id, conversation_ids)
+    session.exec(delete(Conversation).where(Conversation.id.in_(conversation_ids)))
+
+def discard_conversation(session: Session, conv: Conversation):
+    """Delete a conversation created for a generation that was abandoned or failed."""
+    session.rollback()
+    record_conversation_deleted(session, conv)
+    session.delete(conv)
+    session.commit()
+    conversation_list_cache.invalidate(conv.user_id)
+
+def split_duplicates(session: Session, user_id: int, generated: List[dict]) -> tuple[List[dict], List[DuplicatePersona]]:
+    """Separate generated personas that near-duplicate the user's library; run before anything is persisted."""
+    matches = find_duplicates(session, user_id, generated)
+    duplicates = [
+        DuplicatePersona(name=p_data["name"], duplicate_of=match[0], score=round(match[1], 4))
+        for p_data, match in zip(generated, matches) if match is not None
+    ]
+    return [p_data for p_data, match in zip(generated, matches) if match is None], duplicates
+
 @router.post("/", response_model=ConversationResponse)
 async def create_conversation(
+    request: Request,
     data: ConversationCreate,
     user: Annotated[User, Depends(get_current_user)],
     session: Annotated[Session, Depends(get_session)]
@@ -58,8 +116,10 @@ async def create_conversation(
     if data.title:
         try:
             # Generate a short name based on the first message
-            name_data = generate_chat_name(data.title)
+            name_data = await run_cancellable(request, generate_chat_name(data.title), CHAT_NAME_DEADLINE_SECONDS)
             title = name_data.get("name", data.title[:50])
+        except ClientDisconnected:
+            raise
         except Exception as e:
             print(f"Error generating chat name: {e}")
             title = data.title[:50] # Fallback to first 50 chars
@@ -68,46 +128,83 @@ async def create_conversation(
 
     conv = Conversation(user_id=user.id, title=title)
     session.add(conv)
+    session.flush()
+    record_changes(session, user.id, "conversation", [conv.id])
     session.commit()
+    conversation_list_cache.invalidate(user.id)
     session.refresh(conv)
     return conv
 
 @router.get("/", response_model=List[ConversationResponse])
 async def list_conversations(
     user: Annotated[User, Depends(get_current_user)],
-    session: Annotated[Session, Depends(get_session)]
+    session: Annotated[Session, Depends(get_session)],
+    accept: Annotated[Optional[str], Header()] = None
 ):
-    return user.conversations
+    """List conversations as JSON, or MessagePack with Accept: application/msgpack. Cached per user."""
+    payload = conversation_list_cache.get(user.id)
+    if payload is MISSING:
+        conversation_ids = session.exec(select(Conversation.id).where(Conversation.user_id == user.id)).all()
+        payload = conversation_payloads(session, conversation_ids)
+        conversation_list_cache.set(user.id, payload)
+    return negotiated_response(payload, accept)
 
 @router.get("/{conversation_id}", response_model=ConversationResponse)
 async def get_conversation(
     conversation_id: int,
+    response: Response,
     user: Annotated[User, Depends(get_current_user)],
-    session: Annotated[Session, Depends(get_session)]
+    session: Annotated[Session, Depends(get_session)],
+    if_none_match: Annotated[Optional[str], Header()] = None
 ):
     conv = session.get(Conversation, conversation_id)
     if not conv or conv.user_id != user.id:
         raise HTTPException(status_code=404, detail="Conversation not found")
+    etag = conversation_etag(conv, "conversation")
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return conv
 
 @router.get("/{conversation_id}/messages", response_model=List[MessageResponse])
 async def get_messages(
     conversation_id: int,
     user: Annotated[User, Depends(get_current_user)],
-    session: Annotated[Session, Depends(get_session)]
+    session: Annotated[Session, Depends(get_session)],
+    accept: Annotated[Optional[str], Header()] = None,
+    if_none_match: Annotated[Optional[str], Header()] = None
 ):
+    """
+    Messages with their personas, as JSON or MessagePack (Accept: application/msgpack).
+    Polls with If-None-Match get a 304 without anything being loaded or serialized.
+    """
     conv = session.get(Conversation, conversation_id)
     if not conv or conv.user_id != user.id:
         raise HTTPException(status_code=404, detail="Conversation not found")
-    return conv.messages
+    etag = conversation_etag(conv, "messages-msgpack" if prefers_msgpack(accept) else "messages-json")
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response = negotiated_response(conversation_messages_payload(session, conv.id), accept)
+    response.headers["ETag"] = etag
+    return response
 
 @router.post("/{conversation_id}/messages", response_model=MessageResponse)
 async def send_message(
+    request: Request,
     conversation_id: int,
     data: MessageCreate,
     user: Annotated[User, Depends(get_current_user)],
-    session: Annotated[Session, Depends(get_session)]
+    session: Annotated[Session, Depends(get_session)],
+    idempotency_key: Annotated[Optional[str], Header()] = None
 ):
+    """Send a message and generate personas for it. Retries with the same Idempotency-Key replay the reply."""
+    return await run_idempotent(
+        request, session, user.id, idempotency_key,
+        lambda: generate_reply(request, conversation_id, data, user, session),
+        encode=lambda reply: MessageResponse.model_validate(reply).model_dump(mode="json"),
+    )
+
+async def generate_reply(request: Request, conversation_id: int, data: MessageCreate, user: User, session: Session):
     conv = session.get(Conversation, conversation_id)
     if not conv or conv.user_id != user.id:
         raise HTTPException(status_code=404, detail="Conversation not found")
@@ -141,6 +238,10 @@ async def send_message(
         content=data.content
     )
     session.add(user_msg)
+    conv.version += 1
+    session.add(conv)
+    session.flush()
+    record_changes(session, user.id, "message", [user_msg.id])
     session.commit()
     
     # 2. Generate Personas
@@ -196,12 +297,31 @@ async def send_message(
              if personas_list:
                 generated_persona_str = json.dumps({"personas": personas_list})
 
-        # Call the generator
-        persona_data = generate_personas(data.content, generated_persona=generated_persona_str)
-        
-        # 3. Save Assistant Message
-        num_personas = len(persona_data.get("personas", []))
+        # Call the generator; abandoned if the client leaves or it takes too long
+        persona_data = await run_cancellable(
+            request,
+            generate_personas(data.content, generated_persona=generated_persona_str),
+            GENERATION_DEADLINE_SECONDS,
+        )
+    except Exception as e:
+        discard_user_message(session, conv, user_msg)
+        if isinstance(e, HTTPException):
+            raise
+        print(f"Error generating personas: {e}")
+        raise HTTPException(status_code=500, detail=f"Error generating personas: {str(e)}")
+
+    # 3. Save the assistant message, its personas and the conversation bump together,
+    # so a failure leaves nothing half-saved
+    try:
+        generated = persona_data.get("personas", [])
+        duplicates = []
+        if data.skip_duplicates:
+            generated, duplicates = split_duplicates(session, user.id, generated)
+
+        num_personas = len(generated)
         assistant_content = f"Generated {num_personas} personas based on your request."
+        if duplicates:
+            assistant_content += f" Skipped {len(duplicates)} near-duplicates of existing personas."
         
         asst_msg = Message(
             conversation_id=conv.id,
@@ -209,75 +329,49 @@ async def send_message(
             content=assistant_content
         )
         session.add(asst_msg)
-        session.commit()
-        session.refresh(asst_msg)
+        session.flush()
+        record_changes(session, user.id, "message", [asst_msg.id])
         
         # 4. Save Personas linked to Assistant Message
-        for p_data in persona_data.get("personas", []):
-            persona = Persona(
-                message_id=asst_msg.id,
-                user_id=user.id,
-                name=p_data["name"],
-                status=p_data["status"],
-                role=p_data["role"],
-                tech_comfort=p_data["tech_comfort"],
-                scenario_context=p_data.get("scenario_context", "")
-            )
-            session.add(persona)
-            session.commit()
-            session.refresh(persona)
-            
-            # Save sub-tables
-            if "demographics" in p_data and isinstance(p_data["demographics"], dict):
-                demo = Demographics(
-                    persona_id=persona.id,
-                    age=str(p_data["demographics"].get("age")),
-                    location=p_data["demographics"].get("location"),
-                    education=p_data["demographics"].get("education"),
-                    industry=p_data["demographics"].get("industry")
-                )
-                session.add(demo)
-                
-            for i, goal in enumerate(p_data.get("goals", [])):
-                session.add(Goal(persona_id=persona.id, goal_text=goal, order_index=i))
-                
-            for i, frust in enumerate(p_data.get("frustrations", [])):
-                session.add(Frustration(persona_id=persona.id, frustration_text=frust, order_index=i))
-                
-            for i, pat in enumerate(p_data.get("behavioral_patterns", [])):
-                session.add(BehavioralPattern(persona_id=persona.id, pattern_text=pat, order_index=i))
-                
-            for i, net in enumerate(p_data.get("influence_networks", [])):
-                session.add(InfluenceNetwork(persona_id=persona.id, network_text=net, order_index=i))
-                
-            for i, crit in enumerate(p_data.get("recruitment_criteria", [])):
-                session.add(RecruitmentCriteria(persona_id=persona.id, criteria_text=crit, order_index=i))
-                
-            for i, assump in enumerate(p_data.get("research_assumptions", [])):
-                session.add(ResearchAssumption(persona_id=persona.id, assumption_text=assump, order_index=i))
-                
-            session.commit()
+        add_generated_personas(session, generated, asst_msg.id, user.id)
             
         # Update conversation timestamp
         conv.last_message_at = datetime.now(timezone.utc)
+        conv.version += 1
         session.add(conv)
+        record_changes(session, user.id, "conversation", [conv.id])
         session.commit()
-        
-        session.refresh(asst_msg)
-        return asst_msg
-        
     except Exception as e:
-        print(f"Error generating personas: {e}")
-        # Even if generation fails, we might want to return the user message or an error message.
-        # But here we raise 500.
+        discard_user_message(session, conv, user_msg)
+        print(f"Error saving personas: {e}")
         raise HTTPException(status_code=500, detail=f"Error generating personas: {str(e)}")
 
+    invalidate_user_index(user.id)
+    conversation_list_cache.invalidate(user.id)
+    session.refresh(asst_msg)
+    if duplicates:
+        return MessageResponse.model_validate(asst_msg).model_copy(update={"duplicates": duplicates})
+    return asst_msg
+
 @router.post("/generate-personas")
 async def generate_personas_api(
+    request: Request,
     data: dict,
     user: Annotated[User, Depends(get_current_user)],
-    session: Annotated[Session, Depends(get_session)]
+    session: Annotated[Session, Depends(get_session)],
+    idempotency_key: Annotated[Optional[str], Header()] = None
 ):
+    """
+    One-shot generation in a new conversation. With "skip_duplicates": true, personas that
+    near-duplicate the library are reported instead of saved. Retries with the same
+    Idempotency-Key replay the result.
+    """
+    return await run_idempotent(
+        request, session, user.id, idempotency_key,
+        lambda: generate_in_new_conversation(request, data, user, session),
+    )
+
+async def generate_in_new_conversation(request: Request, data: dict, user: User, session: Session):
     text = data.get("text")
     if not text:
         raise HTTPException(status_code=400, detail="Text is required")
@@ -287,80 +381,69 @@ async def generate_personas_api(
     # Create conversation
     conv = Conversation(user_id=user.id, title=text[:50])
     session.add(conv)
+    session.flush()
+    record_changes(session, user.id, "conversation", [conv.id])
     session.commit()
+    conversation_list_cache.invalidate(user.id)
     session.refresh(conv)
 
     # Save user message
     user_msg = Message(conversation_id=conv.id, role="user", content=text)
     session.add(user_msg)
+    conv.version += 1
+    session.add(conv)
+    session.flush()
+    record_changes(session, user.id, "message", [user_msg.id])
     session.commit()
 
     try:
         # Generate
-        persona_data = generate_personas(text)
+        persona_data = await run_cancellable(request, generate_personas(text), GENERATION_DEADLINE_SECONDS)
+    except Exception as e:
+        discard_conversation(session, conv)
+        if isinstance(e, HTTPException):
+            raise
+        print(f"Error generating personas: {e}")
+        raise HTTPException(status_code=500, detail=f"Error generating personas: {str(e)}")
+
+    # Assistant message, personas and the conversation bump in one transaction
+    try:
+        duplicates = []
+        if data.get("skip_duplicates"):
+            persona_data["personas"], duplicates = split_duplicates(session, user.id, persona_data.get("personas", []))
 
         # Save assistant message
         asst_msg = Message(conversation_id=conv.id, role="assistant", content="Generated personas")
         session.add(asst_msg)
-        session.commit()
-        session.refresh(asst_msg)
+        session.flush()
+        record_changes(session, user.id, "message", [asst_msg.id])
 
         # Save personas
-        saved_personas = []
-        for p_data in persona_data.get("personas", []):
-            persona = Persona(
-                message_id=asst_msg.id,
-                user_id=user.id,
-                name=p_data["name"],
-                status=p_data["status"],
-                role=p_data["role"],
-                tech_comfort=p_data["tech_comfort"],
-                scenario_context=p_data.get("scenario_context", "")
-            )
-            session.add(persona)
-            session.commit()
-            session.refresh(persona)
-            
-            # Save sub-tables
-            if "demographics" in p_data and isinstance(p_data["demographics"], dict):
-                demo = Demographics(
-                    persona_id=persona.id,
-                    age=str(p_data["demographics"].get("age")),
-                    location=p_data["demographics"].get("location"),
-                    education=p_data["demographics"].get("education"),
-                    industry=p_data["demographics"].get("industry")
-                )
-                session.add(demo)
-                
-            for i, goal in enumerate(p_data.get("goals", [])):
-                session.add(Goal(persona_id=persona.id, goal_text=goal, order_index=i))
-                
-            for i, frust in enumerate(p_data.get("frustrations", [])):
-                session.add(Frustration(persona_id=persona.id, frustration_text=frust, order_index=i))
-                
-            for i, pat in enumerate(p_data.get("behavioral_patterns", [])):
-                session.add(BehavioralPattern(persona_id=persona.id, pattern_text=pat, order_index=i))
-                
-            for i, net in enumerate(p_data.get("influence_networks", [])):
-                session.add(InfluenceNetwork(persona_id=persona.id, network_text=net, order_index=i))
-                
-            for i, crit in enumerate(p_data.get("recruitment_criteria", [])):
-                session.add(RecruitmentCriteria(persona_id=persona.id, criteria_text=crit, order_index=i))
-                
-            for i, assump in enumerate(p_data.get("research_assumptions", [])):
-                session.add(ResearchAssumption(persona_id=persona.id, assumption_text=assump, order_index=i))
-                
-            session.commit()
-            saved_personas.append(p_data)
-
-        return {"success": True, "data": {"personas": saved_personas}}
+        saved_personas = persona_data.get("personas", [])
+        add_generated_personas(session, saved_personas, asst_msg.id, user.id)
 
+        # Update conversation timestamp
+        conv.last_message_at = datetime.now(timezone.utc)
+        conv.version += 1
+        session.add(conv)
+        record_changes(session, user.id, "conversation", [conv.id])
+        session.commit()
     except Exception as e:
-        print(f"Error generating personas: {e}")
+        discard_conversation(session, conv)
+        print(f"Error saving personas: {e}")
         raise HTTPException(status_code=500, detail=f"Error generating personas: {str(e)}")
 
+    invalidate_user_index(user.id)
+    conversation_list_cache.invalidate(user.id)
+
+    result = {"personas": saved_personas}
+    if data.get("skip_duplicates"):
+        result["duplicates"] = [duplicate.model_dump() for duplicate in duplicates]
+    return {"success": True, "data": result}
+
 @router.post("/generate-chat-name")
 async def generate_chat_name_api(
+    request: Request,
     data: dict,
 ):
     text = data.get("text")
@@ -369,14 +452,44 @@ async def generate_chat_name_api(
 
     try:
         # Generate
-        chat_name = generate_chat_name(text)["name"]
+        chat_name = (await run_cancellable(request, generate_chat_name(text), CHAT_NAME_DEADLINE_SECONDS))["name"]
 
         return {"success": True, "data": {"chat_name": chat_name}}
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error generating chat name: {e}")
         raise HTTPException(status_code=500, detail=f"Error generating chat name: {str(e)}")
 
+@router.post("/purge", response_model=ConversationPurgeResponse)
+async def purge_conversations(
+    data: ConversationPurge,
+    user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[Session, Depends(get_session)]
+):
+    """Delete the listed conversations, those with no message since `before`, or the listed ones among those."""
+    if data.conversation_ids is None and data.before is None:
+        raise HTTPException(status_code=400, detail="Give conversation_ids, before, or both")
+
+    statement = select(Conversation.id).where(Conversation.user_id == user.id)
+    if data.conversation_ids is not None:
+        statement = statement.where(Conversation.id.in_(data.conversation_ids))
+    if data.before is not None:
+        before = data.before.astimezone(timezone.utc) if data.before.tzinfo else data.before
+        statement = statement.where(Conversation.last_message_at < before)
+
+    deleted = 0
+    # A transaction per batch, so other writers aren't held up by a large purge
+    while conversation_ids := session.exec(statement.limit(PURGE_BATCH_SIZE)).all():
+        delete_conversations(session, user.id, conversation_ids)
+        session.commit()
+        deleted += len(conversation_ids)
+    if deleted:
+        invalidate_user_index(user.id)
+        conversation_list_cache.invalidate(user.id)
+    return {"deleted": deleted}
+
 @router.delete("/{conversation_id}")
 async def delete_conversation(
     conversation_id: int,
@@ -386,7 +499,9 @@ async def delete_conversation(
     conv = session.get(Conversation, conversation_id)
     if not conv or conv.user_id != user.id:
         raise HTTPException(status_code=404, detail="Conversation not found")
-    
-    session.delete(conv)
+
+    delete_conversations(session, user.id, [conv.id])
     session.commit()
+    invalidate_user_index(user.id)
+    conversation_list_cache.invalidate(user.id)
     return {"message": "Conversation deleted"}
\ No newline at end of file
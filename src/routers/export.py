@@ -1,22 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Header, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlmodel import Session, select
-from typing import Annotated, List
+from typing import Annotated, Optional
 from datetime import datetime, timezone, timedelta
 import json
-import io
-
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib.colors import HexColor
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.enums import TA_LEFT
+import os
 
 from src.database import get_session
-from src.models import User, Persona
-from src.schemas import ExportRequest, ExportStatusResponse
+from src.models import User, ExportJob
+from src.schemas import ExportRequest, ExportStatusResponse, ExportJobCreate, ExportJobResponse
 from src.dependencies import get_current_user
+from src.render_pool import render_pdf
+from src.pdf_templates import PDF_TEMPLATES, template_cache_version
+from src.export_cache import export_cache_key, etag_for_key, read_cached_export, store_export
+from src.conditional import etag_matches, not_modified
+from src.export_stream import serialize_persona_for_export, count_owned_personas, iter_persona_chunks, stream_export
+from src.responses import MSGPACK_MEDIA_TYPE, prefers_msgpack
+from src.cache import MISSING, entitlement_cache, invalidate_user
+from src.export_jobs import EXPORT_JOB_FORMATS, columnar_formats_available, snapshot_max_persona_id, run_export_job, fail_stale_jobs
 
 router = APIRouter(prefix="/export", tags=["export"])
 
@@ -31,12 +33,32 @@ ACCOUNT_ADMIN = 99
 EXPORT_LIMIT_FREE = 7
 EXPORT_LIMIT_PLUS = 1
 
+EXPORT_MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "pdf": "application/pdf",
+}
+
 
 def check_export_eligibility(user: User) -> tuple[bool, int, datetime | None]:
     """
-    Check if user can export.
+    Check if user can export, cached per user until an export or plan change.
     Returns: (can_export, exports_remaining, next_available_date)
     """
+    cached = entitlement_cache.get(user.id)
+    if cached is not MISSING:
+        can_export, exports_remaining, next_available = cached
+        # A wait that has run out ends the cached answer
+        if next_available is None or datetime.now(timezone.utc) < next_available:
+            return cached
+    result = _compute_export_eligibility(user)
+    next_available = result[2]
+    ttl = (next_available - datetime.now(timezone.utc)).total_seconds() if next_available else None
+    entitlement_cache.set(user.id, result, ttl=ttl)
+    return result
+
+
+def _compute_export_eligibility(user: User) -> tuple[bool, int, datetime | None]:
     # Admins have unlimited exports
     # Admins and Pro users have unlimited exports
     if user.account_type >= ACCOUNT_PRO:
@@ -64,6 +86,20 @@ def check_export_eligibility(user: User) -> tuple[bool, int, datetime | None]:
     return False, 0, next_available
 
 
+def require_export_eligibility(user: User):
+    """Raise 429 if the user has used up their export allowance."""
+    can_export, exports_remaining, next_available = check_export_eligibility(user)
+    
+    if not can_export:
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "message": f"Export limit reached. Free accounts can export once every {EXPORT_LIMIT_FREE} days. Plus accounts once every {EXPORT_LIMIT_PLUS} day.",
+                "next_available": next_available.isoformat() if next_available else None
+            }
+        )
+
+
 @router.get("/status", response_model=ExportStatusResponse)
 async def get_export_status(
     user: Annotated[User, Depends(get_current_user)],
@@ -80,280 +116,174 @@ async def get_export_status(
     )
 
 
-def serialize_persona_for_export(persona: Persona) -> dict:
-    """Convert a Persona model to a clean dictionary for export."""
-    def get_ordered_text(items, text_attr):
-        return [getattr(item, text_attr) for item in sorted(items, key=lambda x: x.order_index)]
-    
-    return {
-        "name": persona.name,
-        "status": persona.status,
-        "role": persona.role,
-        "tech_comfort": persona.tech_comfort,
-        "scenario_context": persona.scenario_context,
-        "demographics": {
-            "age": persona.demographics.age if persona.demographics else None,
-            "location": persona.demographics.location if persona.demographics else None,
-            "education": persona.demographics.education if persona.demographics else None,
-            "industry": persona.demographics.industry if persona.demographics else None,
-        } if persona.demographics else {},
-        "goals": get_ordered_text(persona.goals, "goal_text"),
-        "frustrations": get_ordered_text(persona.frustrations, "frustration_text"),
-        "behavioral_patterns": get_ordered_text(persona.behavioral_patterns, "pattern_text"),
-        "influence_networks": get_ordered_text(persona.influence_networks, "network_text"),
-        "recruitment_criteria": get_ordered_text(persona.recruitment_criteria, "criteria_text"),
-        "research_assumptions": get_ordered_text(persona.research_assumptions, "assumption_text"),
-    }
-
-
-def generate_pdf(personas_data: List[dict], export_date: datetime) -> bytes:
-    """Generate a nicely formatted PDF from personas data."""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.75*inch, bottomMargin=1*inch)
-    
-    styles = getSampleStyleSheet()
+@router.post("/personas")
+async def export_personas(
+    data: ExportRequest,
+    user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[Session, Depends(get_session)],
+    if_none_match: Annotated[Optional[str], Header()] = None,
+    accept: Annotated[Optional[str], Header()] = None
+):
+    """
+    Export personas as PDF, JSON or NDJSON.
+    JSON and NDJSON exports are MessagePack-encoded when requested with Accept: application/msgpack.
+    """
+    # Check eligibility
+    require_export_eligibility(user)
     
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Title'],
-        fontSize=24,
-        textColor=HexColor('#1a1a2e'),
-        spaceAfter=20
-    )
+    # Validate format
+    if data.format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Format must be 'pdf', 'json' or 'ndjson'")
     
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading1'],
-        fontSize=16,
-        textColor=HexColor('#16213e'),
-        spaceBefore=20,
-        spaceAfter=10
-    )
+    if data.format == "pdf" and data.template not in PDF_TEMPLATES:
+        raise HTTPException(status_code=400, detail=f"Unknown template. Available: {', '.join(PDF_TEMPLATES)}")
     
-    subheading_style = ParagraphStyle(
-        'CustomSubheading',
-        parent=styles['Heading2'],
-        fontSize=12,
-        textColor=HexColor('#0f3460'),
-        spaceBefore=12,
-        spaceAfter=6
-    )
+    # Check every requested persona exists (filtered by user_id for security)
+    persona_ids = sorted(set(data.persona_ids))
+    found = count_owned_personas(session, user.id, persona_ids)
     
-    body_style = ParagraphStyle(
-        'CustomBody',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor=HexColor('#333333'),
-        alignment=TA_LEFT,
-        spaceAfter=4
-    )
+    # Generic error for both missing personas and unauthorized access
+    if found < len(persona_ids):
+        raise HTTPException(status_code=404, detail="No personas found")
     
-    badge_primary = ParagraphStyle(
-        'BadgePrimary',
-        parent=styles['Normal'],
-        fontSize=9,
-        textColor=HexColor('#1e40af'),
-        backColor=HexColor('#dbeafe'),
-    )
+    export_date = datetime.now(timezone.utc)
+    filename = f"personas_{export_date.strftime('%Y%m%d_%H%M%S')}.{data.format}"
     
-    badge_secondary = ParagraphStyle(
-        'BadgeSecondary',
-        parent=styles['Normal'],
-        fontSize=9,
-        textColor=HexColor('#7c3aed'),
-        backColor=HexColor('#ede9fe'),
-    )
+    if data.format in ("json", "ndjson"):
+        # Serialization is the whole cost of a JSON export, so it is streamed straight
+        # from the database in chunks instead of being built and cached in memory.
+        media_type = EXPORT_MEDIA_TYPES[data.format]
+        encoding = "json"
+        if prefers_msgpack(accept):
+            encoding = "msgpack"
+            media_type = MSGPACK_MEDIA_TYPE
+            filename = f"{filename}.msgpack"
+        if data.gzip:
+            media_type = "application/gzip"
+            filename += ".gz"
+        return StreamingResponse(
+            stream_export(session.get_bind(), user.id, persona_ids, data.format, export_date, compress=data.gzip, encoding=encoding),
+            media_type=media_type,
+            headers={"Content-Disposition": f"attachment; filename={filename}", "Vary": "Accept"}
+        )
     
-    story = []
+    # Serialize personas
+    personas_data = [p for chunk in iter_persona_chunks(session, user.id, persona_ids) for p in chunk]
     
-    # Title page
-    story.append(Paragraph("User Personas Export", title_style))
-    story.append(Paragraph(f"Generated on {export_date.strftime('%B %d, %Y at %H:%M')}", body_style))
-    story.append(Paragraph(f"Total Personas: {len(personas_data)}", body_style))
-    story.append(Spacer(1, 30))
+    # Identical selections (same content, format and template version) reuse the cached artifact.
+    # Any edit to a persona changes its serialized form and therefore the key.
+    cache_key = export_cache_key(personas_data, data.format, template_cache_version(data.template))
+    etag = etag_for_key(cache_key)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
     
-    # Each persona
-    for i, persona in enumerate(personas_data):
-        if i > 0:
-            story.append(Spacer(1, 20))
-        
-        # Name and status
-        status_badge = "PRIMARY" if persona['status'] == 'primary' else "SECONDARY"
-        story.append(Paragraph(f"{persona['name']}", heading_style))
-        story.append(Paragraph(f"<b>{status_badge}</b> • {persona['role']}", body_style))
-        story.append(Paragraph(f"Tech Comfort: {persona['tech_comfort'].capitalize()}", body_style))
-        
-        # Demographics
-        if persona.get('demographics'):
-            demo = persona['demographics']
-            story.append(Paragraph("Demographics", subheading_style))
-            demo_data = []
-            if demo.get('age'):
-                demo_data.append(['Age', demo['age']])
-            if demo.get('location'):
-                demo_data.append(['Location', demo['location']])
-            if demo.get('education'):
-                demo_data.append(['Education', demo['education']])
-            if demo.get('industry'):
-                demo_data.append(['Industry', demo['industry']])
-            
-            if demo_data:
-                table = Table(demo_data, colWidths=[1.5*inch, 4*inch])
-                table.setStyle(TableStyle([
-                    ('FONTSIZE', (0, 0), (-1, -1), 10),
-                    ('TEXTCOLOR', (0, 0), (0, -1), HexColor('#666666')),
-                    ('TEXTCOLOR', (1, 0), (1, -1), HexColor('#333333')),
-                    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                ]))
-                story.append(table)
-        
-        # Scenario Context
-        if persona.get('scenario_context'):
-            story.append(Paragraph("Scenario Context", subheading_style))
-            story.append(Paragraph(persona['scenario_context'], body_style))
-        
-        # Goals
-        if persona.get('goals'):
-            story.append(Paragraph("Goals", subheading_style))
-            for goal in persona['goals']:
-                story.append(Paragraph(f"• {goal}", body_style))
-        
-        # Frustrations
-        if persona.get('frustrations'):
-            story.append(Paragraph("Frustrations", subheading_style))
-            for frust in persona['frustrations']:
-                story.append(Paragraph(f"• {frust}", body_style))
-        
-        # Behavioral Patterns
-        if persona.get('behavioral_patterns'):
-            story.append(Paragraph("Behavioral Patterns", subheading_style))
-            for pattern in persona['behavioral_patterns']:
-                story.append(Paragraph(f"• {pattern}", body_style))
-        
-        # Influence Networks
-        if persona.get('influence_networks'):
-            story.append(Paragraph("Influence Networks", subheading_style))
-            for network in persona['influence_networks']:
-                story.append(Paragraph(f"• {network}", body_style))
-        
-        # Recruitment Criteria
-        if persona.get('recruitment_criteria'):
-            story.append(Paragraph("Recruitment Criteria", subheading_style))
-            for criteria in persona['recruitment_criteria']:
-                story.append(Paragraph(f"• {criteria}", body_style))
-        
-        # Research Assumptions
-        if persona.get('research_assumptions'):
-            story.append(Paragraph("Research Assumptions", subheading_style))
-            for assumption in persona['research_assumptions']:
-                story.append(Paragraph(f"• {assumption}", body_style))
-        
-        # Separator line between personas
-        if i < len(personas_data) - 1:
-            story.append(Spacer(1, 15))
-            story.append(Paragraph("─" * 60, body_style))
+    # Cache reads and writes are disk I/O, so they run in the threadpool
+    content = await run_in_threadpool(read_cached_export, cache_key, data.format)
+    if content is None:
+        # PDF export (rendered off the event loop in the process pool)
+        content = await render_pdf(personas_data, export_date, data.template)
+        await run_in_threadpool(store_export, cache_key, data.format, content)
     
-    def add_page_footer(canvas, doc):
-        """Add footer with branding and page number to each page."""
-        canvas.saveState()
-        page_width, page_height = A4
-        
-        # Footer line
-        canvas.setStrokeColor(HexColor('#e0e0e0'))
-        canvas.setLineWidth(0.5)
-        canvas.line(0.75*inch, 0.6*inch, page_width - 0.75*inch, 0.6*inch)
-        
-        # Branding text (left side)
-        canvas.setFont('Helvetica', 9)
-        canvas.setFillColor(HexColor('#888888'))
-        canvas.drawString(0.75*inch, 0.4*inch, "Generated by PersonaForge")
-        
-        # Page number (right side)
-        page_num = canvas.getPageNumber()
-        canvas.drawRightString(page_width - 0.75*inch, 0.4*inch, f"Page {page_num}")
-        
-        canvas.restoreState()
+    # Update user's last export timestamp ONLY after successful generation
+    user.last_export_at = export_date
+    session.add(user)
+    session.commit()
+    invalidate_user(user.id, user.email)
     
-    doc.build(story, onFirstPage=add_page_footer, onLaterPages=add_page_footer)
-    buffer.seek(0)
-    return buffer.getvalue()
+    return Response(
+        content,
+        media_type=EXPORT_MEDIA_TYPES[data.format],
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "ETag": etag,
+        }
+    )
 
 
-@router.post("/personas")
-async def export_personas(
-    data: ExportRequest,
+def to_job_response(job: ExportJob) -> ExportJobResponse:
+    return ExportJobResponse(
+        id=job.id,
+        format=job.format,
+        status=job.status,
+        total_personas=job.total_personas,
+        error=job.error,
+        created_at=job.created_at,
+        completed_at=job.completed_at,
+        download_url=f"/export/jobs/{job.id}/download" if job.status == "completed" else None
+    )
+
+
+def get_owned_job(job_id: int, user: User, session: Session) -> ExportJob:
+    job = session.get(ExportJob, job_id)
+    if not job or job.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job
+
+
+@router.post("/jobs", response_model=ExportJobResponse, status_code=202)
+async def create_export_job(
+    data: ExportJobCreate,
+    background_tasks: BackgroundTasks,
     user: Annotated[User, Depends(get_current_user)],
     session: Annotated[Session, Depends(get_session)]
 ):
-    """Export personas as PDF or JSON."""
-    # Check eligibility
-    can_export, exports_remaining, next_available = check_export_eligibility(user)
+    """Export every persona in the user's workspace as CSV, Parquet or Arrow in the background."""
+    require_export_eligibility(user)
     
-    if not can_export:
-        raise HTTPException(
-            status_code=429,
-            detail={
-                "message": f"Export limit reached. Free accounts can export once every {EXPORT_LIMIT_FREE} days. Plus accounts once every {EXPORT_LIMIT_PLUS} day.",
-                "next_available": next_available.isoformat() if next_available else None
-            }
-        )
-    
-    # Validate format
-    if data.format not in ["pdf", "json"]:
-        raise HTTPException(status_code=400, detail="Format must be 'pdf' or 'json'")
+    if data.format != "csv" and not columnar_formats_available():
+        raise HTTPException(status_code=400, detail="Parquet and Arrow exports are not available on this server")
     
-    # Fetch personas (filtered by user_id for security)
-    personas = session.exec(
-        select(Persona).where(
-            Persona.id.in_(data.persona_ids),
-            Persona.user_id == user.id
+    # One job at a time, so a queued job cannot be used to bypass the export allowance.
+    # A job lost to a restart no longer counts as active.
+    fail_stale_jobs(session, limit=1, user_id=user.id)
+    active_job = session.exec(
+        select(ExportJob).where(
+            ExportJob.user_id == user.id,
+            ExportJob.status.in_(["queued", "running"])
         )
-    ).all()
+    ).first()
+    if active_job:
+        raise HTTPException(status_code=409, detail="An export job is already in progress")
     
-    # Generic error for both missing personas and unauthorized access
-    if not personas or len(personas) < len(data.persona_ids):
-        raise HTTPException(status_code=404, detail="No personas found")
+    job = ExportJob(
+        user_id=user.id,
+        format=data.format,
+        snapshot_max_id=snapshot_max_persona_id(session, user.id)
+    )
+    session.add(job)
+    session.commit()
+    session.refresh(job)
     
-    # Serialize personas
-    personas_data = [serialize_persona_for_export(p) for p in personas]
-    export_date = datetime.now(timezone.utc)
+    background_tasks.add_task(run_export_job, session.get_bind(), job.id)
+    return to_job_response(job)
+
+
+@router.get("/jobs/{job_id}", response_model=ExportJobResponse)
+async def get_export_job(
+    job_id: int,
+    user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[Session, Depends(get_session)]
+):
+    """Poll the status of a workspace export job."""
+    return to_job_response(get_owned_job(job_id, user, session))
+
+
+@router.get("/jobs/{job_id}/download")
+async def download_export_job(
+    job_id: int,
+    user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[Session, Depends(get_session)]
+):
+    """Download the artifact of a completed workspace export job."""
+    job = get_owned_job(job_id, user, session)
+    if job.status != "completed" or not job.file_path or not os.path.exists(job.file_path):
+        raise HTTPException(status_code=404, detail="Export is not ready")
     
-    if data.format == "json":
-        # JSON export
-        export_content = {
-            "export_date": export_date.isoformat(),
-            "total_personas": len(personas_data),
-            "personas": personas_data
+    extension, media_type = EXPORT_JOB_FORMATS[job.format]
+    return FileResponse(
+        job.file_path,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename=personas_workspace_{job.completed_at.strftime('%Y%m%d_%H%M%S')}.{extension}"
         }
-        json_bytes = json.dumps(export_content, indent=2).encode('utf-8')
-        
-        # Update user's last export timestamp ONLY after successful generation
-        user.last_export_at = export_date
-        session.add(user)
-        session.commit()
-        
-        return StreamingResponse(
-            io.BytesIO(json_bytes),
-            media_type="application/json",
-            headers={
-                "Content-Disposition": f"attachment; filename=personas_{export_date.strftime('%Y%m%d_%H%M%S')}.json"
-            }
-        )
-    else:
-        # PDF export
-        pdf_bytes = generate_pdf(personas_data, export_date)
-        
-        # Update user's last export timestamp ONLY after successful generation
-        user.last_export_at = export_date
-        session.add(user)
-        session.commit()
-        
-        return StreamingResponse(
-            io.BytesIO(pdf_bytes),
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename=personas_{export_date.strftime('%Y%m%d_%H%M%S')}.pdf"
-            }
-        )
\ No newline at end of file
+    )
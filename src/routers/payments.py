@@ -1,16 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from sqlalchemy.dialects.sqlite import insert
 from sqlmodel import Session, select
 from datetime import datetime, timezone, timedelta
-import razorpay
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
 import os
 import hmac
 import hashlib
+import threading
 from pydantic import BaseModel
 from typing import Optional
 
 from ..database import get_session
-from ..models import User, Payment
+from ..models import User, Payment, PaymentEvent
 from ..dependencies import get_current_user
+from ..cache import invalidate_user
 
 router = APIRouter(prefix="/payments", tags=["payments"])
 
@@ -18,14 +23,36 @@ router = APIRouter(prefix="/payments", tags=["payments"])
 # Note: In production, use environment variables
 RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY_ID")
 RAZORPAY_KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET")
+# Set in the Razorpay dashboard when adding the webhook
+RAZORPAY_WEBHOOK_SECRET = os.getenv("RAZORPAY_WEBHOOK_SECRET")
+# Threads for Razorpay API calls; the SDK is synchronous and each call is an HTTP round trip
+RAZORPAY_WORKERS = int(os.getenv("RAZORPAY_WORKERS", "8"))
+
+# Events that mean the order has been paid for
+PAID_EVENTS = {"payment.captured", "order.paid"}
+
+_client: Optional["razorpay.Client"] = None
+_client_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=RAZORPAY_WORKERS, thread_name_prefix="razorpay")
 
 def get_razorpay_client():
+    """One client for the process, so its HTTP connections are reused."""
+    global _client
     if not RAZORPAY_KEY_ID or not RAZORPAY_KEY_SECRET:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Razorpay keys are not configured. Please set RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET."
         )
-    return razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+    with _client_lock:
+        if _client is None:
+            import razorpay  # Loaded on first payment rather than at startup
+
+            _client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+        return _client
+
+async def razorpay_call(fn, *args, **kwargs):
+    """Run a blocking Razorpay SDK call in the payment thread pool."""
+    return await asyncio.get_running_loop().run_in_executor(_executor, lambda: fn(*args, **kwargs))
 
 class OrderCreate(BaseModel):
     amount: float # In INR
@@ -38,6 +65,61 @@ class PaymentVerify(BaseModel):
     razorpay_signature: str
     plan_type: str
 
+def claim_payment_event(session: Session, event: str, payment_id: Optional[str], order_id: Optional[str] = None, event_id: Optional[str] = None) -> bool:
+    """
+    Record a payment event; False if it was already recorded (duplicate delivery,
+    or the effect was already applied). The caller commits it with the effect.
+    """
+    result = session.exec(
+        insert(PaymentEvent)
+        .values(event=event, payment_id=payment_id, order_id=order_id, event_id=event_id, received_at=datetime.now(timezone.utc))
+        .on_conflict_do_nothing()
+    )
+    return result.rowcount == 1
+
+def activate_plan(user: User, plan_type: str):
+    # Update user account type
+    # 0=Free, 1=Plus, 2=Pro, 3=Lifetime
+    new_account_type = 0
+    if plan_type == "plus":
+        new_account_type = 1
+    elif plan_type == "pro":
+        new_account_type = 2
+    elif plan_type == "lifetime":
+        new_account_type = 1 # Lifetime is technically Plus features forever
+    
+    # For lifetime, we could have a specific flag or type, but here we'll use subscription_active=True
+    # and maybe a far future expiry
+    
+    user.account_type = new_account_type
+    user.subscription_active = True
+    
+    # Set expiry
+    # Simple logic: 30 days for monthly, 100 years for lifetime
+    if plan_type == "lifetime":
+        user.subscription_expires_at = datetime(2125, 1, 1, tzinfo=timezone.utc)
+    else:
+        # Add 30 days
+        # real implementation would calculate from now + 30 days
+        user.subscription_expires_at = datetime.now(timezone.utc) + timedelta(days=30)
+
+def apply_payment(session: Session, user: User, payment: Optional[Payment], payment_id: str, order_id: str, plan_type: str) -> bool:
+    """
+    Mark the order paid and activate the plan, once per payment however many times
+    it is reported (browser verification and webhooks). Returns False if already applied.
+    The caller commits.
+    """
+    if not claim_payment_event(session, "plan_activated", payment_id, order_id):
+        return False
+    if payment:
+        payment.razorpay_payment_id = payment_id
+        payment.status = "paid"
+        session.add(payment)
+    activate_plan(user, plan_type)
+    # Sessions stay signed in: the plan is read from the database where it is checked
+    session.add(user)
+    return True
+
 @router.post("/create-order")
 async def create_order(
     order_data: OrderCreate,
@@ -59,7 +141,7 @@ async def create_order(
         }
         
         client = get_razorpay_client()
-        order = client.order.create(data=data)
+        order = await razorpay_call(client.order.create, data=data)
         
         # Save pending payment to DB
         payment = Payment(
@@ -67,7 +149,8 @@ async def create_order(
             razorpay_order_id=order['id'],
             amount=order_data.amount,
             currency=order_data.currency,
-            status="created"
+            status="created",
+            plan_type=order_data.plan_type
         )
         session.add(payment)
         session.commit()
@@ -86,6 +169,8 @@ async def verify_payment(
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session)
 ):
+    import razorpay
+
     try:
         # Verify signature
         params_dict = {
@@ -97,47 +182,64 @@ async def verify_payment(
         client = get_razorpay_client()
         client.utility.verify_payment_signature(params_dict)
         
-        # Update payment status
         statement = select(Payment).where(Payment.razorpay_order_id == verify_data.razorpay_order_id)
         results = session.exec(statement)
         payment = results.first()
+        if payment and payment.user_id != current_user.id:
+            raise HTTPException(status_code=404, detail="Order not found")
         
-        if payment:
-            payment.razorpay_payment_id = verify_data.razorpay_payment_id
-            payment.status = "paid"
-            session.add(payment)
-        
-        # Update user account type
-        # 0=Free, 1=Plus, 2=Pro, 3=Lifetime
-        new_account_type = 0
-        if verify_data.plan_type == "plus":
-            new_account_type = 1
-        elif verify_data.plan_type == "pro":
-            new_account_type = 2
-        elif verify_data.plan_type == "lifetime":
-            new_account_type = 1 # Lifetime is technically Plus features forever
-        
-        # For lifetime, we could have a specific flag or type, but here we'll use subscription_active=True
-        # and maybe a far future expiry
-        
-        current_user.account_type = new_account_type
-        current_user.subscription_active = True
-        
-        # Set expiry
-        # Simple logic: 30 days for monthly, 100 years for lifetime
-        if verify_data.plan_type == "lifetime":
-            current_user.subscription_expires_at = datetime(2125, 1, 1, tzinfo=timezone.utc)
-        else:
-            # Add 30 days
-            # real implementation would calculate from now + 30 days
-            current_user.subscription_expires_at = datetime.now(timezone.utc) + timedelta(days=30)
-             
-        session.add(current_user)
+        # The plan recorded with the order, not the one the browser reports
+        plan_type = payment.plan_type if payment and payment.plan_type else verify_data.plan_type
+        apply_payment(session, current_user, payment, verify_data.razorpay_payment_id, verify_data.razorpay_order_id, plan_type)
         session.commit()
+        invalidate_user(current_user.id, current_user.email)
+        session.refresh(current_user)
         
         return {"status": "success", "message": "Payment verified and subscription activated"}
         
     except razorpay.errors.SignatureVerificationError:
         raise HTTPException(status_code=400, detail="Invalid signature")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/webhook")
+async def razorpay_webhook(
+    request: Request,
+    session: Session = Depends(get_session),
+    x_razorpay_signature: Optional[str] = Header(default=None),
+    x_razorpay_event_id: Optional[str] = Header(default=None)
+):
+    """
+    Razorpay webhook. Activates the plan for paid orders even if the browser never
+    calls verify-payment. Redeliveries and repeated events are acknowledged without effect.
+    """
+    if not RAZORPAY_WEBHOOK_SECRET:
+        raise HTTPException(status_code=500, detail="Razorpay webhook secret is not configured.")
+    body = await request.body()
+    expected = hmac.new(RAZORPAY_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    if not x_razorpay_signature or not hmac.compare_digest(expected, x_razorpay_signature):
+        raise HTTPException(status_code=400, detail="Invalid signature")
+
+    data = json.loads(body)
+    event = data.get("event", "")
+    payload = data.get("payload", {})
+    payment_entity = payload.get("payment", {}).get("entity", {})
+    payment_id = payment_entity.get("id")
+    order_id = payment_entity.get("order_id") or payload.get("order", {}).get("entity", {}).get("id")
+
+    if not claim_payment_event(session, event, payment_id, order_id, event_id=x_razorpay_event_id):
+        return {"status": "duplicate"}
+
+    activated_user = None
+    if event in PAID_EVENTS and payment_id and order_id:
+        payment = session.exec(select(Payment).where(Payment.razorpay_order_id == order_id)).first()
+        if payment is None:
+            print(f"Razorpay webhook for unknown order {order_id}")
+        elif apply_payment(session, payment.user, payment, payment_id, order_id, payment.plan_type or "plus"):
+            activated_user = payment.user
+    session.commit()
+    if activated_user is not None:
+        invalidate_user(activated_user.id, activated_user.email)
+    return {"status": "processed" if activated_user is not None else "ignored"}
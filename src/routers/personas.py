@@ -1,17 +1,108 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from sqlalchemy import update
 from sqlmodel import Session, select
-from typing import Annotated
+from typing import Annotated, List, Literal, Optional
+from datetime import datetime
 
 from src.database import get_session
-from src.models import (
-    User, Persona, Demographics, Goal,
-    Frustration, BehavioralPattern, InfluenceNetwork, RecruitmentCriteria, ResearchAssumption
-)
-from src.schemas import PersonaUpdate, PersonaResponse
+from src.models import User, Persona, Demographics
+from src.schemas import PersonaUpdate, PersonaResponse, PersonaLibraryResponse, PersonaSearchResult, SimilarPersona
 from src.dependencies import get_current_user
+from src.persona_search import index_personas, search_personas
+from src.similarity import similar_personas, invalidate_user_index
+from src.persona_facets import persona_facet_values, apply_facet_changes, get_facet_counts
+from src.read_models import LIST_SECTIONS, persona_payloads
+from src.responses import negotiated_response
+from src.change_log import record_changes
+from src.list_diff import apply_list_edit
 
 router = APIRouter(prefix="/personas", tags=["personas"])
 
+@router.get("", response_model=PersonaLibraryResponse)
+async def list_personas(
+    user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[Session, Depends(get_session)],
+    status: Optional[Literal["primary", "secondary"]] = None,
+    tech_comfort: Optional[str] = None,
+    industry: Optional[str] = None,
+    location: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    cursor: Optional[int] = None,
+    limit: Annotated[int, Query(ge=1, le=100)] = 50,
+    accept: Annotated[Optional[str], Header()] = None,
+):
+    """
+    The user's persona library, newest first, with keyset pagination.
+    Facet counts cover the whole library and are read from persona_facets, not counted per request.
+    """
+    statement = select(Persona).where(Persona.user_id == user.id)
+    if status:
+        statement = statement.where(Persona.status == status)
+    if tech_comfort:
+        statement = statement.where(Persona.tech_comfort == tech_comfort)
+    if industry or location:
+        statement = statement.join(Demographics, Demographics.persona_id == Persona.id)
+        if industry:
+            statement = statement.where(Demographics.industry == industry)
+        if location:
+            statement = statement.where(Demographics.location == location)
+    if created_after:
+        statement = statement.where(Persona.created_at >= created_after)
+    if created_before:
+        statement = statement.where(Persona.created_at < created_before)
+    if cursor is not None:
+        statement = statement.where(Persona.id < cursor)
+
+    # One extra row tells whether another page exists
+    persona_ids = session.exec(statement.with_only_columns(Persona.id).order_by(Persona.id.desc()).limit(limit + 1)).all()
+    has_more = len(persona_ids) > limit
+    persona_ids = persona_ids[:limit]
+    payloads = persona_payloads(session, persona_ids)
+
+    return negotiated_response({
+        "items": [payloads[persona_id] for persona_id in persona_ids],
+        "next_cursor": persona_ids[-1] if has_more else None,
+        "facets": get_facet_counts(session, user.id),
+    }, accept)
+
+@router.get("/search", response_model=List[PersonaSearchResult])
+async def search(
+    user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[Session, Depends(get_session)],
+    q: Annotated[str, Query(min_length=1, max_length=200)],
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+):
+    """
+    Full-text search over the user's personas, best matches first.
+    Snippets wrap matched terms in <mark> tags.
+    """
+    return search_personas(session, user.id, q, limit)
+
+@router.get("/{persona_id}/similar", response_model=List[SimilarPersona])
+async def get_similar_personas(
+    persona_id: int,
+    user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[Session, Depends(get_session)],
+    k: Annotated[int, Query(ge=1, le=50)] = 5,
+):
+    """Most similar personas in the user's library, closest first."""
+    persona = session.get(Persona, persona_id)
+    if not persona or persona.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Persona not found")
+
+    neighbours = similar_personas(session, user.id, persona_id, k)
+    if not neighbours:
+        return []
+    found = {p.id: p for p in session.exec(select(Persona).where(Persona.id.in_([i for i, _ in neighbours]))).all()}
+    return [
+        SimilarPersona(
+            id=found[i].id, name=found[i].name, status=found[i].status, role=found[i].role,
+            message_id=found[i].message_id, score=round(score, 4),
+        )
+        for i, score in neighbours if i in found
+    ]
+
 @router.put("/{persona_id}", response_model=PersonaResponse)
 async def update_persona(
     persona_id: int,
@@ -23,11 +114,22 @@ async def update_persona(
     if not persona or persona.user_id != user.id:
         raise HTTPException(status_code=404, detail="Persona not found")
 
+    # Optimistic concurrency: with a version, the edit only applies to the persona as the
+    # client last read it. The bump is the first write, so concurrent edits queue behind it.
+    bump = update(Persona).where(Persona.id == persona_id).values(version=Persona.version + 1)
+    if data.version is not None:
+        bump = bump.where(Persona.version == data.version)
+    if session.exec(bump).rowcount == 0:
+        session.rollback()
+        raise HTTPException(status_code=409, detail="This persona was changed elsewhere. Reload it and try again.")
+
+    facets_before = persona_facet_values(session, [persona_id])
+
     # Update top-level fields
     update_data = data.model_dump(exclude_unset=True)
     
     # Exclude nested fields from direct update
-    nested_fields = ["demographics", "goals", "frustrations", "behavioral_patterns", "influence_networks", "recruitment_criteria", "research_assumptions"]
+    nested_fields = ["version", "demographics", *[key for key, _, _ in LIST_SECTIONS]]
     for key, value in update_data.items():
         if key not in nested_fields:
             setattr(persona, key, value)
@@ -44,45 +146,22 @@ async def update_persona(
                 **update_data["demographics"]
             )
             session.add(demo)
-            
-    # Generic function to replace list items
-    def replace_items(ItemType, attr_name, items_list):
-        if items_list is not None:
-            # Delete old items
-            statement = select(ItemType).where(ItemType.persona_id == persona_id)
-            old_items = session.exec(statement).all()
-            for old in old_items:
-                session.delete(old)
-                
-            # Add new items
-            for i, text in enumerate(items_list):
-                new_item = ItemType(
-                    persona_id=persona_id,
-                    **{attr_name: text},
-                    order_index=i
-                )
-                session.add(new_item)
 
-    if "goals" in update_data:
-        replace_items(Goal, "goal_text", update_data["goals"])
-        
-    if "frustrations" in update_data:
-        replace_items(Frustration, "frustration_text", update_data["frustrations"])
-        
-    if "behavioral_patterns" in update_data:
-        replace_items(BehavioralPattern, "pattern_text", update_data["behavioral_patterns"])
-        
-    if "influence_networks" in update_data:
-        replace_items(InfluenceNetwork, "network_text", update_data["influence_networks"])
-        
-    if "recruitment_criteria" in update_data:
-        replace_items(RecruitmentCriteria, "criteria_text", update_data["recruitment_criteria"])
-        
-    if "research_assumptions" in update_data:
-        replace_items(ResearchAssumption, "assumption_text", update_data["research_assumptions"])
+    # Only the items that changed are written
+    for key, model, text_column in LIST_SECTIONS:
+        if update_data.get(key) is not None:
+            apply_list_edit(session, model, text_column, persona_id, update_data[key])
         
     session.add(persona)
+    # Invalidates cached reads of the conversation the persona belongs to
+    conversation = persona.message.conversation
+    conversation.version += 1
+    session.add(conversation)
+    index_personas(session, [persona.id])
+    apply_facet_changes(session, facets_before, persona_facet_values(session, [persona.id]))
+    record_changes(session, user.id, "persona", [persona.id])
     session.commit()
+    invalidate_user_index(user.id)
     session.refresh(persona)
     
     return persona
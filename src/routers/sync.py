@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, Header, Query
+from sqlmodel import Session
+from typing import Annotated, Optional
+
+from src.database import get_session
+from src.models import User
+from src.schemas import SyncResponse
+from src.dependencies import get_current_user
+from src.change_log import changes_since
+from src.responses import negotiated_response
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+@router.get("", response_model=SyncResponse)
+async def sync(
+    user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[Session, Depends(get_session)],
+    since: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=500)] = 500,
+    accept: Annotated[Optional[str], Header()] = None
+):
+    """
+    Conversations, messages and personas changed after the since cursor, plus deletions.
+    Start from 0 and keep the returned cursor; repeat while has_more is true.
+    """
+    return negotiated_response(changes_since(session, user.id, since, limit), accept)
@@ -0,0 +1,301 @@
+import asyncio
+import os
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional
+
+from sqlalchemy import delete, exists, or_, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select
+
+from src.cache import invalidate_user, purge_expired_caches, conversation_list_cache
+from src.change_log import record_conversation_deleted
+from src.export_jobs import fail_stale_jobs, expire_old_artifacts, remove_orphaned_artifacts
+from src.models import User, OneTimePassword, Conversation, Message, SchedulerLease, IdempotencyRecord, RateLimitBucket, InternedText, RevokedToken
+from src.rate_limit import USER_BUCKET, IP_BUCKET
+from src.text_store import unreferenced, unreferenced_texts
+
+# Periodic housekeeping run from the app lifespan. Every worker runs the scheduler,
+# but jobs that write to the database take a lease first, so each runs in one worker
+# at a time. Work is done in small batches, each its own short transaction, so a
+# sweep never holds SQLite's write lock for long.
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+# Each wait is the job's interval +/- this fraction, so workers started together drift apart
+SCHEDULER_JITTER = float(os.getenv("SCHEDULER_JITTER", "0.1"))
+SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "500"))
+# Pause between batches, so request writes get the lock in between
+SCHEDULER_BATCH_PAUSE_SECONDS = float(os.getenv("SCHEDULER_BATCH_PAUSE_SECONDS", "0.05"))
+OTP_SWEEP_SECONDS = float(os.getenv("OTP_SWEEP_SECONDS", "600"))
+SUBSCRIPTION_SWEEP_SECONDS = float(os.getenv("SUBSCRIPTION_SWEEP_SECONDS", "300"))
+CACHE_SWEEP_SECONDS = float(os.getenv("CACHE_SWEEP_SECONDS", "60"))
+IDEMPOTENCY_SWEEP_SECONDS = float(os.getenv("IDEMPOTENCY_SWEEP_SECONDS", "3600"))
+REVOCATION_SWEEP_SECONDS = float(os.getenv("REVOCATION_SWEEP_SECONDS", "600"))
+RATE_LIMIT_SWEEP_SECONDS = float(os.getenv("RATE_LIMIT_SWEEP_SECONDS", "600"))
+EMPTY_CONVERSATION_SWEEP_SECONDS = float(os.getenv("EMPTY_CONVERSATION_SWEEP_SECONDS", "3600"))
+INTERNED_TEXT_SWEEP_SECONDS = float(os.getenv("INTERNED_TEXT_SWEEP_SECONDS", "3600"))
+EXPORT_JOB_SWEEP_SECONDS = float(os.getenv("EXPORT_JOB_SWEEP_SECONDS", "300"))
+# Conversations with no messages are kept this long, in case the user is about to send one
+EMPTY_CONVERSATION_MAX_AGE_HOURS = float(os.getenv("EMPTY_CONVERSATION_MAX_AGE_HOURS", "24"))
+
+# Identifies this worker as a lease owner
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class Job:
+    """
+    A periodic task. run(engine) does one pass and returns the number of rows (or
+    entries) it processed. Jobs with leader=True run in one worker at a time.
+    """
+
+    def __init__(self, name: str, interval: float, run: Callable[..., int], leader: bool = True):
+        self.name = name
+        self.interval = interval
+        self.run = run
+        self.leader = leader
+
+
+def run_in_batches(engine, batch: Callable[[Session, int], int]) -> int:
+    """Call batch(session, limit) in fresh sessions until it processes less than a full batch."""
+    total = 0
+    while True:
+        with Session(engine) as session:
+            processed = batch(session, SCHEDULER_BATCH_SIZE)
+        total += processed
+        if processed < SCHEDULER_BATCH_SIZE:
+            return total
+        time.sleep(SCHEDULER_BATCH_PAUSE_SECONDS)
+
+
+def _purge_otp_batch(session: Session, limit: int) -> int:
+    ids = session.exec(
+        select(OneTimePassword.id).where(OneTimePassword.expires_at <= datetime.now(timezone.utc)).limit(limit)
+    ).all()
+    if ids:
+        session.exec(delete(OneTimePassword).where(OneTimePassword.id.in_(ids)))
+        session.commit()
+    return len(ids)
+
+
+def purge_expired_otps(engine) -> int:
+    return run_in_batches(engine, _purge_otp_batch)
+
+
+def _purge_idempotency_key_batch(session: Session, limit: int) -> int:
+    ids = session.exec(
+        select(IdempotencyRecord.id).where(IdempotencyRecord.expires_at <= datetime.now(timezone.utc)).limit(limit)
+    ).all()
+    if ids:
+        session.exec(delete(IdempotencyRecord).where(IdempotencyRecord.id.in_(ids)))
+        session.commit()
+    return len(ids)
+
+
+def purge_expired_idempotency_keys(engine) -> int:
+    return run_in_batches(engine, _purge_idempotency_key_batch)
+
+
+def _purge_revoked_token_batch(session: Session, limit: int) -> int:
+    # Tokens that would have expired by now anyway
+    jtis = session.exec(
+        select(RevokedToken.jti).where(RevokedToken.expires_at <= datetime.now(timezone.utc)).limit(limit)
+    ).all()
+    if jtis:
+        session.exec(delete(RevokedToken).where(RevokedToken.jti.in_(jtis)))
+        session.commit()
+    return len(jtis)
+
+
+def purge_expired_revocations(engine) -> int:
+    return run_in_batches(engine, _purge_revoked_token_batch)
+
+
+def _purge_idle_bucket_batch(session: Session, limit: int) -> int:
+    # Idle long enough to have refilled completely, so dropping them changes nothing
+    idle_seconds = max(bucket.seconds_until(0, bucket.capacity) for bucket in (USER_BUCKET, IP_BUCKET))
+    keys = session.exec(
+        select(RateLimitBucket.key).where(RateLimitBucket.updated_at <= time.time() - idle_seconds).limit(limit)
+    ).all()
+    if keys:
+        session.exec(delete(RateLimitBucket).where(RateLimitBucket.key.in_(keys)))
+        session.commit()
+    return len(keys)
+
+
+def purge_idle_rate_limit_buckets(engine) -> int:
+    return run_in_batches(engine, _purge_idle_bucket_batch)
+
+
+def _expire_subscription_batch(session: Session, limit: int) -> int:
+    users = session.exec(
+        select(User)
+        .where(
+            User.subscription_expires_at <= datetime.now(timezone.utc),
+            or_(User.subscription_active == True, User.account_type != 0),  # noqa: E712
+        )
+        .limit(limit)
+    ).all()
+    for user in users:
+        user.account_type = 0
+        user.subscription_active = False
+        session.add(user)
+    session.commit()
+    for user in users:
+        invalidate_user(user.id, user.email)
+    return len(users)
+
+
+def expire_subscriptions(engine) -> int:
+    """Move users whose subscription lapsed back to the free plan."""
+    return run_in_batches(engine, _expire_subscription_batch)
+
+
+def _delete_empty_conversation_batch(session: Session, limit: int) -> int:
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=EMPTY_CONVERSATION_MAX_AGE_HOURS)
+    conversations = session.exec(
+        select(Conversation)
+        .where(
+            Conversation.created_at <= cutoff,
+            Conversation.last_message_at <= cutoff,
+            ~exists().where(Message.conversation_id == Conversation.id),
+        )
+        .limit(limit)
+    ).all()
+    for conv in conversations:
+        record_conversation_deleted(session, conv)
+        session.delete(conv)
+    session.commit()
+    for user_id in {conv.user_id for conv in conversations}:
+        conversation_list_cache.invalidate(user_id)
+    return len(conversations)
+
+
+def delete_empty_conversations(engine) -> int:
+    """Delete conversations that were started but never got a message."""
+    return run_in_batches(engine, _delete_empty_conversation_batch)
+
+
+def _purge_unreferenced_text_batch(session: Session, limit: int) -> int:
+    # One statement, so a text interned again by a concurrent save is never deleted
+    deleted = session.exec(
+        delete(InternedText).where(InternedText.hash.in_(unreferenced_texts(limit)), *unreferenced())
+    ).rowcount
+    session.commit()
+    return deleted
+
+
+def purge_unreferenced_texts(engine) -> int:
+    """Delete interned list texts that no persona uses any more."""
+    return run_in_batches(engine, _purge_unreferenced_text_batch)
+
+
+def sweep_export_jobs(engine) -> int:
+    """Fail export jobs interrupted by a crash or restart, and delete old artifacts."""
+    total = run_in_batches(engine, fail_stale_jobs)
+    total += run_in_batches(engine, expire_old_artifacts)
+    with Session(engine) as session:
+        total += remove_orphaned_artifacts(session)
+    return total
+
+
+JOBS: List[Job] = [
+    Job("purge_expired_otps", OTP_SWEEP_SECONDS, purge_expired_otps),
+    Job("purge_expired_idempotency_keys", IDEMPOTENCY_SWEEP_SECONDS, purge_expired_idempotency_keys),
+    Job("purge_expired_revocations", REVOCATION_SWEEP_SECONDS, purge_expired_revocations),
+    Job("purge_idle_rate_limit_buckets", RATE_LIMIT_SWEEP_SECONDS, purge_idle_rate_limit_buckets),
+    Job("expire_subscriptions", SUBSCRIPTION_SWEEP_SECONDS, expire_subscriptions),
+    Job("delete_empty_conversations", EMPTY_CONVERSATION_SWEEP_SECONDS, delete_empty_conversations),
+    Job("purge_unreferenced_texts", INTERNED_TEXT_SWEEP_SECONDS, purge_unreferenced_texts),
+    Job("sweep_export_jobs", EXPORT_JOB_SWEEP_SECONDS, sweep_export_jobs),
+    # Caches are per process, so every worker sweeps its own
+    Job("sweep_caches", CACHE_SWEEP_SECONDS, lambda engine: purge_expired_caches(), leader=False),
+]
+
+
+def acquire_lease(engine, name: str, seconds: float, owner: str = WORKER_ID) -> bool:
+    """Take or renew the job's lease; False if another worker holds an unexpired one."""
+    now = datetime.now(timezone.utc)
+    statement = insert(SchedulerLease).values(name=name, owner=owner, expires_at=now + timedelta(seconds=seconds))
+    statement = statement.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"owner": statement.excluded.owner, "expires_at": statement.excluded.expires_at},
+        where=or_(SchedulerLease.expires_at <= now, SchedulerLease.owner == owner),
+    )
+    with Session(engine) as session:
+        acquired = session.exec(statement).rowcount == 1
+        session.commit()
+    return acquired
+
+
+def _new_stats() -> dict:
+    return {
+        "runs": 0, "skipped": 0, "failures": 0, "rows": 0,
+        "last_run_at": None, "last_duration_ms": 0.0, "max_duration_ms": 0.0, "total_duration_ms": 0.0,
+    }
+
+
+_stats = {job.name: _new_stats() for job in JOBS}
+
+
+def run_job(engine, job: Job) -> Optional[int]:
+    """One pass of a job, with metrics. None if another worker holds its lease."""
+    stats = _stats.setdefault(job.name, _new_stats())
+    # Held across two intervals, so the leader keeps it while it is alive
+    if job.leader and not acquire_lease(engine, job.name, 2 * job.interval):
+        stats["skipped"] += 1
+        return None
+    start = time.perf_counter()
+    try:
+        rows = job.run(engine)
+    except Exception:
+        stats["failures"] += 1
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        stats["runs"] += 1
+        stats["last_run_at"] = datetime.now(timezone.utc).isoformat()
+        stats["last_duration_ms"] = duration_ms
+        stats["max_duration_ms"] = max(stats["max_duration_ms"], duration_ms)
+        stats["total_duration_ms"] += duration_ms
+    stats["rows"] += rows
+    return rows
+
+
+def jittered(interval: float) -> float:
+    return interval * (1 + random.uniform(-SCHEDULER_JITTER, SCHEDULER_JITTER))
+
+
+async def _run_periodically(engine, job: Job):
+    while True:
+        await asyncio.sleep(jittered(job.interval))
+        try:
+            await asyncio.to_thread(run_job, engine, job)
+        except Exception as e:
+            print(f"Scheduled job {job.name} failed: {e}")
+
+
+_tasks: List[asyncio.Task] = []
+
+
+def start_scheduler(engine, jobs: Optional[List[Job]] = None):
+    if not SCHEDULER_ENABLED:
+        return
+    for job in JOBS if jobs is None else jobs:
+        _tasks.append(asyncio.create_task(_run_periodically(engine, job)))
+
+
+async def stop_scheduler():
+    for task in _tasks:
+        task.cancel()
+    for task in _tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    _tasks.clear()
+
+
+def get_scheduler_stats() -> dict:
+    return {name: dict(stats) for name, stats in _stats.items()}
@@ -22,6 +22,13 @@ class GoogleLogin(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None  # Exchange at /auth/refresh; single use
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None  # Also ends the login this refresh token belongs to
 
 # Chat Schemas
 class ConversationCreate(BaseModel):
@@ -29,6 +36,7 @@ class ConversationCreate(BaseModel):
 
 class MessageCreate(BaseModel):
     content: str
+    skip_duplicates: bool = False  # Don't save generated personas that near-duplicate existing ones
 
 # Sub-item Schemas
 class DemographicsResponse(BaseModel):
@@ -89,6 +97,7 @@ class PersonaResponse(BaseModel):
     influence_networks: List[InfluenceNetworkResponse] = []
     recruitment_criteria: List[RecruitmentCriteriaResponse] = []
     research_assumptions: List[ResearchAssumptionResponse] = []
+    version: int = 1  # Send back with an edit
     
     model_config = {"from_attributes": True}
 
@@ -111,6 +120,38 @@ class PersonaUpdate(BaseModel):
     influence_networks: Optional[List[str]] = None
     recruitment_criteria: Optional[List[str]] = None
     research_assumptions: Optional[List[str]] = None
+    version: Optional[int] = None  # The version being edited; 409 if the persona changed since
+
+class PersonaLibraryResponse(BaseModel):
+    items: List[PersonaResponse]
+    next_cursor: Optional[int] = None  # Pass as cursor to get the next page; None on the last page
+    facets: Dict[str, Dict[str, int]]  # {facet: {value: count}} over the whole library
+
+
+class PersonaSearchResult(BaseModel):
+    id: int
+    name: str
+    status: str
+    role: str
+    message_id: int
+    conversation_id: int
+    snippet: str  # Best matching fragment, matched terms wrapped in <mark></mark>
+    rank: float  # bm25 score, lower is a better match
+
+
+class SimilarPersona(BaseModel):
+    id: int
+    name: str
+    status: str
+    role: str
+    message_id: int
+    score: float  # Cosine similarity, 1.0 is identical
+
+
+class DuplicatePersona(BaseModel):
+    name: str  # Name of the generated persona that was not saved
+    duplicate_of: int  # Existing persona it near-duplicates
+    score: float
 
 
 class MessageResponse(BaseModel):
@@ -119,6 +160,7 @@ class MessageResponse(BaseModel):
     content: str
     created_at: datetime
     personas: List[PersonaResponse] = []
+    duplicates: List[DuplicatePersona] = []  # Generated personas skipped with skip_duplicates
     
     model_config = {"from_attributes": True}
 
@@ -128,10 +170,40 @@ class ConversationResponse(BaseModel):
     last_message_at: datetime
     created_at: datetime
 
+class ConversationPurge(BaseModel):
+    # Either or both; with both, only the listed conversations inactive since before are deleted
+    conversation_ids: Optional[List[int]] = Field(default=None, min_length=1, max_length=1000)
+    before: Optional[datetime] = None  # Conversations with no message since
+
+class ConversationPurgeResponse(BaseModel):
+    deleted: int
+
+# Sync Schemas
+class SyncMessage(MessageResponse):
+    conversation_id: int
+
+class SyncPersona(PersonaResponse):
+    message_id: int
+
+class SyncTombstones(BaseModel):
+    conversations: List[int] = []
+    messages: List[int] = []
+    personas: List[int] = []
+
+class SyncResponse(BaseModel):
+    cursor: int  # Pass as since on the next sync
+    has_more: bool  # More changes are waiting; sync again right away
+    conversations: List[ConversationResponse] = []
+    messages: List[SyncMessage] = []  # With their personas
+    personas: List[SyncPersona] = []  # Edited personas whose message did not change
+    deleted: SyncTombstones
+
 # Export Schemas
 class ExportRequest(BaseModel):
-    format: Literal["pdf", "json"]
+    format: Literal["pdf", "json", "ndjson"]
     persona_ids: List[int] = Field(..., min_length=1)  # At least one persona required
+    gzip: bool = False  # Compress JSON/NDJSON exports on the fly (ignored for PDF)
+    template: str = "default"  # Named PDF template (ignored for JSON/NDJSON)
 
 class ExportStatusResponse(BaseModel):
     can_export: bool
@@ -139,3 +211,16 @@ class ExportStatusResponse(BaseModel):
     exports_remaining: int  # For free users: 0 or 1
     last_export_at: Optional[datetime] = None
     next_export_available: Optional[datetime] = None  # When rate limit resets
+
+class ExportJobCreate(BaseModel):
+    format: Literal["csv", "parquet", "arrow"]
+
+class ExportJobResponse(BaseModel):
+    id: int
+    format: str
+    status: str  # queued, running, completed, failed, expired
+    total_personas: int
+    error: Optional[str] = None
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+    download_url: Optional[str] = None  # Set once the job has completed
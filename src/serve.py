@@ -0,0 +1,83 @@
+"""
+Serve the API with one worker process per available CPU:
+
+    python -m src.serve [--workers N] [--host 0.0.0.0] [--port 8000] [--migrate]
+
+Workers are recycled after a jittered number of requests. Each worker finishes its
+in-flight requests before exiting, and the supervisor starts a replacement. With
+more than one worker, the caches and rate limits are shared between them through
+files on local disk (CACHE_SHARED_PATH, RATE_LIMIT_BACKEND=sqlite) unless configured
+otherwise.
+"""
+import argparse
+import inspect
+import math
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Requests a worker serves before it is replaced, bounding slow memory growth
+WORKER_MAX_REQUESTS = int(os.getenv("WORKER_MAX_REQUESTS", "10000"))
+WORKER_MAX_REQUESTS_JITTER = int(os.getenv("WORKER_MAX_REQUESTS_JITTER", "1000"))
+# Seconds a stopping worker has to finish its requests; generations can take a while
+WORKER_GRACEFUL_TIMEOUT_SECONDS = int(os.getenv("WORKER_GRACEFUL_TIMEOUT_SECONDS", "90"))
+SHARED_CACHE_PATH = ".cache/shared_cache.db"
+
+
+def available_cpus() -> int:
+    """CPUs this process may use: its affinity mask, capped by a cgroup CPU quota (containers)."""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def worker_count() -> int:
+    return int(os.getenv("WEB_CONCURRENCY") or 0) or available_cpus()
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=worker_count())
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--migrate", action="store_true", help="apply migrations before starting the workers")
+    args = parser.parse_args()
+
+    if args.migrate:
+        # Here, once, rather than in every worker
+        from src.database import create_db_and_tables
+
+        create_db_and_tables()
+
+    if args.workers > 1:
+        # Inherited by the workers; explicit settings win
+        os.environ.setdefault("CACHE_SHARED_PATH", SHARED_CACHE_PATH)
+        os.environ.setdefault("RATE_LIMIT_BACKEND", "sqlite")
+
+    options = dict(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        limit_max_requests=WORKER_MAX_REQUESTS or None,
+        timeout_graceful_shutdown=WORKER_GRACEFUL_TIMEOUT_SECONDS,
+        proxy_headers=True,
+    )
+    # Spreads recycling out so workers are not all replaced at once (newer uvicorn)
+    if "limit_max_requests_jitter" in inspect.signature(uvicorn.Config).parameters:
+        options["limit_max_requests_jitter"] = WORKER_MAX_REQUESTS_JITTER
+    print(f"Starting {args.workers} worker(s) on {args.host}:{args.port}")
+    uvicorn.run("src.main:app", **options)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Hashable, Optional
+
+# Cache entries in a SQLite file on local disk, read and written by every worker
+# process on the host. A write or invalidation in one worker is seen by the others
+# on their next read, which takes tens of microseconds (WAL, no fsync).
+
+
+class SharedCacheStore:
+    """Key-value entries with expiry, by cache name, in a SQLite file shared between processes."""
+
+    def __init__(self, path: str, busy_timeout_ms: int = 1000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Losing recent entries in a power cut is fine for a cache
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "cache TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, expires_at REAL NOT NULL, "
+                "PRIMARY KEY (cache, key)) WITHOUT ROWID"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get(self, cache: str, key: Hashable, default: Any = None) -> Any:
+        """The entry's value, or default if it is missing or expired."""
+        try:
+            row = self._conn().execute(
+                "SELECT value FROM cache_entries WHERE cache = ? AND key = ? AND expires_at > ?",
+                (cache, repr(key), time.time()),
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Shared cache read failed: {e}")
+            return default
+        return pickle.loads(row[0]) if row else default
+
+    def set(self, cache: str, key: Hashable, value: Any, ttl: float):
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO cache_entries (cache, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (cache, repr(key), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), time.time() + ttl),
+            )
+        except sqlite3.Error as e:
+            print(f"Shared cache write failed: {e}")
+
+    def delete(self, cache: str, key: Hashable):
+        # Not swallowed: a lost invalidation would leave other workers serving stale data
+        self._conn().execute("DELETE FROM cache_entries WHERE cache = ? AND key = ?", (cache, repr(key)))
+
+    def clear(self, cache: Optional[str] = None):
+        if cache is None:
+            self._conn().execute("DELETE FROM cache_entries")
+        else:
+            self._conn().execute("DELETE FROM cache_entries WHERE cache = ?", (cache,))
+
+    def purge_expired(self) -> int:
+        return self._conn().execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def count(self, cache: str) -> int:
+        return self._conn().execute("SELECT count(*) FROM cache_entries WHERE cache = ?", (cache,)).fetchone()[0]
@@ -0,0 +1,169 @@
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlmodel import Session
+
+from src.persona_search import SEARCH_TABLE, SEARCH_COLUMNS
+
+# Width of the hashed feature space. 2048 float32 columns is 8 KiB per persona.
+SIMILARITY_DIM = int(os.getenv("SIMILARITY_DIM", "2048"))
+# Cosine similarity at or above which a generated persona counts as a duplicate
+DUPLICATE_THRESHOLD = float(os.getenv("PERSONA_DUPLICATE_THRESHOLD", "0.85"))
+# Number of users whose vector matrix is kept in memory
+SIMILARITY_CACHE_USERS = int(os.getenv("SIMILARITY_CACHE_USERS", "32"))
+
+_TOKEN_RE = re.compile(r"\w+")
+_TEXT_COLUMNS = [column for column in SEARCH_COLUMNS if column != "owner"]
+
+# Every persona of one user, already concatenated into the search index
+_user_texts_query = text(
+    f"SELECT rowid, {' || char(10) || '.join(_TEXT_COLUMNS)} FROM {SEARCH_TABLE} "
+    f"WHERE {SEARCH_TABLE} MATCH :match ORDER BY rowid"
+)
+
+LIST_KEYS = [
+    "goals", "frustrations", "behavioral_patterns", "influence_networks",
+    "recruitment_criteria", "research_assumptions",
+]
+
+
+def persona_text(p_data: dict) -> str:
+    """Text of a generated (not yet saved) persona, with the same fields the index stores."""
+    demographics = p_data.get("demographics") or {}
+    parts = [p_data.get("name", ""), p_data.get("role", ""), p_data.get("scenario_context") or ""]
+    parts += [str(demographics.get(key) or "") for key in ("age", "location", "education", "industry")]
+    for key in LIST_KEYS:
+        parts += [str(item) for item in p_data.get(key) or []]
+    return "\n".join(parts)
+
+
+def _features(doc: str) -> List[str]:
+    tokens = _TOKEN_RE.findall(doc.lower())
+    # Bigrams keep some word order, so "not technical" differs from "technical"
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def hashed_term_counts(docs: List[str], dim: int = SIMILARITY_DIM) -> np.ndarray:
+    """
+    Signed feature-hashing of unigrams and bigrams into a (len(docs), dim) count matrix.
+    crc32 is used instead of hash() so vectors are stable across processes.
+    """
+    rows, cols, signs = [], [], []
+    for row, doc in enumerate(docs):
+        for feature in _features(doc):
+            h = zlib.crc32(feature.encode("utf-8"))
+            rows.append(row)
+            cols.append(h % dim)
+            signs.append(1.0 if h & 0x80000000 else -1.0)
+    counts = np.zeros((len(docs), dim), dtype=np.float32)
+    np.add.at(counts, (np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)), np.asarray(signs, dtype=np.float32))
+    return counts
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class SimilarityIndex:
+    """Hashed TF-IDF vectors of one user's personas, L2-normalized for cosine similarity."""
+
+    def __init__(self, ids: np.ndarray, docs: List[str], dim: int = SIMILARITY_DIM):
+        self.ids = ids
+        self.dim = dim
+        counts = hashed_term_counts(docs, dim)
+        # Sublinear tf on the magnitude, keeping the hash sign
+        tf = np.sign(counts) * np.log1p(np.abs(counts))
+        doc_freq = np.count_nonzero(counts, axis=0)
+        self.idf = (np.log((1 + len(docs)) / (1 + doc_freq)) + 1).astype(np.float32)
+        self.vectors = _normalize(tf * self.idf)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def embed(self, docs: List[str]) -> np.ndarray:
+        """Vectors for new documents, weighted with this index's idf."""
+        counts = hashed_term_counts(docs, self.dim)
+        return _normalize(np.sign(counts) * np.log1p(np.abs(counts)) * self.idf)
+
+    def nearest(self, queries: np.ndarray, k: int, exclude_ids: Optional[List[int]] = None) -> List[List[Tuple[int, float]]]:
+        """Top-k (persona id, cosine similarity) for each query vector, best first."""
+        if len(self.ids) == 0:
+            return [[] for _ in range(len(queries))]
+        scores = queries @ self.vectors.T
+        if exclude_ids:
+            scores[:, np.isin(self.ids, exclude_ids)] = -np.inf
+        k = min(k, len(self.ids))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in enumerate(top):
+            ordered = candidates[np.argsort(-scores[row, candidates])]
+            results.append([
+                (int(self.ids[i]), float(scores[row, i])) for i in ordered if np.isfinite(scores[row, i])
+            ])
+        return results
+
+
+_indexes: "OrderedDict[int, Tuple[tuple, SimilarityIndex]]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def _fingerprint(session: Session, user_id: int) -> tuple:
+    # Catches inserts and deletes made without invalidation; edits rely on invalidate_user_index
+    return tuple(session.execute(
+        text("SELECT count(*), max(id) FROM personas WHERE user_id = :user_id"), {"user_id": user_id}
+    ).one())
+
+
+def get_user_index(session: Session, user_id: int) -> SimilarityIndex:
+    """The user's similarity index, rebuilt from the search table when stale."""
+    fingerprint = _fingerprint(session, user_id)
+    with _indexes_lock:
+        cached = _indexes.get(user_id)
+        if cached is not None and cached[0] == fingerprint:
+            _indexes.move_to_end(user_id)
+            return cached[1]
+
+    rows = session.execute(_user_texts_query, {"match": f'owner : "u{user_id}"'}).all()
+    index = SimilarityIndex(np.array([row[0] for row in rows], dtype=np.int64), [row[1] for row in rows])
+
+    with _indexes_lock:
+        _indexes[user_id] = (fingerprint, index)
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > SIMILARITY_CACHE_USERS:
+            _indexes.popitem(last=False)
+    return index
+
+
+def invalidate_user_index(user_id: int):
+    """Drop the cached vectors of a user after their personas changed."""
+    with _indexes_lock:
+        _indexes.pop(user_id, None)
+
+
+def similar_personas(session: Session, user_id: int, persona_id: int, k: int = 5) -> List[Tuple[int, float]]:
+    """Nearest neighbours of one of the user's personas, excluding itself."""
+    index = get_user_index(session, user_id)
+    position = np.flatnonzero(index.ids == persona_id)
+    if len(position) == 0:
+        return []
+    return index.nearest(index.vectors[position], k, exclude_ids=[persona_id])[0]
+
+
+def find_duplicates(session: Session, user_id: int, personas_data: List[dict], threshold: float = DUPLICATE_THRESHOLD) -> List[Optional[Tuple[int, float]]]:
+    """
+    For each generated persona, the closest existing persona of the user if it is
+    at least threshold-similar, else None.
+    """
+    index = get_user_index(session, user_id)
+    if not personas_data or len(index) == 0:
+        return [None] * len(personas_data)
+    matches = index.nearest(index.embed([persona_text(p) for p in personas_data]), k=1)
+    return [best[0] if best and best[0][1] >= threshold else None for best in matches]
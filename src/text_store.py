@@ -0,0 +1,96 @@
+"""
+Content-addressed storage of persona list text. Every follow-up regenerates the whole
+persona set, and most goals, frustrations, criteria and assumptions come back word for
+word, so list rows hold a hash of their text and each distinct text is stored once in
+interned_texts. Personas of successive messages share the text of unchanged items.
+
+Print how much space this saves:
+
+    python -m src.text_store
+"""
+import hashlib
+from typing import Dict, Iterable
+
+from sqlalchemy import LargeBinary, cast, exists, func
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select
+
+from src.models import InternedText
+from src.read_models import LIST_SECTIONS
+
+# Stay well below SQLite's bound-parameter limit
+_MAX_ROWS_PER_INSERT = 200
+
+
+def text_hash(text: str) -> int:
+    """The text's address: the first 8 bytes of its SHA-256, as a signed 64-bit integer (SQLite's INTEGER)."""
+    return int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big", signed=True)
+
+
+def intern_texts(session: Session, texts: Iterable[str]) -> Dict[str, int]:
+    """Store each text unless it already is; returns text -> hash to put in the list rows."""
+    hashes = {text: text_hash(text) for text in texts}
+    items = list(hashes.items())
+    for i in range(0, len(items), _MAX_ROWS_PER_INSERT):
+        chunk = items[i:i + _MAX_ROWS_PER_INSERT]
+        session.execute(
+            insert(InternedText).values([{"hash": h, "text": text} for text, h in chunk]).on_conflict_do_nothing()
+        )
+        # 64-bit hashes make a collision unlikely, not impossible; never attach the wrong text
+        stored = dict(session.execute(
+            select(InternedText.hash, InternedText.text).where(InternedText.hash.in_([h for _, h in chunk]))
+        ).all())
+        for text, h in chunk:
+            if stored[h] != text:
+                raise ValueError(f"Hash collision between list texts (hash {h})")
+    return hashes
+
+
+def unreferenced():
+    """Conditions on InternedText: no list row uses the text."""
+    return [~exists().where(model.text_hash == InternedText.hash) for _, model, _ in LIST_SECTIONS]
+
+
+def unreferenced_texts(limit: int):
+    """Texts no list row uses any more, e.g. after their personas were deleted or edited."""
+    return select(InternedText.hash).where(*unreferenced()).limit(limit)
+
+
+# Each row holds an 8-byte hash where it used to hold the text, and so does its index entry
+_HASH_BYTES_PER_ROW = 16
+# UTF-8 size of the texts; length() of TEXT counts characters
+_total_bytes = func.coalesce(func.sum(func.length(cast(InternedText.text, LargeBinary))), 0)
+
+
+def storage_report(session: Session) -> dict:
+    """List rows and text bytes, against what storing the text in every row would take."""
+    rows = referenced_bytes = 0
+    for _, model, _ in LIST_SECTIONS:
+        count, size = session.exec(
+            select(func.count(), _total_bytes)
+            .select_from(model)
+            .join(InternedText, InternedText.hash == model.text_hash)
+        ).one()
+        rows += count
+        referenced_bytes += size
+    texts, stored_bytes = session.exec(select(func.count(), _total_bytes)).one()
+    saved_bytes = referenced_bytes - stored_bytes - _HASH_BYTES_PER_ROW * rows
+    return {
+        "list_rows": rows,
+        "distinct_texts": texts,
+        "text_bytes_without_interning": referenced_bytes,
+        "text_bytes_stored": stored_bytes,
+        "bytes_saved": saved_bytes,
+        "dedup_ratio": round(referenced_bytes / stored_bytes, 2) if stored_bytes else None,
+    }
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    from src.database import engine
+
+    with Session(engine) as session:
+        for key, value in storage_report(session).items():
+            print(f"{key}: {value}")
@@ -1,11 +1,18 @@
+import os
 import pytest
+
+# Tests send many generation requests from one client; tests/integration/test_rate_limit.py enables it
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
 from fastapi.testclient import TestClient
+from sqlalchemy import event
 from sqlmodel import Session, SQLModel, create_engine
 from sqlmodel.pool import StaticPool
 
 from src.main import app
-from src.database import get_session
+from src.database import get_session, configure_sqlite
 from src.models import User
+from src.cache import clear_caches
+from src.revocation import reset_revocations
 
 # Create an in-memory SQLite database for testing
 # StaticPool is important for in-memory database to share the same connection
@@ -14,6 +21,7 @@ engine = create_engine(
     connect_args={"check_same_thread": False}, 
     poolclass=StaticPool
 )
+event.listen(engine, "connect", configure_sqlite)
 
 @pytest.fixture(name="session")
 def session_fixture():
@@ -25,6 +33,9 @@ def session_fixture():
     with Session(engine) as session:
         yield session
     SQLModel.metadata.drop_all(engine)
+    # Ids are reused by the next test's fresh tables
+    clear_caches()
+    reset_revocations()
 
 @pytest.fixture(name="client")
 def client_fixture(session: Session):
@@ -0,0 +1,68 @@
+import time
+import httpx
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi.testclient import TestClient
+from jose import jwk, jwt
+from passlib.context import CryptContext
+from sqlmodel import select
+import src.auth as auth
+from src.models import User
+
+
+def test_login_upgrades_outdated_hashes(client: TestClient, session):
+    weak = CryptContext(schemes=["argon2"], argon2__rounds=1, argon2__memory_cost=1024, argon2__parallelism=1)
+    session.add(User(email="old-hash@example.com", hashed_password=weak.hash("hunter22"), is_verified=True))
+    session.commit()
+
+    assert client.post("/auth/login", json={"email": "old-hash@example.com", "password": "wrong"}).status_code == 401
+    response = client.post("/auth/login", json={"email": "old-hash@example.com", "password": "hunter22"})
+    assert response.status_code == 200
+
+    user = session.exec(select(User).where(User.email == "old-hash@example.com")).one()
+    assert f"t={auth.ARGON2_TIME_COST}" in user.hashed_password
+    assert client.post("/auth/login", json={"email": "old-hash@example.com", "password": "hunter22"}).status_code == 200
+
+
+@pytest.fixture
+def google(monkeypatch):
+    """Google's certs endpoint, served by a mock transport that counts fetches."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    state = {"kid": "key-1", "fetches": 0}
+
+    def handler(request: httpx.Request):
+        assert str(request.url) == auth.GOOGLE_CERTS_URL
+        state["fetches"] += 1
+        public = jwk.construct(pem, "RS256").public_key().to_dict()
+        return httpx.Response(200, json={"keys": [{**public, "kid": state["kid"]}]}, headers={"Cache-Control": "public, max-age=600"})
+
+    monkeypatch.setattr(auth, "GOOGLE_CLIENT_ID", "client-123")
+    monkeypatch.setattr(auth, "_google_jwks", None)
+    monkeypatch.setattr(auth, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    def sign(email, kid=None):
+        claims = {"iss": "https://accounts.google.com", "aud": "client-123", "email": email, "name": "G User", "exp": int(time.time()) + 600}
+        return jwt.encode(claims, pem.decode(), algorithm="RS256", headers={"kid": kid or state["kid"]})
+
+    state["sign"] = sign
+    return state
+
+
+def test_google_login_caches_certs(client: TestClient, session, google):
+    for _ in range(3):
+        response = client.post("/auth/google", json={"token": google["sign"]("g@example.com")})
+        assert response.status_code == 200
+    assert google["fetches"] == 1
+
+    # Tokens signed with a key Google rotated in trigger one refetch
+    google["kid"] = "key-2"
+    assert client.post("/auth/google", json={"token": google["sign"]("g@example.com")}).status_code == 200
+    assert google["fetches"] == 2
+
+
+def test_google_login_rejects_other_audiences(client: TestClient, session, google, monkeypatch):
+    token = google["sign"]("g@example.com")
+    monkeypatch.setattr(auth, "GOOGLE_CLIENT_ID", "another-client")
+    assert client.post("/auth/google", json={"token": token}).status_code == 400
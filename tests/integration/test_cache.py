@@ -0,0 +1,54 @@
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+from src.auth import create_access_token
+from src.cache import get_cache_stats
+from src.models import User
+from tests.integration.test_search import make_persona
+
+
+def token_for(session, email, account_type=0):
+    user = User(email=email, is_verified=True, account_type=account_type)
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    return user, {"Authorization": f"Bearer {create_access_token(data={'sub': email})}"}
+
+
+def test_sidebar_reads_are_cached_and_invalidated_by_writes(client: TestClient, session):
+    _, auth = token_for(session, "cached@example.com")
+    conv_id = client.post("/conversations/", json={}, headers=auth).json()["id"]
+
+    first = client.get("/conversations/", headers=auth).json()
+    assert client.get("/conversations/", headers=auth).json() == first
+    stats = get_cache_stats()
+    assert stats["users"]["hits"] >= 2
+    assert stats["conversation_lists"]["hits"] == 1
+
+    with patch("src.routers.chat.generate_personas") as mock_gen:
+        mock_gen.return_value = {"personas": [make_persona("Ana", "Analyst", [])]}
+        client.post(f"/conversations/{conv_id}/messages", json={"content": "Generate"}, headers=auth)
+    updated = client.get("/conversations/", headers=auth).json()
+    assert updated[0]["last_message_at"] != first[0]["last_message_at"]
+
+    client.delete(f"/conversations/{conv_id}", headers=auth)
+    assert client.get("/conversations/", headers=auth).json() == []
+
+
+def test_export_status_is_invalidated_by_an_export(client: TestClient, session):
+    user, auth = token_for(session, "entitled@example.com")
+    with patch("src.routers.chat.generate_personas") as mock_gen:
+        mock_gen.return_value = {"personas": [make_persona("Ana", "Analyst", [])]}
+        conv_id = client.post("/conversations/", json={}, headers=auth).json()["id"]
+        persona_id = client.post(f"/conversations/{conv_id}/messages", json={"content": "Go"}, headers=auth).json()["personas"][0]["id"]
+
+    assert client.get("/export/status", headers=auth).json()["can_export"] is True
+    assert client.get("/export/status", headers=auth).json()["can_export"] is True
+    assert get_cache_stats()["entitlements"]["hits"] == 1
+
+    response = client.post("/export/personas", json={"format": "json", "persona_ids": [persona_id]}, headers=auth)
+    assert response.status_code == 200
+    # The export commits from its own session; requests share this one in tests
+    session.expire_all()
+    status = client.get("/export/status", headers=auth).json()
+    assert status["can_export"] is False
+    assert status["next_export_available"] is not None
@@ -0,0 +1,79 @@
+import asyncio
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from sqlmodel import select
+from src.models import User, Conversation, Message
+from src.dependencies import get_current_user
+
+
+def sign_in(client: TestClient, session):
+    user = User(email="cancel@example.com", is_verified=True)
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    client.app.dependency_overrides[get_current_user] = lambda: user
+    return user
+
+
+def test_failed_generation_takes_back_the_user_message(client: TestClient, session):
+    sign_in(client, session)
+    conv_id = client.post("/conversations/", json={}).json()["id"]
+
+    with patch("src.routers.chat.generate_personas", side_effect=RuntimeError("quota exceeded")):
+        response = client.post(f"/conversations/{conv_id}/messages", json={"content": "Hello"})
+    assert response.status_code == 500
+
+    # No unanswered message is left in the thread, and it doesn't count towards the limit
+    assert client.get(f"/conversations/{conv_id}/messages").json() == []
+    changes = client.get("/sync").json()
+    assert changes["messages"] == [] and len(changes["deleted"]["messages"]) == 1
+
+
+def test_generation_past_its_deadline_is_cancelled(client: TestClient, session):
+    sign_in(client, session)
+    conv_id = client.post("/conversations/", json={}).json()["id"]
+    cancelled = []
+
+    async def slow_generation(*args, **kwargs):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    with patch("src.routers.chat.generate_personas", slow_generation), \
+            patch("src.routers.chat.GENERATION_DEADLINE_SECONDS", 0.05):
+        response = client.post(f"/conversations/{conv_id}/messages", json={"content": "Hello"})
+    assert response.status_code == 504
+    assert cancelled == [True]
+    session.expire_all()
+    assert session.exec(select(Message)).all() == []
+
+
+def test_failed_one_shot_generation_deletes_its_conversation(client: TestClient, session):
+    sign_in(client, session)
+    with patch("src.routers.chat.generate_personas", side_effect=RuntimeError("upstream error")):
+        response = client.post("/conversations/generate-personas", json={"text": "A note-taking app"})
+    assert response.status_code == 500
+    session.expire_all()
+    assert session.exec(select(Conversation)).all() == []
+    assert client.get("/conversations/").json() == []
+
+
+def test_failed_save_leaves_nothing_behind(client: TestClient, session):
+    sign_in(client, session)
+    conv_id = client.post("/conversations/", json={}).json()["id"]
+    # Missing "role", so the persona can't be saved
+    malformed = {"personas": [{"name": "Ana", "status": "primary", "tech_comfort": "high"}]}
+
+    with patch("src.routers.chat.generate_personas", return_value=malformed):
+        response = client.post(f"/conversations/{conv_id}/messages", json={"content": "Hello"})
+    assert response.status_code == 500
+    assert client.get(f"/conversations/{conv_id}/messages").json() == []
+
+    with patch("src.routers.chat.generate_personas", return_value=malformed):
+        response = client.post("/conversations/generate-personas", json={"text": "A note-taking app"})
+    assert response.status_code == 500
+    session.expire_all()
+    assert [conv.id for conv in session.exec(select(Conversation)).all()] == [conv_id]
+    assert session.exec(select(Message)).all() == []
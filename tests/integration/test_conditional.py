@@ -0,0 +1,86 @@
+import gzip
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from sqlmodel import select
+from src.models import Conversation
+from src.routers.chat import conversation_etag
+from tests.integration.test_search import make_persona, login, generate
+
+
+def many_personas(count):
+    return [make_persona(f"Persona {i}", "Operations lead", [f"Goal {i}", "Fewer handoffs"]) for i in range(count)]
+
+
+def test_large_responses_are_compressed(client: TestClient, session):
+    login(client, session, "gzip@example.com")
+    conv_id, _ = generate(client, many_personas(5))
+
+    response = client.get(f"/conversations/{conv_id}/messages", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.headers["etag"].endswith('-gzip"')
+    assert len(response.json()[1]["personas"]) == 5
+
+    small = client.get("/conversations/", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+
+def test_gzip_exports_are_not_compressed_twice(client: TestClient, session):
+    login(client, session, "gzip-export@example.com")
+    _, personas = generate(client, many_personas(3))
+
+    response = client.post(
+        "/export/personas",
+        json={"persona_ids": [p["id"] for p in personas], "format": "ndjson", "gzip": True},
+        headers={"Accept-Encoding": "gzip"},
+    )
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert gzip.decompress(response.content).count(b"\n") == 3
+
+
+def test_messages_conditional_get(client: TestClient, session):
+    login(client, session, "etag@example.com")
+    conv_id, personas = generate(client, many_personas(2))
+    url = f"/conversations/{conv_id}/messages"
+
+    first = client.get(url, headers={"Accept-Encoding": "identity"})
+    etag = first.headers["etag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    # A validator for the gzip coding of the same representation also matches
+    gzipped = client.get(url, headers={"Accept-Encoding": "gzip"}).headers["etag"]
+    not_modified = client.get(url, headers={"If-None-Match": gzipped, "Accept-Encoding": "identity"})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    # JSON and MessagePack are different representations
+    as_msgpack = client.get(url, headers={"Accept": "application/msgpack", "If-None-Match": etag})
+    assert as_msgpack.status_code == 200
+
+    assert client.put(f"/personas/{personas[0]['id']}", json={"name": "Renamed"}).status_code == 200
+    after_edit = client.get(url, headers={"If-None-Match": etag, "Accept-Encoding": "identity"})
+    assert after_edit.status_code == 200
+    assert after_edit.headers["etag"] != etag
+
+    conversation = client.get(f"/conversations/{conv_id}")
+    assert client.get(f"/conversations/{conv_id}", headers={"If-None-Match": conversation.headers["etag"]}).status_code == 304
+    unchanged = client.get(url, headers={"If-None-Match": after_edit.headers["etag"]})
+    assert unchanged.status_code == 304
+
+
+def test_one_shot_generation_changes_the_etag(client: TestClient, session):
+    login(client, session, "oneshot-etag@example.com")
+    etags = []
+
+    async def generation(*args, **kwargs):
+        # What a client polling during the generation would have been given
+        conv = session.exec(select(Conversation)).one()
+        etags.append(conversation_etag(conv, "messages-json"))
+        return {"personas": many_personas(1)}
+
+    with patch("src.routers.chat.generate_personas", generation):
+        assert client.post("/conversations/generate-personas", json={"text": "An app"}).status_code == 200
+    conv_id = client.get("/conversations/").json()[0]["id"]
+
+    response = client.get(f"/conversations/{conv_id}/messages", headers={"If-None-Match": etags[0], "Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert len(response.json()) == 2
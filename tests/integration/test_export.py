@@ -0,0 +1,321 @@
+import csv
+import gzip
+import io
+import json
+import msgpack
+import os
+import pytest
+from datetime import datetime, timedelta, timezone
+from fastapi.testclient import TestClient
+from src.models import User, Conversation, Message, Persona, Demographics, Goal, Frustration, ExportJob
+from src.dependencies import get_current_user
+from src.scheduler import sweep_export_jobs
+from src.text_store import intern_texts
+from src.database import configure_sqlite
+from src.export_stream import stream_export
+from sqlalchemy import event
+from sqlmodel import SQLModel, Session, create_engine
+import src.export_cache as export_cache
+import src.routers.export as export_router
+import src.export_jobs as export_jobs
+import src.render_pool as render_pool
+
+
+@pytest.fixture(autouse=True)
+def export_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_cache, "EXPORT_CACHE_DIR", str(tmp_path / "exports"))
+    monkeypatch.setattr(export_jobs, "EXPORT_JOBS_DIR", str(tmp_path / "jobs"))
+    return tmp_path / "exports"
+
+
+def create_persona(session, user, name="Persona 1"):
+    conv = Conversation(user_id=user.id, title="Export Chat")
+    session.add(conv)
+    session.commit()
+    session.refresh(conv)
+
+    msg = Message(conversation_id=conv.id, role="assistant", content="Generated personas")
+    session.add(msg)
+    session.commit()
+    session.refresh(msg)
+
+    persona = Persona(
+        message_id=msg.id,
+        user_id=user.id,
+        name=name,
+        status="primary",
+        role="Product Manager",
+        tech_comfort="high",
+        scenario_context="Runs weekly planning meetings",
+    )
+    session.add(persona)
+    session.commit()
+    session.refresh(persona)
+
+    session.add(Demographics(persona_id=persona.id, age="32", location="Berlin", education="MBA", industry="SaaS"))
+    hashes = intern_texts(session, ["Ship faster", "Too many meetings"])
+    session.add(Goal(persona_id=persona.id, text_hash=hashes["Ship faster"], order_index=0))
+    session.add(Frustration(persona_id=persona.id, text_hash=hashes["Too many meetings"], order_index=0))
+    session.commit()
+    return persona
+
+
+def login_as(client: TestClient, session, account_type=2):
+    user = User(email="export@example.com", is_verified=True, account_type=account_type)
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    client.app.dependency_overrides[get_current_user] = lambda: user
+    return user
+
+
+def test_export_pdf_rendered_in_pool(client: TestClient, session):
+    user = login_as(client, session)
+    persona = create_persona(session, user)
+
+    response = client.post("/export/personas", json={"format": "pdf", "persona_ids": [persona.id]})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.content.startswith(b"%PDF")
+
+    stats = client.get("/metrics").json()["pdf_render"]
+    assert stats["renders"] >= 1
+    assert stats["queue_depth"] == 0
+
+
+def test_export_pdf_rejected_when_queue_full(client: TestClient, session, monkeypatch):
+    user = login_as(client, session)
+    persona = create_persona(session, user)
+    monkeypatch.setattr(render_pool, "RENDER_QUEUE_DEPTH", 0)
+
+    response = client.post("/export/personas", json={"format": "pdf", "persona_ids": [persona.id]})
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+    # A rejected export must not consume the user's export allowance
+    session.refresh(user)
+    assert user.last_export_at is None
+
+
+def test_export_cache_hit_and_conditional_request(client: TestClient, session):
+    user = login_as(client, session)
+    persona = create_persona(session, user)
+    payload = {"format": "pdf", "persona_ids": [persona.id]}
+
+    first = client.post("/export/personas", json=payload)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    renders = client.get("/metrics").json()["pdf_render"]["renders"]
+
+    second = client.post("/export/personas", json=payload)
+    assert second.status_code == 200
+    assert second.headers["etag"] == etag
+    assert second.content == first.content
+    assert client.get("/metrics").json()["pdf_render"]["renders"] == renders
+
+    not_modified = client.post("/export/personas", json=payload, headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+
+    # Editing the persona changes the content hash
+    response = client.put(f"/personas/{persona.id}", json={"goals": ["Ship faster", "Hire well"]})
+    assert response.status_code == 200
+    edited = client.post("/export/personas", json=payload, headers={"If-None-Match": etag})
+    assert edited.status_code == 200
+    assert edited.headers["etag"] != etag
+
+
+def test_export_cache_evicts_least_recently_used(export_cache_dir):
+    old = export_cache.store_export("a" * 64, "json", b"x" * 10)
+    export_cache.store_export("b" * 64, "json", b"y" * 10)
+    stat = os.stat(old)
+    os.utime(old, (stat.st_atime - 60, stat.st_mtime - 60))
+
+    removed = export_cache.evict_exports(max_bytes=15)
+    assert removed == 1
+    assert export_cache.read_cached_export("a" * 64, "json") is None
+    assert export_cache.read_cached_export("b" * 64, "json") == b"y" * 10
+
+
+
+def test_cached_export_survives_a_concurrent_eviction(client: TestClient, session, monkeypatch):
+    user = login_as(client, session)
+    persona = create_persona(session, user)
+    payload = {"format": "pdf", "persona_ids": [persona.id]}
+    first = client.post("/export/personas", json=payload)
+
+    def read_then_evict(key, extension):
+        content = export_cache.read_cached_export(key, extension)
+        # Another request's store evicts everything right after the cache hit
+        export_cache.evict_exports(max_bytes=0)
+        return content
+
+    monkeypatch.setattr(export_router, "read_cached_export", read_then_evict)
+    second = client.post("/export/personas", json=payload)
+    assert second.status_code == 200
+    assert second.content == first.content
+
+
+def test_export_json_streams_same_document(client: TestClient, session):
+    user = login_as(client, session)
+    personas = [create_persona(session, user, name=f"Persona {i}") for i in range(3)]
+    ids = [p.id for p in personas]
+
+    response = client.post("/export/personas", json={"format": "json", "persona_ids": ids})
+    assert response.status_code == 200
+    document = json.loads(response.content)
+    assert document["total_personas"] == 3
+    assert [p["name"] for p in document["personas"]] == ["Persona 0", "Persona 1", "Persona 2"]
+    assert document["personas"][0]["goals"] == ["Ship faster"]
+    # Byte-compatible with the previous in-memory json.dumps(..., indent=2) output
+    assert response.content.decode() == json.dumps(document, indent=2)
+
+    session.refresh(user)
+    assert user.last_export_at is not None
+
+
+def test_export_ndjson_gzip(client: TestClient, session):
+    user = login_as(client, session)
+    ids = [create_persona(session, user, name=f"Persona {i}").id for i in range(2)]
+
+    response = client.post("/export/personas", json={"format": "ndjson", "persona_ids": ids, "gzip": True})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/gzip"
+    lines = gzip.decompress(response.content).decode().splitlines()
+    assert [json.loads(line)["name"] for line in lines] == ["Persona 0", "Persona 1"]
+
+
+def test_export_msgpack_negotiated(client: TestClient, session):
+    user = login_as(client, session)
+    ids = [create_persona(session, user, name=f"Persona {i}").id for i in range(2)]
+
+    response = client.post("/export/personas", json={"format": "json", "persona_ids": ids},
+                           headers={"Accept": "application/msgpack"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/msgpack"
+    assert response.headers["content-disposition"].endswith(".json.msgpack")
+    document = msgpack.unpackb(response.content)
+    assert document["total_personas"] == 2
+    assert [p["name"] for p in document["personas"]] == ["Persona 0", "Persona 1"]
+
+    response = client.post("/export/personas", json={"format": "ndjson", "persona_ids": ids},
+                           headers={"Accept": "application/msgpack"})
+    assert [p["name"] for p in msgpack.Unpacker(io.BytesIO(response.content))] == ["Persona 0", "Persona 1"]
+
+
+def test_export_stream_reads_one_snapshot(tmp_path):
+    # A file database, so the deletion happens on another connection, as in production
+    engine = create_engine(f"sqlite:///{tmp_path / 'snapshot.db'}", connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", configure_sqlite)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        user = User(email="snapshot@example.com", is_verified=True)
+        session.add(user)
+        session.commit()
+        ids = [create_persona(session, user, name=f"Persona {i}").id for i in range(3)]
+        user_id = user.id
+
+    stream = stream_export(engine, user_id, ids, "json", datetime.now(timezone.utc), encoding="msgpack")
+    header = next(stream)
+    with Session(engine) as other:
+        other.delete(other.get(Persona, ids[1]))
+        other.commit()
+    document = msgpack.unpackb(header + b"".join(stream))
+    assert document["total_personas"] == 3
+    assert [p["name"] for p in document["personas"]] == ["Persona 0", "Persona 1", "Persona 2"]
+    engine.dispose()
+
+
+def test_export_rejects_foreign_personas(client: TestClient, session):
+    user = login_as(client, session)
+    persona = create_persona(session, user)
+
+    response = client.post("/export/personas", json={"format": "json", "persona_ids": [persona.id, 9999]})
+    assert response.status_code == 404
+
+
+def test_workspace_export_job_csv(client: TestClient, session):
+    user = login_as(client, session)
+    for i in range(3):
+        create_persona(session, user, name=f"Persona {i}")
+
+    response = client.post("/export/jobs", json={"format": "csv"})
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+
+    job = client.get(f"/export/jobs/{job_id}").json()
+    assert job["status"] == "completed"
+    assert job["total_personas"] == 3
+    assert job["download_url"] == f"/export/jobs/{job_id}/download"
+
+    download = client.get(job["download_url"])
+    assert download.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(download.text)))
+    assert [row["name"] for row in rows] == ["Persona 0", "Persona 1", "Persona 2"]
+    assert rows[0]["industry"] == "SaaS"
+    assert rows[0]["goals"] == "Ship faster"
+
+
+def test_workspace_export_job_parquet(client: TestClient, session):
+    pq = pytest.importorskip("pyarrow.parquet")
+    user = login_as(client, session)
+    create_persona(session, user)
+
+    job = client.post("/export/jobs", json={"format": "parquet"}).json()
+    download = client.get(f"/export/jobs/{job['id']}/download")
+    assert download.status_code == 200
+    table = pq.read_table(io.BytesIO(download.content))
+    assert table.column("name").to_pylist() == ["Persona 1"]
+    assert table.column("frustrations").to_pylist() == [["Too many meetings"]]
+
+
+def test_workspace_export_job_respects_export_limit(client: TestClient, session):
+    user = login_as(client, session, account_type=0)
+    create_persona(session, user)
+
+    assert client.post("/export/jobs", json={"format": "csv"}).status_code == 202
+    assert client.post("/export/jobs", json={"format": "csv"}).status_code == 429
+
+
+def test_interrupted_export_job_is_failed_and_old_artifacts_pruned(client: TestClient, session, tmp_path):
+    user = login_as(client, session)
+    create_persona(session, user)
+    # Left running by a worker that was restarted
+    lost = ExportJob(user_id=user.id, format="csv", status="running", snapshot_max_id=0,
+                     started_at=datetime.now(timezone.utc) - timedelta(hours=1),
+                     heartbeat_at=datetime.now(timezone.utc) - timedelta(hours=1))
+    session.add(lost)
+    session.commit()
+
+    response = client.post("/export/jobs", json={"format": "csv"})
+    assert response.status_code == 202
+    session.refresh(lost)
+    assert lost.status == "failed"
+
+    job = session.get(ExportJob, response.json()["id"])
+    artifact = job.file_path
+    job.completed_at = datetime.now(timezone.utc) - timedelta(days=2)
+    session.add(job)
+    session.commit()
+    partial = tmp_path / "jobs" / "export_99_abc.csv.part"
+    partial.write_text("half")
+    os.utime(partial, (0, 0))
+
+    sweep_export_jobs(session.get_bind())
+    session.refresh(job)
+    assert job.status == "expired"
+    assert not os.path.exists(artifact)
+    assert not partial.exists()
+    assert client.get(f"/export/jobs/{job.id}/download").status_code == 404
+
+
+def test_export_pdf_template_selection(client: TestClient, session):
+    user = login_as(client, session)
+    persona = create_persona(session, user)
+
+    default = client.post("/export/personas", json={"format": "pdf", "persona_ids": [persona.id]})
+    compact = client.post("/export/personas", json={"format": "pdf", "persona_ids": [persona.id], "template": "compact"})
+    assert compact.status_code == 200
+    assert compact.headers["etag"] != default.headers["etag"]
+
+    unknown = client.post("/export/personas", json={"format": "pdf", "persona_ids": [persona.id], "template": "fancy"})
+    assert unknown.status_code == 400
@@ -0,0 +1,145 @@
+import asyncio
+from unittest.mock import patch
+import httpx
+from fastapi.testclient import TestClient
+from sqlmodel import select
+from src.models import User, Message, Conversation
+from src.dependencies import get_current_user
+
+PERSONAS = {"personas": [{
+    "name": "Persona 1", "status": "primary", "role": "Role", "tech_comfort": "high",
+    "scenario_context": "Context", "demographics": {}, "goals": ["Goal"], "frustrations": [],
+    "behavioral_patterns": [], "influence_networks": [], "recruitment_criteria": [], "research_assumptions": [],
+}]}
+
+
+def start_conversation(client: TestClient, session) -> int:
+    user = User(email="retry@example.com", is_verified=True, account_type=2)
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    client.app.dependency_overrides[get_current_user] = lambda: user
+    return client.post("/conversations/", json={}).json()["id"]
+
+
+def user_messages(session):
+    session.expire_all()
+    return session.exec(select(Message).where(Message.role == "user")).all()
+
+
+def test_retries_replay_the_stored_reply(client: TestClient, session):
+    conv_id = start_conversation(client, session)
+    headers = {"Idempotency-Key": "send-1"}
+    with patch("src.routers.chat.generate_personas", return_value=PERSONAS) as mock_gen:
+        first = client.post(f"/conversations/{conv_id}/messages", json={"content": "Hi"}, headers=headers)
+        retry = client.post(f"/conversations/{conv_id}/messages", json={"content": "Hi"}, headers=headers)
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert mock_gen.call_count == 1
+    assert len(user_messages(session)) == 1
+
+    reused = client.post(f"/conversations/{conv_id}/messages", json={"content": "Other"}, headers=headers)
+    assert reused.status_code == 422
+
+
+def test_failed_requests_can_be_retried_with_the_same_key(client: TestClient, session):
+    conv_id = start_conversation(client, session)
+    headers = {"Idempotency-Key": "send-1"}
+    with patch("src.routers.chat.generate_personas", side_effect=[RuntimeError("upstream error"), PERSONAS]) as mock_gen:
+        assert client.post(f"/conversations/{conv_id}/messages", json={"content": "Hi"}, headers=headers).status_code == 500
+        assert client.post(f"/conversations/{conv_id}/messages", json={"content": "Hi"}, headers=headers).status_code == 200
+    assert mock_gen.call_count == 2
+    assert len(user_messages(session)) == 1
+
+
+def test_one_shot_generation_is_idempotent(client: TestClient, session):
+    start_conversation(client, session)
+    headers = {"Idempotency-Key": "generate-1"}
+    with patch("src.routers.chat.generate_personas", return_value=PERSONAS) as mock_gen:
+        first = client.post("/conversations/generate-personas", json={"text": "An app"}, headers=headers)
+        retry = client.post("/conversations/generate-personas", json={"text": "An app"}, headers=headers)
+    assert retry.json() == first.json() and first.json()["success"]
+    assert mock_gen.call_count == 1
+    session.expire_all()
+    # The empty conversation from start_conversation, and one generated
+    assert len(session.exec(select(Conversation)).all()) == 2
+
+
+def test_a_retry_during_the_first_request_waits_for_its_result(client: TestClient, session):
+    conv_id = start_conversation(client, session)
+    calls = []
+
+    async def slow_generation(*args, **kwargs):
+        calls.append(1)
+        await asyncio.sleep(0.3)
+        return PERSONAS
+
+    async def send_twice():
+        transport = httpx.ASGITransport(app=client.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            send = lambda: async_client.post(
+                f"/conversations/{conv_id}/messages", json={"content": "Hi"}, headers={"Idempotency-Key": "send-1"}
+            )
+            first = asyncio.create_task(send())
+            await asyncio.sleep(0.05)
+            return await asyncio.gather(first, send())
+
+    with patch("src.routers.chat.generate_personas", slow_generation):
+        first, retry = asyncio.run(send_twice())
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert calls == [1]
+    assert len(user_messages(session)) == 1
+
+
+def test_a_disconnected_first_request_still_answers_the_retry(client: TestClient, session):
+    conv_id = start_conversation(client, session)
+    calls = []
+
+    async def slow_generation(*args, **kwargs):
+        calls.append(1)
+        await asyncio.sleep(0.3)
+        return PERSONAS
+
+    body = b'{"content":"Hi"}'
+
+    async def send_and_hang_up():
+        # The client sends the request and goes away before the reply
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+            "path": f"/conversations/{conv_id}/messages", "raw_path": f"/conversations/{conv_id}/messages".encode(),
+            "root_path": "", "query_string": b"", "client": ("test", 1), "server": ("test", 80),
+            "headers": [(b"content-type", b"application/json"), (b"idempotency-key", b"send-1")],
+        }
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await asyncio.sleep(0.05)
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            pass
+
+        await client.app(scope, receive, send)
+
+    async def retry():
+        await asyncio.sleep(0.1)
+        transport = httpx.ASGITransport(app=client.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            return await async_client.post(
+                f"/conversations/{conv_id}/messages", content=body,
+                headers={"Content-Type": "application/json", "Idempotency-Key": "send-1"},
+            )
+
+    async def run():
+        return (await asyncio.gather(send_and_hang_up(), retry()))[1]
+
+    with patch("src.routers.chat.generate_personas", slow_generation):
+        response = asyncio.run(run())
+    assert response.status_code == 200
+    assert response.headers["Idempotent-Replayed"] == "true"
+    assert calls == [1]
+    assert len(user_messages(session)) == 1
@@ -0,0 +1,74 @@
+from fastapi.testclient import TestClient
+from sqlmodel import select
+from src.models import Goal, PersonaFacet
+from tests.integration.test_search import make_persona, login, generate
+
+
+def test_library_filters_and_keyset_pagination(client: TestClient, session):
+    login(client, session, "library@example.com")
+    _, first = generate(client, [make_persona(f"Persona {i}", "Analyst", ["Goal"]) for i in range(3)])
+    secondary = dict(make_persona("Sid", "Support lead", ["Goal"]), status="secondary", tech_comfort="low")
+    secondary["demographics"] = {"age": "51", "location": "Pune", "education": "BA", "industry": "Retail"}
+    _, second = generate(client, [secondary])
+
+    response = client.get("/personas", params={"limit": 3}, follow_redirects=False)
+    assert response.status_code == 200
+    page = response.json()
+    assert [p["name"] for p in page["items"]] == ["Sid", "Persona 2", "Persona 1"]
+    assert page["items"][0]["goals"][0]["goal_text"] == "Goal"
+    assert page["next_cursor"] == page["items"][-1]["id"]
+
+    page = client.get("/personas", params={"limit": 3, "cursor": page["next_cursor"]}).json()
+    assert [p["name"] for p in page["items"]] == ["Persona 0"]
+    assert page["next_cursor"] is None
+
+    assert [p["name"] for p in client.get("/personas", params={"status": "secondary"}).json()["items"]] == ["Sid"]
+    assert [p["name"] for p in client.get("/personas", params={"industry": "Retail", "location": "Pune"}).json()["items"]] == ["Sid"]
+    assert len(client.get("/personas", params={"tech_comfort": "high", "industry": "Logistics"}).json()["items"]) == 3
+
+    facets = page["facets"]
+    assert facets["status"] == {"primary": 3, "secondary": 1}
+    assert facets["industry"] == {"Logistics": 3, "Retail": 1}
+    assert facets["tech_comfort"] == {"high": 3, "low": 1}
+
+
+def test_facet_counts_follow_edits_and_deletes(client: TestClient, session):
+    user = login(client, session, "facets@example.com")
+    conv_id, saved = generate(client, [make_persona("Ana", "Analyst", []), make_persona("Ben", "Buyer", [])])
+
+    response = client.put(f"/personas/{saved[0]['id']}", json={"tech_comfort": "medium", "demographics": {"industry": "Retail"}})
+    assert response.status_code == 200
+    facets = client.get("/personas").json()["facets"]
+    assert facets["tech_comfort"] == {"high": 1, "medium": 1}
+    assert facets["industry"] == {"Logistics": 1, "Retail": 1}
+
+    client.delete(f"/conversations/{conv_id}")
+    facets = client.get("/personas").json()["facets"]
+    assert facets == {"status": {}, "tech_comfort": {}, "industry": {}, "location": {}}
+    assert session.exec(select(PersonaFacet).where(PersonaFacet.user_id == user.id)).all() == []
+
+
+def test_list_edits_update_rows_in_place_and_reject_stale_versions(client: TestClient, session):
+    login(client, session, "edits@example.com")
+    _, saved = generate(client, [make_persona("Ana", "Analyst", ["Ship faster", "Hire wel", "Cut costs"])])
+    persona_id = saved[0]["id"]
+    assert saved[0]["version"] == 1
+    goal_ids = session.exec(select(Goal.id).where(Goal.persona_id == persona_id).order_by(Goal.order_index)).all()
+
+    response = client.put(f"/personas/{persona_id}", json={"goals": ["Ship faster", "Hire well", "Cut costs"], "version": 1})
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+    assert [g["goal_text"] for g in response.json()["goals"]] == ["Ship faster", "Hire well", "Cut costs"]
+    session.expire_all()
+    assert session.exec(select(Goal.id).where(Goal.persona_id == persona_id).order_by(Goal.order_index)).all() == goal_ids
+
+    # Another editor still has version 1
+    response = client.put(f"/personas/{persona_id}", json={"name": "Stale", "version": 1})
+    assert response.status_code == 409
+    assert client.get("/personas").json()["items"][0]["name"] == "Ana"
+
+    response = client.put(f"/personas/{persona_id}", json={"goals": ["Onboard quickly", "Ship faster", "Cut costs"], "version": 2})
+    assert [g["goal_text"] for g in response.json()["goals"]] == ["Onboard quickly", "Ship faster", "Cut costs"]
+    item = client.get("/personas").json()["items"][0]
+    assert [g["goal_text"] for g in item["goals"]] == ["Onboard quickly", "Ship faster", "Cut costs"]
+    assert item["version"] == 3
@@ -0,0 +1,88 @@
+import hashlib
+import hmac
+import json
+from fastapi.testclient import TestClient
+from sqlmodel import select
+from src.models import User, Payment, PaymentEvent
+import src.routers.payments as payments
+from tests.integration.test_tokens import sign_in, bearer
+
+WEBHOOK_SECRET = "whsec_test"
+KEY_SECRET = "key_secret_test"
+
+
+def configure(monkeypatch):
+    monkeypatch.setattr(payments, "RAZORPAY_WEBHOOK_SECRET", WEBHOOK_SECRET)
+    monkeypatch.setattr(payments, "RAZORPAY_KEY_ID", "rzp_test")
+    monkeypatch.setattr(payments, "RAZORPAY_KEY_SECRET", KEY_SECRET)
+    monkeypatch.setattr(payments, "_client", None)
+
+
+def pending_order(session, plan_type="pro"):
+    user = session.exec(select(User).where(User.email == "tokens@example.com")).one()
+    session.add(Payment(user_id=user.id, razorpay_order_id="order_1", amount=499, status="created", plan_type=plan_type))
+    session.commit()
+    return user
+
+
+def deliver(client: TestClient, event_id: str, event="payment.captured", secret=WEBHOOK_SECRET):
+    body = json.dumps({
+        "event": event,
+        "payload": {"payment": {"entity": {"id": "pay_1", "order_id": "order_1"}}},
+    }).encode()
+    signature = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return client.post("/payments/webhook", content=body, headers={
+        "X-Razorpay-Signature": signature,
+        "X-Razorpay-Event-Id": event_id,
+        "Content-Type": "application/json",
+    })
+
+
+def test_webhook_rejects_bad_signatures(client: TestClient, session, monkeypatch):
+    configure(monkeypatch)
+    sign_in(client, session)
+    pending_order(session)
+    assert deliver(client, "evt_1", secret="wrong").status_code == 400
+    session.expire_all()
+    assert session.exec(select(Payment)).one().status == "created"
+
+
+def test_webhook_activates_the_plan_once(client: TestClient, session, monkeypatch):
+    configure(monkeypatch)
+    tokens = sign_in(client, session)
+    user = pending_order(session)
+
+    assert deliver(client, "evt_1").json() == {"status": "processed"}
+    assert deliver(client, "evt_1").json() == {"status": "duplicate"}
+    # order.paid for the same payment arrives as a separate delivery
+    assert deliver(client, "evt_2", event="order.paid").json() == {"status": "ignored"}
+
+    session.expire_all()
+    assert session.get(User, user.id).account_type == 2
+    assert session.exec(select(Payment)).one().status == "paid"
+    activations = session.exec(select(PaymentEvent).where(PaymentEvent.event == "plan_activated")).all()
+    assert len(activations) == 1
+
+    # The user stays signed in, and the token in use sees the new plan
+    assert client.get("/export/status", headers=bearer(tokens)).json()["account_type"] == 2
+
+
+def test_verify_payment_after_webhook_is_idempotent(client: TestClient, session, monkeypatch):
+    configure(monkeypatch)
+    tokens = sign_in(client, session)
+    user = pending_order(session, plan_type="lifetime")
+    assert deliver(client, "evt_1").json() == {"status": "processed"}
+
+    signature = hmac.new(KEY_SECRET.encode(), b"order_1|pay_1", hashlib.sha256).hexdigest()
+    response = client.post("/payments/verify-payment", headers=bearer(tokens), json={
+        "razorpay_order_id": "order_1",
+        "razorpay_payment_id": "pay_1",
+        "razorpay_signature": signature,
+        "plan_type": "pro",  # Ignored: the order was for lifetime
+    })
+    assert response.status_code == 200
+    assert client.get("/export/status", headers=bearer(tokens)).json()["account_type"] == 1
+
+    session.expire_all()
+    assert session.get(User, user.id).account_type == 1
+    assert len(session.exec(select(PaymentEvent).where(PaymentEvent.event == "plan_activated")).all()) == 1
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from sqlmodel import func, select
+
+from src.models import Conversation, Goal, Message, Persona
+from tests.integration.test_search import make_persona, login, generate
+
+
+def count(session, model):
+    return session.exec(select(func.count()).select_from(model)).one()
+
+
+def test_delete_cascades_in_the_database(client: TestClient, session):
+    login(client, session, "cascade@example.com")
+    conv_id, _ = generate(client, [make_persona("Ana", "Analyst", ["One", "Two"])])
+    keep_id, _ = generate(client, [make_persona("Ben", "Buyer", ["Three"])])
+
+    assert client.delete(f"/conversations/{conv_id}").status_code == 200
+    session.expire_all()
+    assert count(session, Message) == 2  # Both messages of the other conversation
+    assert count(session, Persona) == 1
+    assert [goal.goal_text for goal in session.exec(select(Goal)).all()] == ["Three"]
+    assert client.get("/personas/search", params={"q": "Ana"}).json() == []
+    assert client.get(f"/conversations/{keep_id}").status_code == 200
+
+
+def test_purge_by_ids_and_by_age(client: TestClient, session):
+    login(client, session, "purge@example.com")
+    stale_id, _ = generate(client, [make_persona("Old", "Analyst", ["Goal"])])
+    listed_id, _ = generate(client, [make_persona("Listed", "Analyst", ["Goal"])])
+    fresh_id, _ = generate(client, [make_persona("Fresh", "Analyst", ["Goal"])])
+    stale = session.get(Conversation, stale_id)
+    stale.last_message_at = datetime.now(timezone.utc) - timedelta(days=40)
+    session.add(stale)
+    session.commit()
+
+    assert client.post("/conversations/purge", json={}).status_code == 400
+
+    response = client.post("/conversations/purge", json={"conversation_ids": [listed_id, 10_000]})
+    assert response.json() == {"deleted": 1}
+
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=30)).isoformat()
+    response = client.post("/conversations/purge", json={"before": cutoff})
+    assert response.json() == {"deleted": 1}
+
+    assert [c["id"] for c in client.get("/conversations/").json()] == [fresh_id]
+    assert client.get("/personas").json()["facets"]["status"] == {"primary": 1}
+    deleted = client.get("/sync", params={"since": 0}).json()["deleted"]
+    assert sorted(deleted["conversations"]) == sorted([stale_id, listed_id])
+    assert len(deleted["personas"]) == 2
+
+
+def test_purge_only_touches_own_conversations(client: TestClient, session):
+    login(client, session, "owner@example.com")
+    other_id, _ = generate(client, [make_persona("Theirs", "Analyst", [])])
+    login(client, session, "intruder@example.com")
+
+    response = client.post("/conversations/purge", json={"conversation_ids": [other_id]})
+    assert response.json() == {"deleted": 0}
+    assert session.get(Conversation, other_id) is not None
@@ -0,0 +1,90 @@
+import asyncio
+from unittest.mock import patch
+import pytest
+from fastapi.testclient import TestClient
+from src.auth import create_user_access_token
+from src.models import User
+import src.database as database
+import src.rate_limit as rate_limit
+from src.rate_limit import Bucket, MemoryBackend, SQLiteBackend
+from tests.integration.test_tokens import sign_in, bearer
+
+
+@pytest.fixture(autouse=True)
+def limiter(monkeypatch, session):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", True)
+    # Revocations are read from the test database
+    monkeypatch.setattr(database, "engine", session.get_bind())
+    monkeypatch.setattr(rate_limit, "_backend", MemoryBackend())
+    monkeypatch.setattr(rate_limit, "IP_BUCKET", Bucket(capacity=2, refill_per_minute=1))
+    monkeypatch.setattr(rate_limit, "USER_BUCKET", Bucket(capacity=5, refill_per_minute=1))
+
+
+def test_anonymous_callers_are_limited_by_ip(client: TestClient):
+    with patch("src.routers.chat.generate_chat_name", return_value={"name": "Notes"}) as mock_gen:
+        responses = [client.post("/conversations/generate-chat-name", json={"text": "Notes app"}) for _ in range(3)]
+    assert [r.status_code for r in responses] == [200, 200, 429]
+    assert mock_gen.call_count == 2
+    assert responses[0].headers["RateLimit-Limit"] == "2"
+    assert responses[0].headers["RateLimit-Remaining"] == "1"
+    assert responses[2].headers["RateLimit-Remaining"] == "0"
+    assert int(responses[2].headers["Retry-After"]) > 0
+    # Other routes are not limited
+    assert "RateLimit-Limit" not in client.get("/health").headers
+
+
+def test_users_have_their_own_buckets_and_routes_have_costs(client: TestClient, session):
+    alice = User(email="alice@example.com", is_verified=True, account_type=2)
+    bob = User(email="bob@example.com", is_verified=True, account_type=2)
+    session.add_all([alice, bob])
+    session.commit()
+    as_alice = {"Authorization": f"Bearer {create_user_access_token(alice)}"}
+    as_bob = {"Authorization": f"Bearer {create_user_access_token(bob)}"}
+    conv_id = client.post("/conversations/", json={}, headers=as_alice).json()["id"]
+
+    with patch("src.routers.chat.generate_personas", return_value={"personas": []}):
+        # Costs 5; creating the conversation already took 1 of Alice's 5 tokens
+        limited = client.post(f"/conversations/{conv_id}/messages", json={"content": "Hi"}, headers=as_alice)
+    assert limited.status_code == 429
+    assert client.post("/conversations/", json={}, headers=as_bob).status_code == 200
+
+
+def test_revoked_tokens_are_limited_by_ip(client: TestClient, session):
+    tokens = sign_in(client, session)
+    assert client.post("/auth/logout", json={}, headers=bearer(tokens)).status_code == 200
+
+    with patch("src.routers.chat.generate_chat_name", return_value={"name": "Notes"}):
+        response = client.post("/conversations/generate-chat-name", json={"text": "Notes app"}, headers=bearer(tokens))
+    assert response.headers["RateLimit-Limit"] == "2"
+
+
+def test_sqlite_buckets_are_shared_between_workers(session, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "time", lambda: now[0])
+    bucket = Bucket(capacity=3, refill_per_minute=60)
+    worker_a, worker_b = SQLiteBackend(session.get_bind()), SQLiteBackend(session.get_bind())
+
+    assert worker_a.take("user:1", 2, bucket) == (True, 1)
+    assert worker_b.take("user:1", 2, bucket) == (False, 1)
+    now[0] += 1.5  # Refills one token a second
+    assert worker_b.take("user:1", 2, bucket) == (True, 0.5)
+    now[0] += 60
+    assert worker_a.take("user:1", 0, bucket) == (True, 3)
+
+
+def test_sqlite_buckets_are_taken_off_the_event_loop(client: TestClient, session, monkeypatch):
+    on_event_loop = []
+
+    class RecordingBackend(SQLiteBackend):
+        def take(self, key, cost, bucket):
+            try:
+                asyncio.get_running_loop()
+                on_event_loop.append(True)
+            except RuntimeError:
+                on_event_loop.append(False)
+            return super().take(key, cost, bucket)
+
+    monkeypatch.setattr(rate_limit, "_backend", RecordingBackend(session.get_bind()))
+    with patch("src.routers.chat.generate_chat_name", return_value={"name": "Notes"}):
+        assert client.post("/conversations/generate-chat-name", json={"text": "Notes app"}).status_code == 200
+    assert on_event_loop == [False]
@@ -0,0 +1,59 @@
+import json
+import msgpack
+from fastapi.testclient import TestClient
+from sqlmodel import select
+from src.models import Conversation, Persona
+from src.schemas import MessageResponse, PersonaResponse
+from tests.integration.test_search import make_persona, login, generate
+
+
+def dumps(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def test_messages_read_model_matches_response_model(client: TestClient, session):
+    login(client, session, "reader@example.com")
+    without_demographics = make_persona("Kai", "Nurse", ["Sleep"])
+    del without_demographics["demographics"]
+    conv_id, _ = generate(client, [
+        make_persona("Zoë Müller", "Café owner", ["Fewer no-shows", "Täglich planen"], ["Paper rotas"]),
+        without_demographics,
+    ])
+
+    session.expire_all()
+    conv = session.get(Conversation, conv_id)
+    expected = [MessageResponse.model_validate(m).model_dump(mode="json") for m in conv.messages]
+
+    response = client.get(f"/conversations/{conv_id}/messages")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.content == dumps(expected)
+
+
+def test_library_read_model_matches_response_model(client: TestClient, session):
+    login(client, session, "library-reader@example.com")
+    generate(client, [make_persona("Ana", "Analyst", ["One", "Two"], ["Three"]), make_persona("Ben", "Buyer", [])])
+
+    session.expire_all()
+    personas = session.exec(select(Persona).order_by(Persona.id.desc())).all()
+    expected = [PersonaResponse.model_validate(p).model_dump(mode="json") for p in personas]
+
+    assert client.get("/personas").json()["items"] == expected
+
+
+def test_messagepack_negotiation(client: TestClient, session):
+    login(client, session, "msgpack@example.com")
+    conv_id, _ = generate(client, [make_persona("Ana", "Analyst", ["One"])])
+
+    as_json = client.get(f"/conversations/{conv_id}/messages")
+    as_msgpack = client.get(f"/conversations/{conv_id}/messages", headers={"Accept": "application/msgpack"})
+    assert as_msgpack.headers["content-type"] == "application/msgpack"
+    assert "Accept" in as_msgpack.headers["vary"]
+    assert msgpack.unpackb(as_msgpack.content) == as_json.json()
+    assert len(as_msgpack.content) < len(as_json.content)
+
+    conversations = client.get("/conversations/", headers={"Accept": "application/msgpack"})
+    assert msgpack.unpackb(conversations.content) == client.get("/conversations/").json()
+
+    library = client.get("/personas", headers={"Accept": "application/msgpack"})
+    assert msgpack.unpackb(library.content, strict_map_key=False) == client.get("/personas").json()
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta, timezone
+from sqlmodel import select
+from src.models import User, OneTimePassword, Conversation, Message, RevokedToken
+from src.auth import create_user_access_token
+import src.scheduler as scheduler
+from src.scheduler import Job, acquire_lease, run_job, get_scheduler_stats
+
+
+def past(**kwargs):
+    return datetime.now(timezone.utc) - timedelta(**kwargs)
+
+
+def make_user(session, email="sweep@example.com", **fields):
+    user = User(email=email, is_verified=True, **fields)
+    session.add(user)
+    session.commit()
+    return user
+
+
+def test_expired_otps_are_purged_in_batches(session, monkeypatch):
+    monkeypatch.setattr(scheduler, "SCHEDULER_BATCH_SIZE", 2)
+    monkeypatch.setattr(scheduler, "SCHEDULER_BATCH_PAUSE_SECONDS", 0)
+    user = make_user(session)
+    for _ in range(5):
+        session.add(OneTimePassword(user_id=user.id, code="123456", expires_at=past(minutes=1)))
+    session.add(OneTimePassword(user_id=user.id, code="654321", expires_at=past(minutes=-10)))
+    session.commit()
+
+    assert scheduler.purge_expired_otps(session.get_bind()) == 5
+    assert [otp.code for otp in session.exec(select(OneTimePassword)).all()] == ["654321"]
+
+
+def test_lapsed_subscriptions_return_to_the_free_plan(client, session):
+    lapsed = make_user(session, account_type=2, subscription_active=True, subscription_expires_at=past(days=1))
+    current = make_user(session, "current@example.com", account_type=1, subscription_active=True,
+                        subscription_expires_at=past(days=-10))
+    token = create_user_access_token(lapsed)
+
+    assert scheduler.expire_subscriptions(session.get_bind()) == 1
+    session.expire_all()
+    assert (lapsed.account_type, lapsed.subscription_active) == (0, False)
+    assert current.account_type == 1
+    # Still signed in, on the free plan
+    status = client.get("/export/status", headers={"Authorization": f"Bearer {token}"})
+    assert status.status_code == 200 and status.json()["account_type"] == 0
+
+
+def test_expired_revocations_are_purged(session):
+    session.add(RevokedToken(jti="old", expires_at=past(minutes=1)))
+    session.add(RevokedToken(jti="current", expires_at=past(minutes=-10)))
+    session.commit()
+
+    assert scheduler.purge_expired_revocations(session.get_bind()) == 1
+    session.expire_all()
+    assert [row.jti for row in session.exec(select(RevokedToken)).all()] == ["current"]
+
+
+def test_only_old_empty_conversations_are_deleted(session):
+    user = make_user(session)
+    old_empty = Conversation(user_id=user.id, created_at=past(days=2), last_message_at=past(days=2))
+    new_empty = Conversation(user_id=user.id)
+    old_used = Conversation(user_id=user.id, created_at=past(days=2), last_message_at=past(days=2))
+    session.add_all([old_empty, new_empty, old_used])
+    session.commit()
+    session.add(Message(conversation_id=old_used.id, role="user", content="Hi"))
+    session.commit()
+    kept = {new_empty.id, old_used.id}
+
+    assert scheduler.delete_empty_conversations(session.get_bind()) == 1
+    session.expire_all()
+    assert {conv.id for conv in session.exec(select(Conversation)).all()} == kept
+
+
+def test_leases_let_one_worker_run_each_job(session):
+    engine = session.get_bind()
+    assert acquire_lease(engine, "job", 60, owner="a")
+    assert acquire_lease(engine, "job", 60, owner="a")  # Renewal
+    assert not acquire_lease(engine, "job", 60, owner="b")
+
+    runs = []
+    job = Job("held_elsewhere", 60, lambda engine: runs.append(1) or 1)
+    assert acquire_lease(engine, job.name, 60, owner="other-worker")
+    assert run_job(engine, job) is None
+    assert runs == []
+    stats = get_scheduler_stats()["held_elsewhere"]
+    assert (stats["runs"], stats["skipped"]) == (0, 1)
+
+    # An expired lease is taken over
+    assert acquire_lease(engine, "job", -1, owner="a")
+    assert acquire_lease(engine, "job", 60, owner="b")
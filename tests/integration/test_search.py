@@ -0,0 +1,135 @@
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from src.models import User
+from src.dependencies import get_current_user
+
+
+def make_persona(name, role, goals, frustrations=None):
+    return {
+        "name": name,
+        "status": "primary",
+        "role": role,
+        "tech_comfort": "high",
+        "scenario_context": "Works remotely across time zones",
+        "demographics": {"age": "34", "location": "Lisbon", "education": "BSc", "industry": "Logistics"},
+        "goals": goals,
+        "frustrations": frustrations or [],
+        "behavioral_patterns": [],
+        "influence_networks": [],
+        "recruitment_criteria": [],
+        "research_assumptions": [],
+    }
+
+
+def login(client: TestClient, session, email):
+    user = User(email=email, is_verified=True, account_type=2)
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    client.app.dependency_overrides[get_current_user] = lambda: user
+    return user
+
+
+def generate(client: TestClient, personas):
+    conv_id = client.post("/conversations/", json={}).json()["id"]
+    with patch("src.routers.chat.generate_personas") as mock_gen:
+        mock_gen.return_value = {"personas": personas}
+        response = client.post(f"/conversations/{conv_id}/messages", json={"content": "Generate"})
+    assert response.status_code == 200
+    return conv_id, response.json()["personas"]
+
+
+def test_search_ranks_and_highlights(client: TestClient, session):
+    login(client, session, "search@example.com")
+    conv_id, personas = generate(client, [
+        make_persona("Dispatch Dana", "Fleet dispatcher", ["Reduce idle trucks"], ["Spreadsheets for routing"]),
+        make_persona("Routing Rita", "Route planner", ["Plan routing for 200 drivers"]),
+    ])
+
+    response = client.get("/personas/search", params={"q": "routing"})
+    assert response.status_code == 200
+    results = response.json()
+    assert [r["name"] for r in results] == ["Routing Rita", "Dispatch Dana"]
+    assert results[0]["conversation_id"] == conv_id
+    assert "<mark>" in results[1]["snippet"]
+    assert "<mark>Routing</mark>" in results[1]["snippet"] or "<mark>routing</mark>" in results[1]["snippet"]
+
+    # Every word must match, the last one as a prefix
+    results = client.get("/personas/search", params={"q": "idle tru"}).json()
+    assert [r["name"] for r in results] == ["Dispatch Dana"]
+
+    # FTS syntax in user input is treated as plain words
+    assert client.get("/personas/search", params={"q": 'NEAR("x" OR'}).status_code == 200
+
+
+def test_search_scoped_to_user_and_kept_in_sync(client: TestClient, session):
+    owner = login(client, session, "owner@example.com")
+    conv_id, personas = generate(client, [make_persona("Warehouse Wendy", "Warehouse lead", ["Faster picking"])])
+    persona_id = personas[0]["id"]
+
+    login(client, session, "other@example.com")
+    assert client.get("/personas/search", params={"q": "warehouse"}).json() == []
+
+    client.app.dependency_overrides[get_current_user] = lambda: owner
+
+    # Edits are reindexed
+    response = client.put(f"/personas/{persona_id}", json={"goals": ["Automate cycle counts"]})
+    assert response.status_code == 200
+    assert client.get("/personas/search", params={"q": "picking"}).json() == []
+    assert [r["id"] for r in client.get("/personas/search", params={"q": "cycle counts"}).json()] == [persona_id]
+
+    # Deleted personas leave the index
+    client.delete(f"/conversations/{conv_id}")
+    assert client.get("/personas/search", params={"q": "warehouse"}).json() == []
+
+
+def test_similar_personas_and_duplicate_skipping(client: TestClient, session):
+    login(client, session, "similar@example.com")
+    priya = make_persona("Busy PM Priya", "Product manager at a fintech startup",
+                         ["Ship the roadmap on time", "Keep stakeholders aligned"], ["Too many status meetings"])
+    _, saved = generate(client, [
+        priya,
+        make_persona("Farmer Frank", "Dairy farmer", ["Automate milking schedules"], ["Unreliable rural internet"]),
+    ])
+    priya_id, frank_id = saved[0]["id"], saved[1]["id"]
+
+    # A near-identical variation of Priya
+    variant = dict(priya, name="Busy PM Priya 2", goals=priya["goals"] + ["Hire two engineers"])
+    _, variant_saved = generate(client, [variant])
+    variant_id = variant_saved[0]["id"]
+
+    response = client.get(f"/personas/{priya_id}/similar", params={"k": 2})
+    assert response.status_code == 200
+    results = response.json()
+    assert [r["id"] for r in results] == [variant_id, frank_id]
+    assert results[0]["score"] > 0.8 > results[1]["score"]
+
+    # Generation-time check: the duplicate is reported and not saved
+    conv_id = client.post("/conversations/", json={}).json()["id"]
+    with patch("src.routers.chat.generate_personas") as mock_gen:
+        mock_gen.return_value = {"personas": [dict(priya, name="Busy PM Priya 3"), make_persona("Nurse Nia", "ICU nurse", ["Fewer night shifts"])]}
+        response = client.post(f"/conversations/{conv_id}/messages", json={"content": "More", "skip_duplicates": True})
+    assert response.status_code == 200
+    body = response.json()
+    assert [p["name"] for p in body["personas"]] == ["Nurse Nia"]
+    assert body["duplicates"][0]["name"] == "Busy PM Priya 3"
+    assert body["duplicates"][0]["duplicate_of"] in (priya_id, variant_id)
+
+    login(client, session, "stranger@example.com")
+    assert client.get(f"/personas/{priya_id}/similar").status_code == 404
+
+
+def test_one_shot_generation_skips_duplicates(client: TestClient, session):
+    login(client, session, "oneshot@example.com")
+    nia = make_persona("Nurse Nia", "ICU nurse", ["Fewer night shifts", "Faster handovers"], ["Paper charts"])
+    _, saved = generate(client, [nia])
+
+    with patch("src.routers.chat.generate_personas") as mock_gen:
+        mock_gen.return_value = {"personas": [dict(nia, name="Nurse Nia 2"), make_persona("Farmer Frank", "Dairy farmer", ["Automate milking"])]}
+        response = client.post("/conversations/generate-personas", json={"text": "More", "skip_duplicates": True})
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert [p["name"] for p in data["personas"]] == ["Farmer Frank"]
+    assert data["duplicates"][0]["name"] == "Nurse Nia 2"
+    assert data["duplicates"][0]["duplicate_of"] == saved[0]["id"]
+    assert len(client.get("/personas").json()["items"]) == 2
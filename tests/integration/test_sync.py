@@ -0,0 +1,56 @@
+from fastapi.testclient import TestClient
+from tests.integration.test_search import make_persona, login, generate
+
+
+def test_sync_returns_only_changes_since_cursor(client: TestClient, session):
+    login(client, session, "sync@example.com")
+    conv_id, personas = generate(client, [make_persona("Ana", "Analyst", ["One"]), make_persona("Ben", "Buyer", [])])
+
+    full = client.get("/sync", params={"since": 0}).json()
+    assert [c["id"] for c in full["conversations"]] == [conv_id]
+    assert [m["role"] for m in full["messages"]] == ["user", "assistant"]
+    assert all(m["conversation_id"] == conv_id for m in full["messages"])
+    # Personas of a changed message arrive nested in it, not twice
+    assert [p["name"] for p in full["messages"][1]["personas"]] == ["Ana", "Ben"]
+    assert full["personas"] == []
+    assert not full["has_more"]
+
+    cursor = full["cursor"]
+    assert client.get("/sync", params={"since": cursor}).json()["cursor"] == cursor
+
+    client.put(f"/personas/{personas[1]['id']}", json={"role": "Procurement lead"})
+    delta = client.get("/sync", params={"since": cursor}).json()
+    assert delta["conversations"] == [] and delta["messages"] == []
+    assert [(p["id"], p["role"], p["message_id"]) for p in delta["personas"]] == [
+        (personas[1]["id"], "Procurement lead", full["messages"][1]["id"])
+    ]
+
+    cursor = delta["cursor"]
+    client.delete(f"/conversations/{conv_id}")
+    deleted = client.get("/sync", params={"since": cursor}).json()
+    assert deleted["deleted"] == {
+        "conversations": [conv_id],
+        "messages": [m["id"] for m in full["messages"]],
+        "personas": [p["id"] for p in personas],
+    }
+    assert deleted["personas"] == []
+
+
+def test_sync_pages_and_scopes_to_user(client: TestClient, session):
+    login(client, session, "other-sync@example.com")
+    generate(client, [make_persona("Hidden", "Analyst", [])])
+
+    login(client, session, "paged-sync@example.com")
+    conv_id, _ = generate(client, [make_persona("Ana", "Analyst", [])])
+
+    seen, cursor, has_more = [], 0, True
+    while has_more:
+        page = client.get("/sync", params={"since": cursor, "limit": 1}).json()
+        seen += [("conversation", c["id"]) for c in page["conversations"]]
+        seen += [("message", m["id"]) for m in page["messages"]]
+        seen += [("persona", p["name"]) for p in page["personas"]]
+        cursor, has_more = page["cursor"], page["has_more"]
+
+    assert ("conversation", conv_id) in seen
+    assert ("persona", "Ana") in seen
+    assert ("persona", "Hidden") not in seen
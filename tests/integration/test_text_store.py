@@ -0,0 +1,31 @@
+from fastapi.testclient import TestClient
+from sqlmodel import func, select
+
+from src.models import Goal, InternedText
+from src.scheduler import purge_unreferenced_texts
+from src.text_store import storage_report
+from tests.integration.test_search import make_persona, login, generate
+
+
+def test_repeated_list_text_is_stored_once(client: TestClient, session):
+    login(client, session, "intern@example.com")
+    persona = make_persona("Ana", "Analyst", ["Ship faster", "Hire well"], ["Too many meetings"])
+    conv_id, _ = generate(client, [persona, dict(persona, name="Ben")])
+    # A follow-up that regenerates the same items
+    generate(client, [persona])
+
+    assert session.exec(select(func.count()).select_from(Goal)).one() == 6
+    assert sorted(session.exec(select(InternedText.text)).all()) == ["Hire well", "Ship faster", "Too many meetings"]
+    report = storage_report(session)
+    assert report["list_rows"] == 9
+    assert report["distinct_texts"] == 3
+    assert report["text_bytes_without_interning"] == 3 * len("Ship faster" "Hire well" "Too many meetings")
+    assert report["dedup_ratio"] == 3.0
+
+    # Texts stay while any persona uses them
+    client.delete(f"/conversations/{conv_id}")
+    assert purge_unreferenced_texts(session.get_bind()) == 0
+    persona_id = client.get("/personas").json()["items"][0]["id"]
+    client.put(f"/personas/{persona_id}", json={"goals": ["Ship faster", "Hire great people"]})
+    assert purge_unreferenced_texts(session.get_bind()) == 1
+    assert "Hire well" not in session.exec(select(InternedText.text)).all()
@@ -0,0 +1,113 @@
+import json
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import select
+from src.auth import get_password_hash
+from src.models import User, OutboxMessage
+from src.outbox import FileSink, dispatch_once
+import src.outbox as outbox
+
+
+def sign_in(client: TestClient, session, email="tokens@example.com"):
+    session.add(User(email=email, hashed_password=get_password_hash("hunter22"), is_verified=True, account_type=1))
+    session.commit()
+    response = client.post("/auth/login", json={"email": email, "password": "hunter22"})
+    assert response.status_code == 200
+    return response.json()
+
+
+def bearer(tokens):
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+
+def test_access_tokens_authenticate_without_loading_the_user(client: TestClient, session):
+    tokens = sign_in(client, session)
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(session.get_bind(), "before_cursor_execute", listener)
+    try:
+        assert client.get("/sync", headers=bearer(tokens)).status_code == 200
+    finally:
+        event.remove(session.get_bind(), "before_cursor_execute", listener)
+    assert not [s for s in statements if "FROM users" in s]
+
+    me = client.get("/auth/me", headers=bearer(tokens)).json()
+    assert me["email"] == "tokens@example.com" and me["account_type"] == 1
+
+
+def test_refresh_tokens_rotate_and_reuse_revokes_the_login(client: TestClient, session):
+    tokens = sign_in(client, session)
+
+    rotated = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert rotated.status_code == 200
+    rotated = rotated.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+    assert client.get("/sync", headers=bearer(rotated)).status_code == 200
+
+    # Replaying the old token looks like theft: the whole login is revoked
+    assert client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+    assert client.post("/auth/refresh", json={"refresh_token": rotated["refresh_token"]}).status_code == 401
+
+
+def test_plan_changes_apply_without_a_new_token(client: TestClient, session):
+    tokens = sign_in(client, session)
+    user = session.exec(select(User).where(User.email == "tokens@example.com")).one()
+    user.account_type = 2
+    session.add(user)
+    session.commit()
+
+    # The plan is read from the database, so the token in use stays valid and sees it
+    assert client.get("/export/status", headers=bearer(tokens)).json()["account_type"] == 2
+
+
+def test_logout_revokes_tokens(client: TestClient, session):
+    tokens = sign_in(client, session)
+    other = client.post("/auth/login", json={"email": "tokens@example.com", "password": "hunter22"}).json()
+
+    response = client.post("/auth/logout", json={"refresh_token": tokens["refresh_token"]}, headers=bearer(tokens))
+    assert response.status_code == 200
+    assert client.get("/sync", headers=bearer(tokens)).status_code == 401
+    assert client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+    # Other logins are unaffected
+    assert client.get("/sync", headers=bearer(other)).status_code == 200
+
+
+def test_signup_email_goes_through_the_outbox(client: TestClient, session, tmp_path):
+    response = client.post("/auth/signup", json={"email": "outbox@example.com", "password": "hunter22", "name": "O"})
+    assert response.status_code == 200
+    message = session.exec(select(OutboxMessage)).one()
+    assert message.status == "pending"
+
+    sink = FileSink(str(tmp_path / "emails.jsonl"))
+    assert dispatch_once(session.get_bind(), sink) == 1
+    email = json.loads((tmp_path / "emails.jsonl").read_text())
+    assert email["to"] == ["outbox@example.com"]
+
+    otp = json.loads(message.payload)["otp"]
+    assert otp in email["html"]
+    assert client.post("/auth/verify-otp", json={"email": "outbox@example.com", "otp": otp}).status_code == 200
+    assert dispatch_once(session.get_bind(), sink) == 0
+
+
+def test_failed_deliveries_back_off_then_fail(client: TestClient, session, monkeypatch):
+    class DownSink:
+        def send(self, email):
+            raise ConnectionError("provider down")
+
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 2)
+    client.post("/auth/signup", json={"email": "retry@example.com", "password": "hunter22", "name": "R"})
+
+    assert dispatch_once(session.get_bind(), DownSink()) == 1
+    session.expire_all()
+    message = session.exec(select(OutboxMessage)).one()
+    assert (message.status, message.attempts, message.last_error) == ("pending", 1, "provider down")
+    # Not due again until the backoff has passed
+    assert dispatch_once(session.get_bind(), DownSink()) == 0
+
+    monkeypatch.setattr(outbox, "backoff_seconds", lambda attempts: 0)
+    message.next_attempt_at = message.created_at
+    session.add(message)
+    session.commit()
+    assert dispatch_once(session.get_bind(), DownSink()) == 1
+    session.expire_all()
+    assert session.exec(select(OutboxMessage)).one().status == "failed"
@@ -0,0 +1,57 @@
+from src.cache import MISSING, TTLCache
+from src.shared_cache import SharedCacheStore
+
+
+def test_lru_eviction_and_stats():
+    cache = TTLCache("test", max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("c") == 3
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["entries"]) == (2, 1, 1, 2)
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.cache.time.monotonic", lambda: now[0])
+    cache = TTLCache("test", max_entries=10, ttl=30)
+    cache.set("default", 1)
+    cache.set("short", 2, ttl=5)
+    cache.set("capped", 3, ttl=600)  # Never longer than the cache's TTL
+
+    now[0] += 10
+    assert cache.get("short") is MISSING
+    assert cache.get("default") == 1
+    now[0] += 25
+    assert cache.get("default") is MISSING
+    assert cache.get("capped") is MISSING
+
+
+def test_purge_expired_drops_only_expired_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.cache.time.monotonic", lambda: now[0])
+    cache = TTLCache("test", max_entries=10, ttl=30)
+    cache.set("short", 1, ttl=5)
+    cache.set("long", 2)
+    now[0] += 10
+    assert cache.purge_expired() == 1
+    assert cache.stats()["entries"] == 1
+
+
+def test_shared_tier_is_seen_by_other_processes(tmp_path):
+    # Two caches on one file stand in for the same cache in two workers
+    path = str(tmp_path / "shared.db")
+    first = TTLCache("test", ttl=60, shared=SharedCacheStore(path))
+    second = TTLCache("test", ttl=60, shared=SharedCacheStore(path))
+
+    first.set("a", {"id": 1})
+    assert second.get("a") == {"id": 1}
+    assert second.stats()["shared_hits"] == 1
+
+    first.invalidate("a")
+    second._entries.clear()  # As if its local TTL had passed
+    assert second.get("a") is MISSING
@@ -0,0 +1,49 @@
+import asyncio
+import pytest
+from starlette.requests import Request
+from src.cancellation import ClientDisconnected, finish_after_disconnect, run_cancellable
+
+
+def request_that_disconnects_after(seconds: float) -> Request:
+    async def receive():
+        await asyncio.sleep(seconds)
+        return {"type": "http.disconnect"}
+    return Request({"type": "http", "method": "POST", "headers": []}, receive)
+
+
+def test_work_is_cancelled_when_the_client_disconnects():
+    cancelled = []
+
+    async def generation():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    with pytest.raises(ClientDisconnected):
+        asyncio.run(run_cancellable(request_that_disconnects_after(0.01), generation(), deadline=5))
+    assert cancelled == [True]
+
+
+def test_results_and_errors_pass_through():
+    async def generation():
+        return {"personas": []}
+
+    async def failing():
+        raise ValueError("bad output")
+
+    request = request_that_disconnects_after(5)
+    assert asyncio.run(run_cancellable(request, generation(), deadline=5)) == {"personas": []}
+    with pytest.raises(ValueError):
+        asyncio.run(run_cancellable(request_that_disconnects_after(5), failing(), deadline=5))
+
+
+def test_work_finishes_after_disconnect_when_asked():
+    async def generation():
+        await asyncio.sleep(0.05)
+        return {"personas": []}
+
+    request = request_that_disconnects_after(0.01)
+    finish_after_disconnect(request)
+    assert asyncio.run(run_cancellable(request, generation(), deadline=5)) == {"personas": []}
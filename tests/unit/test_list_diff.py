@@ -0,0 +1,23 @@
+from src.list_diff import diff_list
+
+
+def rows(*texts):
+    return [(100 + i, text, i) for i, text in enumerate(texts)]
+
+
+def test_typo_fix_is_one_update():
+    diff = diff_list(rows("Ship faster", "Hire wel", "Cut costs"), ["Ship faster", "Hire well", "Cut costs"])
+    assert diff.updates == [(101, "Hire well", 1)]
+    assert diff.inserts == [] and diff.deletes == []
+
+
+def test_insert_and_delete_keep_unchanged_rows():
+    diff = diff_list(rows("A", "B", "C"), ["A", "New", "B"])
+    # B only moves; C goes
+    assert diff.updates == [(101, "B", 2)]
+    assert diff.inserts == [("New", 1)]
+    assert diff.deletes == [102]
+
+    assert diff_list(rows("A", "B"), ["A", "B"]) == ([], [], [])
+    assert diff_list([], ["A"]).inserts == [("A", 0)]
+    assert diff_list(rows("A", "B"), []).deletes == [100, 101]
@@ -0,0 +1,35 @@
+from datetime import datetime, timezone
+
+from src.pdf_export import BulletList, COMPILED_TEMPLATES, generate_pdf
+from src.pdf_templates import PDF_TEMPLATES
+
+
+def test_every_template_is_compiled_and_renders():
+    persona = {
+        "name": "Priya & <Co>",
+        "status": "primary",
+        "role": "PM",
+        "tech_comfort": "high",
+        "scenario_context": "Plans sprints",
+        "demographics": {"age": "32", "industry": "SaaS"},
+        "goals": ["Ship faster", "Fewer meetings"],
+    }
+    assert set(COMPILED_TEMPLATES) == set(PDF_TEMPLATES)
+    for template in PDF_TEMPLATES:
+        pdf = generate_pdf([persona, persona], datetime.now(timezone.utc), template)
+        assert pdf.startswith(b"%PDF")
+
+
+def test_bullet_list_splits_precomputed_lines():
+    style = COMPILED_TEMPLATES["default"].list_style
+    items = [f"Goal {i} " + "with a long explanation " * 12 for i in range(10)]
+    bullets = BulletList(items, style, indent=12, item_gap=4)
+
+    width, height = bullets.wrap(300, 10_000)
+    first, rest = bullets.split(300, height / 2)
+
+    _, first_height = first.wrap(300, 10_000)
+    _, rest_height = rest.wrap(300, 10_000)
+    assert first_height <= height / 2
+    assert len(first._lines) + len(rest._lines) == len(bullets._lines)
+    assert bullets.split(300, height + 1) == []
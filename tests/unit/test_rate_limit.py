@@ -0,0 +1,26 @@
+from src.rate_limit import Bucket, MemoryBackend, rate_limit_headers, route_cost
+
+
+def test_memory_buckets_refill_up_to_capacity(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("src.rate_limit.time.monotonic", lambda: now[0])
+    backend = MemoryBackend()
+    bucket = Bucket(capacity=10, refill_per_minute=60)
+
+    assert backend.take("ip:1", 10, bucket) == (True, 0)
+    assert backend.take("ip:1", 1, bucket) == (False, 0)
+    assert backend.take("ip:2", 1, bucket) == (True, 9)  # Separate bucket
+    now[0] += 4
+    assert backend.take("ip:1", 5, bucket) == (False, 4)
+    now[0] += 1000
+    assert backend.take("ip:1", 1, bucket) == (True, 9)
+
+
+def test_route_costs_and_headers():
+    assert route_cost("POST", "/conversations/12/messages") == 5
+    assert route_cost("GET", "/conversations/12/messages") is None
+    assert route_cost("POST", "/conversations/") == 1
+    headers = rate_limit_headers(Bucket(capacity=30, refill_per_minute=30), tokens=20.5)
+    assert headers == {
+        "RateLimit-Limit": "30", "RateLimit-Remaining": "20", "RateLimit-Reset": "19", "RateLimit-Policy": "30;w=60",
+    }
@@ -0,0 +1,17 @@
+import pytest
+
+from src.responses import prefers_msgpack
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, False),
+    ("*/*", False),
+    ("application/json", False),
+    ("application/msgpack", True),
+    ("application/x-msgpack, */*;q=0.1", True),
+    ("application/json, application/msgpack;q=0.5", False),
+    ("application/json;q=0.5, application/msgpack", True),
+    ("application/msgpack;q=0", False),
+])
+def test_prefers_msgpack(accept, expected):
+    assert prefers_msgpack(accept) is expected
@@ -0,0 +1,12 @@
+from src.revocation import BloomFilter
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    bloom = BloomFilter(capacity=1000, false_positive_rate=0.01)
+    members = [f"jti-{i}" for i in range(1000)]
+    for member in members:
+        bloom.add(member)
+
+    assert all(member in bloom for member in members)
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300  # 1% expected
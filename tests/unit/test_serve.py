@@ -0,0 +1,16 @@
+from unittest.mock import mock_open, patch
+
+from src.serve import available_cpus, worker_count
+
+
+def test_cpu_quota_caps_worker_count(monkeypatch):
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    monkeypatch.setattr("src.serve.os.sched_getaffinity", lambda pid: set(range(8)), raising=False)
+    with patch("builtins.open", mock_open(read_data="150000 100000\n")):
+        assert available_cpus() == 2
+        assert worker_count() == 2
+    with patch("builtins.open", mock_open(read_data="max 100000\n")):
+        assert available_cpus() == 8
+
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    assert worker_count() == 3
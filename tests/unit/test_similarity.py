@@ -0,0 +1,26 @@
+import numpy as np
+
+from src.similarity import SimilarityIndex, hashed_term_counts
+
+
+def test_hashed_term_counts_are_stable():
+    counts = hashed_term_counts(["Busy product manager", "busy PRODUCT manager"], dim=64)
+    assert counts.shape == (2, 64)
+    assert counts.dtype == np.float32
+    np.testing.assert_array_equal(counts[0], counts[1])
+
+
+def test_nearest_ranks_by_cosine_and_excludes():
+    docs = [
+        "product manager ships roadmap stakeholders meetings",
+        "product manager ships roadmap stakeholders meetings hiring",
+        "dairy farmer milking schedules rural internet",
+    ]
+    index = SimilarityIndex(np.array([10, 11, 12]), docs, dim=256)
+    [results] = index.nearest(index.vectors[:1], k=3, exclude_ids=[10])
+    assert [persona_id for persona_id, _ in results] == [11, 12]
+    assert results[0][1] > results[1][1]
+
+    [self_match] = index.nearest(index.embed(docs[2:]), k=1)
+    assert self_match[0][0] == 12
+    assert abs(self_match[0][1] - 1.0) < 1e-5
@@ -0,0 +1,12 @@
+import json
+import subprocess
+import sys
+
+HEAVY_MODULES = ["reportlab", "razorpay", "google.genai", "google.oauth2", "passlib", "argon2", "resend", "httpx"]
+
+
+def test_importing_the_app_does_not_load_heavy_dependencies():
+    # A fresh interpreter, since the test session has imported everything already
+    code = f"import json, sys, src.main; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []